@@ -0,0 +1,582 @@
+"""Local stand-in of the GitLab REST API (v4) for benchmarks.
+
+The server implements the endpoints that the dashboard uses (issues, notes,
+users, repository tree, files, issue statistics, and search), so that the
+real `RequestRepoAPI` and `DVCRepoAPI` run against it over HTTP. The
+latency of every endpoint, a rate limit, and the data volume are
+configurable, and the requests are counted per endpoint.
+
+Run it with:
+
+    python -m benchmarks.fake_gitlab --issues 5000 --latency notes=0.05
+
+and point `REPO_URL` to the printed URL (any token and project number).
+"""
+
+import base64
+import collections
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+import click
+
+# Issue templates, dcevent defaults, and model checkpoint files
+DATA_DIR = Path(__file__).parents[1] / "tests" / "data"
+
+TEMPLATE_PATHS = {
+    "simple": ".gitlab/issue_templates/pipeline_request_simple.md",
+    "advanced": ".gitlab/issue_templates/pipeline_request_advanced.md",
+}
+DEFAULTS_PATH = "dashboard_dcevent_defaults.yaml"
+MODEL_DIR = "model_registry/segmentation"
+
+# Name of the access tokens in the project members list
+BOT_NAME = "****"
+
+PROJECT = r"/api/v4/projects/(?P<project>[^/]+)"
+ISSUE = PROJECT + r"/issues/(?P<iid>\d+)"
+ROUTES = [
+    ("GET", r"/api/v4/user", "user"),
+    ("GET", PROJECT, "project"),
+    ("GET", PROJECT + r"/issues", "issues"),
+    ("POST", PROJECT + r"/issues", "create_issue"),
+    ("GET", ISSUE, "issue"),
+    ("PUT", ISSUE, "update_issue"),
+    ("GET", ISSUE + r"/notes", "notes"),
+    ("POST", ISSUE + r"/notes", "create_note"),
+    ("DELETE", ISSUE + r"/notes/(?P<note_id>\d+)", "delete_note"),
+    ("GET", PROJECT + r"/users", "users"),
+    ("GET", PROJECT + r"/repository/tree", "tree"),
+    ("GET", PROJECT + r"/repository/files/(?P<path>[^/]+)", "files"),
+    ("GET", PROJECT + r"/issues_statistics", "statistics"),
+    ("GET", PROJECT + r"/search", "search"),
+]
+ROUTES = [
+    (method, re.compile(f"{path}$"), name) for method, path, name in ROUTES
+]
+
+
+def gitlab_date(date):
+    """Format a datetime like GitLab (milliseconds, UTC)"""
+    return (
+        date.strftime("%Y-%m-%dT%H:%M:%S.")
+        + f"{date.microsecond // 1000:03d}Z"
+    )
+
+
+class FakeGitLabData:
+    """Generated projects data: issues with notes, members, and files"""
+
+    def __init__(
+        self,
+        num_issues=1000,
+        notes_per_issue=20,
+        num_members=200,
+        num_models=3,
+        opened_ratio=0.2,
+        seed=0,
+        data_dir=DATA_DIR,
+    ):
+        rng = random.Random(seed)
+        data_dir = Path(data_dir)
+        self.lock = threading.Lock()
+
+        self.members = [
+            {
+                "id": idx + 1,
+                "username": f"user{idx + 1}",
+                "name": f"User {idx + 1}",
+                "state": "active",
+            }
+            for idx in range(num_members)
+        ]
+        self.bot = {
+            "id": num_members + 1,
+            "username": "project_bot",
+            "name": BOT_NAME,
+            "state": "active",
+        }
+
+        self.files = {
+            TEMPLATE_PATHS["simple"]: (
+                data_dir / "simple_issue_template1.md"
+            ).read_text(encoding="utf-8"),
+            TEMPLATE_PATHS["advanced"]: (
+                data_dir / "advanced_issue_template1.md"
+            ).read_text(encoding="utf-8"),
+            DEFAULTS_PATH: (data_dir / DEFAULTS_PATH).read_text(
+                encoding="utf-8"
+            ),
+        }
+        dvc_files = sorted(data_dir.glob("*.dvc"))
+        for idx in range(num_models):
+            dvc_file = dvc_files[idx % len(dvc_files)]
+            name = f"model_checkpoint_{idx + 1}.ckp.dvc"
+            self.files[f"{MODEL_DIR}/{name}"] = dvc_file.read_text(
+                encoding="utf-8"
+            ).replace(dvc_file.name[: -len(".dvc")], name[: -len(".dvc")])
+
+        start = datetime.utcnow() - timedelta(hours=num_issues)
+        self.issues = {}
+        self.notes = {}
+        self._next_note_id = 1
+        for iid in range(1, num_issues + 1):
+            created = start + timedelta(hours=iid - 1)
+            kind = rng.choice(["simple", "advanced"])
+            state = "opened" if rng.random() < opened_ratio else "closed"
+            author = rng.choice(self.members)
+            self.issues[iid] = {
+                "id": 100000 + iid,
+                "iid": iid,
+                "project_id": 1,
+                "title": f"Pipeline request {iid}",
+                "description": re.sub(
+                    r"\[x\] username=\S*",
+                    f"[x] username={author['username']}",
+                    self.files[TEMPLATE_PATHS[kind]],
+                ),
+                "state": state,
+                "author": author,
+                "created_at": gitlab_date(created),
+                "updated_at": gitlab_date(created),
+                "web_url": f"https://gitlab.local/requests/-/issues/{iid}",
+            }
+            self.notes[iid] = []
+            for body in self.note_bodies(rng, state, notes_per_issue):
+                created += timedelta(seconds=rng.randint(1, 600))
+                note_author = author if body == "Go" else self.bot
+                self.add_note(iid, body, note_author, created)
+
+    @staticmethod
+    def note_bodies(rng, state, num_notes):
+        """Return the bodies of the notes of a pipeline run"""
+        num_jobs = rng.randint(1, max(1, num_notes - 5))
+        bodies = ["Go", f"We have {num_jobs} pipelines", "STATE: setup"]
+        bodies += ["STATE: queued"]
+        bodies += [f"Completed job {idx + 1}" for idx in range(num_jobs)]
+        if state == "closed":
+            bodies += ["STATE: done"]
+        bodies += [f"comment {idx}" for idx in range(num_notes - len(bodies))]
+        return bodies[:num_notes]
+
+    def add_note(self, iid, body, author, created=None):
+        """Add a note to an issue and update the issue"""
+        created = gitlab_date(created or datetime.utcnow())
+        with self.lock:
+            note = {
+                "id": self._next_note_id,
+                "body": body,
+                "author": author,
+                "created_at": created,
+                "updated_at": created,
+                "system": False,
+                "noteable_iid": iid,
+            }
+            self._next_note_id += 1
+            self.notes[iid].append(note)
+            self.issues[iid]["updated_at"] = created
+        return note
+
+    def find_issues(self, state=None, search=None, iids=None):
+        """Return the issues (newest first) that match the filters"""
+        issues = reversed(list(self.issues.values()))
+        if state and state != "all":
+            issues = (issue for issue in issues if issue["state"] == state)
+        if search:
+            search = search.lower()
+            issues = (
+                issue
+                for issue in issues
+                if search in issue["title"].lower()
+                or search in issue["description"].lower()
+            )
+        if iids:
+            iids = set(iids)
+            issues = (issue for issue in issues if issue["iid"] in iids)
+        return list(issues)
+
+
+class RateLimiter:
+    """Token bucket that allows `rate` requests per second"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, returns False if the rate limit is exceeded"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.rate, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class FakeGitLabHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        """Do not log every request"""
+
+    def do_GET(self):
+        self.handle_api()
+
+    def do_POST(self):
+        self.handle_api()
+
+    def do_PUT(self):
+        self.handle_api()
+
+    def do_DELETE(self):
+        self.handle_api()
+
+    def handle_api(self):
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.body = json.loads(body) if body.strip() else {}
+
+        for method, pattern, name in ROUTES:
+            match = pattern.match(url.path)
+            if method == self.command and match:
+                break
+        else:
+            self.send_json({"message": "404 Not Found"}, status=404)
+            return
+
+        fake = self.server
+        if fake.rate_limiter and not fake.rate_limiter.acquire():
+            fake.count("rate_limited")
+            self.send_json(
+                {"message": "429 Too Many Requests"},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+            return
+        fake.count(name)
+        time.sleep(fake.latency.get(name, fake.latency.get("default", 0)))
+        getattr(self, f"api_{name}")(**match.groupdict())
+
+    def arg(self, name, default=None):
+        return self.query.get(name, [default])[0]
+
+    def send_json(self, data, status=200, headers=None):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_page(self, items):
+        """Send a page of a list with the GitLab pagination headers"""
+        page = int(self.arg("page", 1))
+        per_page = min(int(self.arg("per_page", 20)), 100)
+        total_pages = max(1, math.ceil(len(items) / per_page))
+        headers = {
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+            "X-Total": str(len(items)),
+            "X-Total-Pages": str(total_pages),
+            "X-Next-Page": str(page + 1) if page < total_pages else "",
+            "X-Prev-Page": str(page - 1) if page > 1 else "",
+        }
+        if page < total_pages:
+            query = {key: values for key, values in self.query.items()}
+            query["page"] = [str(page + 1)]
+            url = "http://{}{}?{}".format(
+                self.headers["Host"],
+                urlsplit(self.path).path,
+                urlencode(query, doseq=True),
+            )
+            headers["Link"] = f'<{url}>; rel="next"'
+        start, end = (page - 1) * per_page, page * per_page
+        self.send_json(items[start:end], headers=headers)
+
+    def get_issue(self, iid):
+        issue = self.server.data.issues.get(int(iid))
+        if issue is None:
+            self.send_json({"message": "404 Issue Not Found"}, status=404)
+        return issue
+
+    def api_user(self):
+        self.send_json(self.server.data.bot)
+
+    def api_project(self, project):
+        self.send_json(
+            {
+                "id": int(project) if project.isdigit() else 1,
+                "path_with_namespace": unquote(project),
+                "default_branch": "main",
+            }
+        )
+
+    def api_issues(self, project):
+        self.send_page(
+            self.server.data.find_issues(
+                state=self.arg("state"),
+                search=self.arg("search"),
+                iids=[int(iid) for iid in self.query.get("iids[]", [])],
+            )
+        )
+
+    def api_create_issue(self, project):
+        data = self.server.data
+        with data.lock:
+            iid = max(data.issues, default=0) + 1
+            created = gitlab_date(datetime.utcnow())
+            issue = {
+                "id": 100000 + iid,
+                "iid": iid,
+                "project_id": 1,
+                "title": self.body.get("title", ""),
+                "description": self.body.get("description", ""),
+                "state": "opened",
+                "author": data.bot,
+                "created_at": created,
+                "updated_at": created,
+                "web_url": f"https://gitlab.local/requests/-/issues/{iid}",
+            }
+            data.issues[iid] = issue
+            data.notes[iid] = []
+        self.send_json(issue, status=201)
+
+    def api_issue(self, project, iid):
+        issue = self.get_issue(iid)
+        if issue:
+            self.send_json(issue)
+
+    def api_update_issue(self, project, iid):
+        issue = self.get_issue(iid)
+        if issue:
+            state_event = self.body.get("state_event")
+            with self.server.data.lock:
+                for key in ("title", "description"):
+                    if key in self.body:
+                        issue[key] = self.body[key]
+                if state_event in ("close", "reopen"):
+                    issue["state"] = (
+                        "closed" if state_event == "close" else "opened"
+                    )
+                issue["updated_at"] = gitlab_date(datetime.utcnow())
+            self.send_json(issue)
+
+    def api_notes(self, project, iid):
+        if self.get_issue(iid):
+            self.send_page(self.server.data.notes[int(iid)])
+
+    def api_create_note(self, project, iid):
+        if self.get_issue(iid):
+            data = self.server.data
+            note = data.add_note(int(iid), self.body.get("body", ""), data.bot)
+            self.send_json(note, status=201)
+
+    def api_delete_note(self, project, iid, note_id):
+        if self.get_issue(iid):
+            data = self.server.data
+            with data.lock:
+                data.notes[int(iid)] = [
+                    note
+                    for note in data.notes[int(iid)]
+                    if note["id"] != int(note_id)
+                ]
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def api_users(self, project):
+        data = self.server.data
+        self.send_page(data.members + [data.bot])
+
+    def api_tree(self, project):
+        path = self.arg("path", "").strip("/")
+        prefix = f"{path}/" if path else ""
+        entries = {}
+        for file_path in self.server.data.files:
+            if not file_path.startswith(prefix):
+                continue
+            name, _, child = file_path.removeprefix(prefix).partition("/")
+            entries[name] = {
+                "id": name,
+                "name": name,
+                "type": "tree" if child else "blob",
+                "path": prefix + name,
+                "mode": "040000" if child else "100644",
+            }
+        self.send_page(sorted(entries.values(), key=lambda x: x["name"]))
+
+    def api_files(self, project, path):
+        path = unquote(path)
+        content = self.server.data.files.get(path)
+        if content is None:
+            self.send_json({"message": "404 File Not Found"}, status=404)
+            return
+        encoded = content.encode("utf-8")
+        self.send_json(
+            {
+                "file_name": path.rsplit("/", 1)[-1],
+                "file_path": path,
+                "size": len(encoded),
+                "encoding": "base64",
+                "content": base64.b64encode(encoded).decode(),
+                "ref": self.arg("ref", "main"),
+            }
+        )
+
+    def api_statistics(self, project):
+        issues = self.server.data.find_issues(search=self.arg("search"))
+        counts = collections.Counter(issue["state"] for issue in issues)
+        self.send_json(
+            {
+                "statistics": {
+                    "counts": {
+                        "all": len(issues),
+                        "opened": counts["opened"],
+                        "closed": counts["closed"],
+                    }
+                }
+            }
+        )
+
+    def api_search(self, project):
+        if self.arg("scope") != "issues":
+            self.send_json(
+                {"message": "scope does not have a valid value"}, 400
+            )
+            return
+        self.send_page(
+            self.server.data.find_issues(
+                state=self.arg("state"), search=self.arg("search")
+            )
+        )
+
+
+class FakeGitLab(ThreadingHTTPServer):
+    """Local HTTP server that stands in for the GitLab REST API.
+
+    Parameters
+    ----------
+        data: FakeGitLabData
+            The projects data (default: generated with default volume)
+        latency: dict
+            Latency (s) of every endpoint by endpoint name (e.g. "issues",
+            "notes", "users", "tree", "files", "search"); the "default" key
+            applies to the other endpoints
+        rate_limit: float
+            Number of requests per second; further requests get a
+            "429 Too Many Requests" response
+        host, port: str, int
+            Address of the server (default: a free local port)
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        data=None,
+        latency=None,
+        rate_limit=None,
+        host="127.0.0.1",
+        port=0,
+    ):
+        super().__init__((host, port), FakeGitLabHandler)
+        self.data = data or FakeGitLabData()
+        self.latency = dict(latency or {})
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def reset_stats(self):
+        """Reset the request counts and return the previous counts"""
+        with self._stats_lock:
+            stats = self.stats
+            self.stats = collections.Counter()
+        return stats
+
+    def start(self):
+        """Serve the requests in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def parse_latency(values):
+    """Parse `endpoint=seconds` options into a latency dictionary"""
+    latency = {}
+    for value in values:
+        name, _, seconds = value.partition("=")
+        latency[name] = float(seconds)
+    return latency
+
+
+@click.command()
+@click.option("--port", default=8080, help="Port of the server.")
+@click.option("--issues", default=1000, help="Number of issues.")
+@click.option("--notes", default=20, help="Number of notes per issue.")
+@click.option("--members", default=200, help="Number of project members.")
+@click.option("--models", default=3, help="Number of model checkpoints.")
+@click.option(
+    "--latency",
+    multiple=True,
+    help="Latency of an endpoint, e.g. notes=0.05 or default=0.02.",
+)
+@click.option("--rate-limit", type=float, help="Requests per second.")
+def serve(port, issues, notes, members, models, latency, rate_limit):
+    """Run the fake GitLab server"""
+    data = FakeGitLabData(
+        num_issues=issues,
+        notes_per_issue=notes,
+        num_members=members,
+        num_models=models,
+    )
+    server = FakeGitLab(
+        data, parse_latency(latency), rate_limit, host="0.0.0.0", port=port
+    )
+    print(f"Fake GitLab server on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,739 @@
+"""Multi-user load test of the dashboard against the fake GitLab server.
+
+Simulated users replay realistic sessions (home tab paging, searching,
+opening pipelines and receiving live updates, building simple and advanced
+requests, browsing the HSM grid) by sending the Dash callback requests of
+the browser over HTTP. The report shows the throughput, the p50/p95/p99
+latency per callback, and the GitLab requests per user action.
+
+Run it with:
+
+    python -m benchmarks.load_test --users 20 --duration 60
+
+By default, the fake GitLab server and a production dashboard server are
+started locally. Use `--dashboard-url` to test an already running dashboard
+that uses the fake GitLab server (`--gitlab-port`).
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import click
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from .fake_gitlab import FakeGitLab, FakeGitLabData, parse_latency
+
+PREFIX = "/local-dashboard/"
+
+# Number of concurrent requests of a browser to a host
+BROWSER_CONNECTIONS = 6
+
+# DCOR dataset of the simulated requests
+DCOR_DATASET = "89bf2177-ffeb-9893-83cc-b619fc2f6663"
+
+
+def stringify_id(component_id):
+    """Return the id of a component as used by the Dash renderer"""
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(",", ":"))
+    return component_id
+
+
+def split_outputs(output):
+    """Split the output string of a callback into (id, property) pairs"""
+    parts = output[2:-2].split("...") if output.startswith("..") else [output]
+    return [tuple(part.rsplit(".", 1)) for part in parts]
+
+
+def component_name(spec_id, prop):
+    """Return the `name.property` of a dependency (the type of a pattern
+    matching id, without the duplicate output suffix)"""
+    if spec_id.startswith("{"):
+        spec_id = json.loads(spec_id)["type"]
+    return f"{spec_id}.{prop.split('@')[0]}"
+
+
+def percentile(values, fraction):
+    """Return a percentile (nearest rank) of a list of values"""
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class DashClient:
+    """Minimal Dash renderer that sends the callback requests of a browser
+    session and keeps the returned property values.
+
+    Parameters
+    ----------
+        url: str
+            URL of the dashboard (including the pathname prefix)
+        callbacks: list
+            The callback dependencies of the dashboard (fetched if None)
+    """
+
+    def __init__(self, url, callbacks=None, timeout=120):
+        self.url = url.rstrip("/") + "/"
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Resend requests on closed keep-alive connections like a browser
+        retries = Retry(total=3, read=2, allowed_methods=None, status=0)
+        self.session.mount("http://", HTTPAdapter(max_retries=retries))
+        self.callbacks = (
+            callbacks
+            or self.session.get(
+                f"{self.url}_dash-dependencies", timeout=timeout
+            ).json()
+        )
+        # Property values by (stringified component id, property)
+        self.store = {}
+        self._store_lock = threading.Lock()
+
+    def find_callback(self, output, trigger):
+        """Return the server-side callback that has the given output and
+        trigger input (`name.property`, see `component_name`)"""
+        for spec in self.callbacks:
+            if spec.get("clientside_function"):
+                continue
+            outputs = [
+                component_name(*o) for o in split_outputs(spec["output"])
+            ]
+            inputs = [
+                component_name(item["id"], item["property"])
+                for item in spec["inputs"]
+            ]
+            if output in outputs and trigger in inputs:
+                return spec
+        raise KeyError(f"No callback of {output} triggered by {trigger}")
+
+    def known_ids(self, pattern, prop):
+        """Return the ids of the known components that match a pattern"""
+        fixed = {k: v for k, v in pattern.items() if not isinstance(v, list)}
+        with self._store_lock:
+            keys = list(self.store)
+        ids = []
+        for key, key_prop in keys:
+            if key_prop != prop or not key.startswith("{"):
+                continue
+            component_id = json.loads(key)
+            if all(component_id.get(k) == v for k, v in fixed.items()):
+                ids.append(component_id)
+        return sorted(ids, key=stringify_id)
+
+    def resolve(self, spec_id, prop, values, index, with_value=True):
+        """Return the request entry (or entries of an ALL pattern) of a
+        dependency"""
+        prop = prop.split("@")[0]
+        pattern = json.loads(spec_id) if spec_id.startswith("{") else None
+        match_all = pattern is not None and ["ALL"] in pattern.values()
+        if match_all:
+            ids = self.known_ids(pattern, prop)
+        elif pattern is not None:
+            ids = [
+                {
+                    k: index if isinstance(v, list) else v
+                    for k, v in pattern.items()
+                }
+            ]
+        else:
+            ids = [spec_id]
+
+        entries = []
+        for component_id in ids:
+            entry = {"id": component_id, "property": prop}
+            if with_value:
+                name = component_name(spec_id, prop)
+                key = (stringify_id(component_id), prop)
+                if name in values:
+                    entry["value"] = values[name]
+                elif key in self.store:
+                    entry["value"] = self.store[key]
+            entries.append(entry)
+        return entries if match_all else entries[0]
+
+    def call(self, output, trigger, values=None, index=None):
+        """Send the request of a callback (and poll the job of a background
+        callback until it is done). Returns the HTTP status code."""
+        values = values or {}
+        spec = self.find_callback(output, trigger)
+        outputs = [
+            self.resolve(spec_id, prop, values, index, with_value=False)
+            for spec_id, prop in split_outputs(spec["output"])
+        ]
+        inputs = []
+        changed = []
+        for item in spec["inputs"]:
+            entry = self.resolve(item["id"], item["property"], values, index)
+            inputs.append(entry)
+            if component_name(item["id"], item["property"]) == trigger:
+                for triggered in entry if isinstance(entry, list) else [entry]:
+                    changed.append(
+                        f"{stringify_id(triggered['id'])}.{item['property']}"
+                    )
+        body = {
+            "output": spec["output"],
+            "outputs": (
+                outputs if spec["output"].startswith("..") else outputs[0]
+            ),
+            "inputs": inputs,
+            "state": [
+                self.resolve(item["id"], item["property"], values, index)
+                for item in spec["state"]
+            ],
+            "changedPropIds": changed,
+        }
+
+        url = f"{self.url}_dash-update-component"
+        response = self.session.post(url, json=body, timeout=self.timeout)
+        job = response.json() if response.status_code == 200 else {}
+        if "cacheKey" in job:
+            interval = spec.get("long", {}).get("interval", 1000) / 1000
+            params = {"cacheKey": job["cacheKey"], "job": job["job"]}
+            deadline = time.monotonic() + self.timeout
+            while "response" not in job and response.status_code == 200:
+                if time.monotonic() > deadline:
+                    raise requests.Timeout(f"Job of {output} timed out")
+                time.sleep(interval)
+                response = self.session.post(
+                    url,
+                    params=params,
+                    json=body,
+                    timeout=self.timeout,
+                )
+                job = response.json() if response.status_code == 200 else {}
+
+        with self._store_lock:
+            for component_id, props in job.get("response", {}).items():
+                for prop, value in props.items():
+                    self.store[(component_id, prop)] = value
+        return response.status_code
+
+
+class LoadTestResults:
+    """Thread-safe collection of the callback and action timings"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.callbacks = {}
+        self.errors = {}
+        self.actions = {}
+        self.gitlab_calls = {}
+
+    def add_callback(self, name, duration, ok):
+        with self.lock:
+            self.callbacks.setdefault(name, []).append(duration)
+            self.errors[name] = self.errors.get(name, 0) + (not ok)
+
+    def add_action(self, name, duration, gitlab_calls=None):
+        with self.lock:
+            self.actions.setdefault(name, []).append(duration)
+            if gitlab_calls is not None:
+                self.gitlab_calls.setdefault(name, []).append(gitlab_calls)
+
+
+class LoadUser:
+    """A simulated user that replays the sessions of the dashboard
+
+    Parameters
+    ----------
+        fake_gitlab: FakeGitLab
+            The GitLab server of the dashboard (its requests are counted per
+            action if `count_gitlab` is True, i.e. for a single user)
+    """
+
+    def __init__(
+        self,
+        url,
+        callbacks,
+        fake_gitlab,
+        results,
+        seed=0,
+        think_time=1.0,
+        count_gitlab=False,
+    ):
+        self.client = DashClient(url, callbacks)
+        self.prefix = urlsplit(url).path.rstrip("/") + "/"
+        self.fake_gitlab = fake_gitlab
+        self.data = fake_gitlab.data
+        self.results = results
+        self.rng = random.Random(seed)
+        self.think_time = think_time
+        self.count_gitlab = count_gitlab
+
+    def request(self, name, output, trigger, values=None, index=None):
+        """Send a callback request and record its latency"""
+        start = time.perf_counter()
+        try:
+            ok = self.client.call(output, trigger, values, index) < 400
+        except (requests.RequestException, ValueError):
+            ok = False
+        self.results.add_callback(name, time.perf_counter() - start, ok)
+
+    def action(self, name, requests_args, indexes=None):
+        """Perform a user action: send the callback requests of the action
+        (one per component index, concurrently like a browser)"""
+        if self.count_gitlab:
+            self.fake_gitlab.reset_stats()
+        start = time.perf_counter()
+        if indexes is None:
+            for args in requests_args:
+                self.request(*args)
+        else:
+            with ThreadPoolExecutor(BROWSER_CONNECTIONS) as executor:
+                futures = [
+                    executor.submit(self.request, *args, index=index)
+                    for args in requests_args
+                    for index in indexes
+                ]
+                for future in futures:
+                    future.result()
+        duration = time.perf_counter() - start
+        calls = None
+        if self.count_gitlab:
+            calls = sum(self.fake_gitlab.reset_stats().values())
+        self.results.add_action(name, duration, calls)
+        if self.think_time:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+
+    def open_page(self, path=""):
+        self.action(
+            f"open page /{path}",
+            [
+                (
+                    "render_page_content",
+                    "page-content.children",
+                    "url.pathname",
+                    {"url.pathname": f"{self.prefix}{path}"},
+                )
+            ],
+        )
+
+    def home_session(self):
+        """Browse the pipelines: list, page, search, open pipelines and
+        receive their live updates"""
+        self.open_page()
+        tab_values = {
+            "main_tabs.value": "opened",
+            "opened_pagination.active_page": 1,
+            "closed_pagination.active_page": 1,
+            "pipeline_filter.value": "",
+        }
+
+        def list_pipelines(action, trigger):
+            self.action(
+                action,
+                [
+                    (
+                        "route_tab_request",
+                        "pipeline_list_query.data",
+                        trigger,
+                        dict(tab_values),
+                    ),
+                    (
+                        "switch_tabs",
+                        "opened_content.children",
+                        "pipeline_list_query.data",
+                    ),
+                ],
+            )
+
+        list_pipelines("list pipelines", "main_tabs.value")
+        for page in range(2, self.rng.randint(1, 3) + 1):
+            tab_values["opened_pagination.active_page"] = page
+            list_pipelines("page pipelines", "opened_pagination.active_page")
+        tab_values["opened_pagination.active_page"] = 1
+
+        opened = self.data.find_issues(state="opened")[:10]
+        shown = [issue["iid"] for issue in opened]
+        for iid in self.rng.sample(shown, min(2, len(shown))):
+            self.action(
+                "open pipeline",
+                [
+                    (
+                        "show_pipeline_data",
+                        "pipeline_comments.children",
+                        "pipeline_accordion.value",
+                        {"pipeline_accordion.value": str(iid)},
+                    ),
+                    (
+                        "manage_pipeline_status",
+                        "pipeline_popup.is_open",
+                        "pipeline_accordion.value",
+                        {
+                            "pipeline_accordion.value": str(iid),
+                            "main_tabs.value": "opened",
+                        },
+                    ),
+                ],
+                indexes=shown,
+            )
+        for n_intervals in range(1, 3):
+            self.action(
+                "live update",
+                [
+                    (
+                        "push_pipeline_updates",
+                        "pipeline_live.data",
+                        "pipeline_live_interval.n_intervals",
+                        {
+                            "pipeline_live_interval.n_intervals": n_intervals,
+                            "main_tabs.value": "opened",
+                        },
+                    )
+                ],
+            )
+
+        tab_values["pipeline_filter.value"] = (
+            f"request {self.rng.randint(1, 99)}"
+        )
+        list_pipelines("search pipelines", "pipeline_filter.value")
+        tab_values["main_tabs.value"] = "closed"
+        list_pipelines("list closed pipelines", "main_tabs.value")
+
+    def select_data(self):
+        """Browse the HSM grid and add a DCOR dataset"""
+        self.action(
+            "browse HSM grid",
+            [
+                (
+                    "load_hms_grid_data",
+                    "hsm_grid.rowData",
+                    "pipeline_accord.active_item",
+                    {"pipeline_accord.active_item": "hsm_accord"},
+                )
+            ],
+        )
+        rows = self.client.store.get(("hsm_grid", "rowData")) or []
+        selected = self.rng.sample(rows, min(3, len(rows)))
+        self.action(
+            "select HSM files",
+            [
+                (
+                    "cache_user_given_hsm_files",
+                    "cache_hsm_files.data",
+                    "hsm_grid.selectedRows",
+                    {
+                        "hsm_grid.selectedRows": selected,
+                        "cache_hsm_files.data": [],
+                    },
+                ),
+            ],
+        )
+        self.action(
+            "add DCOR dataset",
+            [
+                (
+                    "cache_user_given_dcor_files",
+                    "cache_dcor_files.data",
+                    "dcor_button.n_clicks",
+                    {
+                        "dcor_button.n_clicks": 1,
+                        "dcor_drop_down.value": "DCOR",
+                        "dcor_text_input.value": DCOR_DATASET,
+                        "cache_dcor_files.data": [],
+                    },
+                ),
+                (
+                    "update_show_grid_data",
+                    "show_grid.rowData",
+                    "cache_dcor_files.data",
+                    {"cache_hsm_files.data": []},
+                ),
+            ],
+        )
+
+    def request_session(self, kind):
+        """Build a simple or advanced pipeline request"""
+        prefix = "simple" if kind == "simple" else "advance"
+        self.open_page(f"{kind}_request")
+        self.action(
+            "show UNET models",
+            [
+                (
+                    "fetch_and_show_unet_models",
+                    f"{prefix}_unet_model.children",
+                    f"{prefix}_unet_click.value",
+                    {f"{prefix}_unet_click.value": ["mlunet"]},
+                )
+            ],
+        )
+        self.select_data()
+        self.action(
+            f"build {kind} request",
+            [
+                (
+                    "toggle_and_cache_params",
+                    f"cache_{prefix}_params.data",
+                    f"{prefix}_unet_click.value",
+                    {f"{prefix}_unet_click.value": ["mlunet"]},
+                ),
+                (
+                    f"collect_{kind}_pipeline_params",
+                    f"cache_{prefix}_template.data",
+                    "title_drop.value",
+                    {
+                        "title_drop.value": self.rng.choice(self.data.members)[
+                            "name"
+                        ],
+                        "titel_text.value": "Load test request",
+                        "title_text.value": "Load test request",
+                        "show_grid.selectedRows": self.client.store.get(
+                            ("show_grid", "rowData")
+                        ),
+                    },
+                ),
+            ],
+        )
+
+    def run_session(self):
+        """Replay a random session"""
+        session = self.rng.choices(
+            ["home", "simple", "advanced"], weights=[6, 2, 2]
+        )[0]
+        if session == "home":
+            self.home_session()
+        else:
+            self.request_session(session)
+
+
+def start_dashboard(gitlab_url, port, workers, threads, work_dir):
+    """Start a production dashboard server that uses the fake GitLab"""
+    env = {
+        **os.environ,
+        "REPO_URL": gitlab_url,
+        "REPO_TOKEN": "load-test",
+        "PROJECT_NUM": "1",
+        "DVC_REPO_TOKEN": "load-test",
+        "DVC_REPO_PROJECT_NUM": "2",
+        "BASENAME_PREFIX": PREFIX,
+        "CACHE_DIR": str(Path(work_dir) / "cache"),
+        "JOBS_DIR": str(Path(work_dir) / "jobs"),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "dashboard",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+        ],
+        env=env,
+        cwd=Path(__file__).parents[1],
+    )
+    url = f"http://127.0.0.1:{port}{PREFIX}"
+    for _ in range(120):
+        try:
+            if requests.get(f"{url}healthz", timeout=1).status_code == 200:
+                return process, url
+        except requests.RequestException:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("The dashboard server did not start")
+
+
+def calibrate_actions(url, callbacks, fake_gitlab, results):
+    """Replay every session once with a single user to count the GitLab
+    requests of every user action"""
+    user = LoadUser(
+        url, callbacks, fake_gitlab, results, think_time=0, count_gitlab=True
+    )
+    user.home_session()
+    user.request_session("simple")
+    user.request_session("advanced")
+
+
+def run_load(url, callbacks, fake_gitlab, results, users, duration, think):
+    """Run concurrent users for the given duration (s)"""
+    stop = time.monotonic() + duration
+
+    def run_user(seed):
+        user = LoadUser(url, callbacks, fake_gitlab, results, seed, think)
+        while time.monotonic() < stop:
+            user.run_session()
+
+    with ThreadPoolExecutor(users) as executor:
+        list(executor.map(run_user, range(users)))
+
+
+def format_report(results, elapsed, users, gitlab_calls, calibration=None):
+    """Format the load test results as text tables"""
+    num_requests = sum(len(v) for v in results.callbacks.values())
+    num_actions = sum(len(v) for v in results.actions.values())
+    lines = [
+        f"Users: {users}, duration: {elapsed:.1f} s",
+        f"Actions: {num_actions} ({num_actions / elapsed:.1f}/s), "
+        f"callback requests: {num_requests} ({num_requests / elapsed:.1f}/s), "
+        f"errors: {sum(results.errors.values())}",
+        f"GitLab requests: {gitlab_calls} ({gitlab_calls / elapsed:.1f}/s, "
+        f"{gitlab_calls / max(num_actions, 1):.1f} per action)",
+        "",
+    ]
+
+    def table(title, timings, errors=None):
+        header = f"{title:<32}{'count':>7}"
+        if errors is not None:
+            header += f"{'errors':>8}"
+        lines.append(header + f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, durations in sorted(timings.items()):
+            line = f"{name:<32}{len(durations):>7}"
+            if errors is not None:
+                line += f"{errors.get(name, 0):>8}"
+            lines.append(
+                line
+                + "".join(
+                    f"{percentile(durations, q) * 1e3:>10.0f}"
+                    for q in (0.5, 0.95, 0.99)
+                )
+            )
+        lines.append("")
+
+    table("Callback", results.callbacks, results.errors)
+    table("Action", results.actions)
+
+    if calibration:
+        lines.append(f"{'GitLab requests per action (1 user)':<40}{'mean':>8}")
+        for name, calls in sorted(calibration.gitlab_calls.items()):
+            lines.append(f"{name:<40}{sum(calls) / len(calls):>8.1f}")
+    return "\n".join(lines)
+
+
+def pipeline_bot(fake_gitlab, rate, stop):
+    """Add job comments to running pipelines (`rate` comments per second),
+    so that the shown pipelines receive live updates"""
+    data = fake_gitlab.data
+    rng = random.Random(0)
+    opened = [issue["iid"] for issue in data.find_issues(state="opened")[:20]]
+    while opened and not stop.wait(1 / rate):
+        iid = rng.choice(opened)
+        data.add_note(iid, f"Completed job {rng.randint(1, 50)}", data.bot)
+
+
+@click.command()
+@click.option("--users", default=10, help="Number of concurrent users.")
+@click.option("--duration", default=60.0, help="Duration of the test (s).")
+@click.option("--think-time", default=1.0, help="Mean think time (s).")
+@click.option("--dashboard-url", help="URL of a running dashboard.")
+@click.option("--port", default=8051, help="Port of the started dashboard.")
+@click.option("--workers", default=4, help="Workers of the dashboard.")
+@click.option("--threads", default=4, help="Threads of every worker.")
+@click.option("--gitlab-port", default=0, help="Port of the fake GitLab.")
+@click.option("--issues", default=1000, help="Number of issues.")
+@click.option("--notes", default=20, help="Number of notes per issue.")
+@click.option("--members", default=200, help="Number of project members.")
+@click.option(
+    "--latency",
+    multiple=True,
+    default=["default=0.02"],
+    help="Latency of a GitLab endpoint, e.g. notes=0.05.",
+)
+@click.option("--rate-limit", type=float, help="GitLab requests per second.")
+@click.option(
+    "--note-rate", default=1.0, help="New pipeline comments per second."
+)
+@click.option(
+    "--calibrate/--no-calibrate",
+    default=True,
+    help="Count the GitLab requests of every action with a single user.",
+)
+@click.option("--json-report", type=click.Path(), help="Write raw timings.")
+def main(
+    users,
+    duration,
+    think_time,
+    dashboard_url,
+    port,
+    workers,
+    threads,
+    gitlab_port,
+    issues,
+    notes,
+    members,
+    latency,
+    rate_limit,
+    note_rate,
+    calibrate,
+    json_report,
+):
+    """Run a multi-user load test of the dashboard"""
+    data = FakeGitLabData(
+        num_issues=issues, notes_per_issue=notes, num_members=members
+    )
+    fake_gitlab = FakeGitLab(
+        data, parse_latency(latency), rate_limit, port=gitlab_port
+    ).start()
+    process = None
+    work_dir = tempfile.TemporaryDirectory(prefix="dashboard-load-test-")
+    stop_bot = threading.Event()
+    try:
+        if dashboard_url:
+            url = dashboard_url.rstrip("/") + "/"
+        else:
+            process, url = start_dashboard(
+                fake_gitlab.url, port, workers, threads, work_dir.name
+            )
+        callbacks = requests.get(f"{url}_dash-dependencies").json()
+
+        calibration = None
+        if calibrate:
+            calibration = LoadTestResults()
+            calibrate_actions(url, callbacks, fake_gitlab, calibration)
+
+        threading.Thread(
+            target=pipeline_bot,
+            args=(fake_gitlab, note_rate, stop_bot),
+            daemon=True,
+        ).start()
+        fake_gitlab.reset_stats()
+        results = LoadTestResults()
+        start = time.perf_counter()
+        run_load(
+            url, callbacks, fake_gitlab, results, users, duration, think_time
+        )
+        elapsed = time.perf_counter() - start
+        gitlab_calls = sum(fake_gitlab.reset_stats().values())
+
+        print(
+            format_report(results, elapsed, users, gitlab_calls, calibration)
+        )
+        if json_report:
+            with open(json_report, "w", encoding="utf-8") as file:
+                json.dump(
+                    {
+                        "callbacks": results.callbacks,
+                        "actions": results.actions,
+                        "errors": results.errors,
+                        "gitlab_calls": gitlab_calls,
+                        "elapsed": elapsed,
+                    },
+                    file,
+                )
+    finally:
+        stop_bot.set()
+        if process:
+            process.terminate()
+            process.wait()
+        fake_gitlab.stop()
+        work_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Benchmark of the HSM drive scanner (`cache_handler.py`) on synthetic
+HSM-like directory trees.
+
+The trees have a configurable depth, fan-out, number of files per
+measurement folder, and suffix mix. The files are sparse, so that trees
+with millions of (large) files need almost no disk space. Every scanner mode
+runs in a fresh process and the scan time, filesystem calls per file, peak
+memory, and output size are reported.
+
+Run it with:
+
+    python -m benchmarks.scanner_bench run --depth 4 --fanout 10 --files 100
+
+and compare against a saved baseline to catch regressions:
+
+    python -m benchmarks.scanner_bench run --save baseline.json
+    python -m benchmarks.scanner_bench run --baseline baseline.json
+"""
+
+import builtins
+import contextlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from cache_handler import DriveFileScanner  # noqa: E402
+from hsm_snapshot import MANIFEST_FILE, read_manifest  # noqa: E402
+
+# Default directory of the generated trees
+TREES_DIR = Path(__file__).parents[1] / "resources" / "bench_trees"
+
+# Parameters of a generated tree are kept in this file of the tree
+TREE_INFO = "tree.json"
+
+# Files that are smaller than 1 MB are skipped by the scanner
+MIN_SIZE = 1024**2
+
+# Filesystem functions that are counted during a scan
+COUNTED_CALLS = ("stat", "lstat", "scandir", "listdir", "open")
+
+
+def scan_walk(drive_path, result_path):
+    """Scan with `os.walk` and pickle all the entries at the end"""
+    scanner = DriveFileScanner(drive_path, result_path, ".rtdc", "HSMFS")
+    scanner.process_drive()
+
+
+def scan_partitioned(drive_path, result_path):
+    """Scan with `os.walk` to a snapshot per top-level folder (written to
+    the directory `result_path` without suffix)"""
+    scanner = DriveFileScanner(
+        drive_path,
+        partitions_dir(result_path),
+        ".rtdc",
+        "HSMFS",
+        partitioned=True,
+    )
+    scanner.process_drive()
+
+
+def partitions_dir(result_path):
+    return Path(result_path).with_suffix("")
+
+
+# Scanner modes by name
+SCANNER_MODES = {"walk": scan_walk, "partitioned": scan_partitioned}
+
+
+def parse_suffix_mix(value):
+    """Parse a suffix mix like `.rtdc=0.7,.txt=0.3` into a dictionary"""
+    mix = {}
+    for item in value.split(","):
+        suffix, _, weight = item.partition("=")
+        mix[suffix.strip()] = float(weight or 1)
+    return mix
+
+
+def generate_tree(root, depth, fanout, files, suffix_mix, small_ratio, seed):
+    """Generate a synthetic HSM drive (`<root>/HSMFS/Data/...`) with
+    `fanout ** depth` measurement folders of `files` sparse files each.
+    A tree that has already been generated with the same parameters is
+    reused. Returns the path of the `Data` directory."""
+    params = {
+        "depth": depth,
+        "fanout": fanout,
+        "files": files,
+        "suffix_mix": suffix_mix,
+        "small_ratio": small_ratio,
+        "seed": seed,
+    }
+    root = Path(root)
+    data_dir = root / "HSMFS" / "Data"
+    info_path = root / TREE_INFO
+    if info_path.exists():
+        info = json.loads(info_path.read_text(encoding="utf-8"))
+        if info["params"] == params:
+            return data_dir
+        raise click.ClickException(
+            f"{root} contains a tree with other parameters: {info['params']}"
+        )
+
+    rng = random.Random(seed)
+    suffixes = list(suffix_mix)
+    weights = list(suffix_mix.values())
+    counts = dict.fromkeys(suffixes, 0)
+    scanned = 0
+
+    def fill(folder, level):
+        nonlocal scanned
+        folder.mkdir(parents=True, exist_ok=True)
+        if level == depth:
+            for idx in range(files):
+                suffix = rng.choices(suffixes, weights)[0]
+                if rng.random() < small_ratio:
+                    size = rng.randint(0, MIN_SIZE - 1)
+                else:
+                    size = int(MIN_SIZE * 10 ** rng.uniform(0, 4))
+                path = folder / f"M{idx + 1:03d}_data{suffix}"
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+                try:
+                    os.ftruncate(fd, size)
+                finally:
+                    os.close(fd)
+                counts[suffix] += 1
+                scanned += suffix == ".rtdc" and size >= MIN_SIZE
+            return
+        for idx in range(fanout):
+            fill(
+                folder / f"{'group' if level == 0 else 'dir'}_{idx}", level + 1
+            )
+
+    fill(data_dir, 0)
+    info = {"params": params, "counts": counts, "scanned_files": scanned}
+    info_path.write_text(json.dumps(info), encoding="utf-8")
+    return data_dir
+
+
+@contextlib.contextmanager
+def count_calls(counter):
+    """Count the calls of the filesystem functions of `os` (and `open`)"""
+    originals = {}
+    for name in COUNTED_CALLS:
+        module = builtins if name == "open" else os
+        func = originals[name] = getattr(module, name)
+
+        def counted(*args, _func=func, _name=name, **kwargs):
+            counter[_name] += 1
+            return _func(*args, **kwargs)
+
+        setattr(module, name, counted)
+    try:
+        yield counter
+    finally:
+        for name, func in originals.items():
+            setattr(builtins if name == "open" else os, name, func)
+
+
+def measure(mode, data_dir, result_path):
+    """Run a scanner mode and return its measurements"""
+    counter = dict.fromkeys(COUNTED_CALLS, 0)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with count_calls(counter):
+        SCANNER_MODES[mode](data_dir, result_path)
+    duration = time.perf_counter() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode,
+        "time": duration,
+        "fs_calls": sum(counter.values()),
+        "calls": counter,
+        # ru_maxrss is in kB on Linux
+        "peak_memory_mb": rss_peak / 1024,
+        "memory_growth_mb": (rss_peak - rss_before) / 1024,
+        "output_bytes": output_size(result_path),
+    }
+
+
+def output_size(result_path):
+    """Return the size of all the output files of a scan"""
+    result_path = Path(result_path)
+    paths = [result_path] if result_path.exists() else []
+    paths += list(result_path.parent.glob(f"{result_path.name}.*"))
+    directory = partitions_dir(result_path)
+    if directory.is_dir():
+        # Manifest and partition snapshots of the partitioned mode
+        manifest = read_manifest(directory)
+        paths.append(directory / MANIFEST_FILE)
+        paths += [
+            directory / info["file"]
+            for info in manifest["partitions"].values()
+        ]
+    return sum(path.stat().st_size for path in paths if path.is_file())
+
+
+def run_mode(mode, data_dir, work_dir):
+    """Run a scanner mode in a fresh process and return its measurements"""
+    result_path = Path(work_dir) / mode / "hsm_drive.pkl"
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.scanner_bench",
+            "measure",
+            mode,
+            str(data_dir),
+            str(result_path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).parents[1],
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def format_results(results, scanned_files):
+    lines = [
+        f"{'mode':<12}{'time s':>10}{'files/s':>12}{'fs calls/file':>15}"
+        f"{'peak MB':>10}{'output MB':>11}"
+    ]
+    for result in results:
+        per_file = max(scanned_files, 1)
+        lines.append(
+            f"{result['mode']:<12}{result['time']:>10.2f}"
+            f"{scanned_files / result['time']:>12.0f}"
+            f"{result['fs_calls'] / per_file:>15.2f}"
+            f"{result['peak_memory_mb']:>10.1f}"
+            f"{result['output_bytes'] / 1024**2:>11.2f}"
+        )
+    return "\n".join(lines)
+
+
+def find_regressions(results, baseline, tolerance):
+    """Compare the results with the baseline results. Returns the
+    regressions (time, memory, calls, or output larger than the baseline by
+    more than the tolerance)."""
+    baseline = {result["mode"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        base = baseline.get(result["mode"])
+        if base is None:
+            continue
+        for key in ("time", "peak_memory_mb", "fs_calls", "output_bytes"):
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(
+                    f"{result['mode']}: {key} {result[key]:.4g} > "
+                    f"{base[key]:.4g} (baseline)"
+                )
+    return regressions
+
+
+@click.group()
+def cli():
+    """Benchmark the HSM drive scanner"""
+
+
+@cli.command()
+@click.option("--root", type=click.Path(), help="Directory of the tree.")
+@click.option("--depth", default=3, help="Levels of folders below Data.")
+@click.option("--fanout", default=5, help="Subfolders of every folder.")
+@click.option("--files", default=20, help="Files per measurement folder.")
+@click.option(
+    "--suffix-mix",
+    default=".rtdc=0.6,.ini=0.2,.log=0.2",
+    help="Weights of the file suffixes.",
+)
+@click.option("--small-ratio", default=0.1, help="Ratio of files < 1 MB.")
+@click.option("--seed", default=0, help="Random seed.")
+@click.option(
+    "--mode",
+    "modes",
+    multiple=True,
+    type=click.Choice(list(SCANNER_MODES)),
+    help="Scanner modes (default: all).",
+)
+@click.option("--repeat", default=1, help="Runs per mode (fastest is kept).")
+@click.option("--save", type=click.Path(), help="Save the results (JSON).")
+@click.option("--baseline", type=click.Path(exists=True))
+@click.option("--tolerance", default=0.2, help="Allowed regression ratio.")
+def run(
+    root,
+    depth,
+    fanout,
+    files,
+    suffix_mix,
+    small_ratio,
+    seed,
+    modes,
+    repeat,
+    save,
+    baseline,
+    tolerance,
+):
+    """Generate a synthetic tree (if needed) and benchmark scanner modes"""
+    root = Path(root or TREES_DIR / f"d{depth}_f{fanout}_n{files}_s{seed}")
+    mix = parse_suffix_mix(suffix_mix)
+    start = time.perf_counter()
+    data_dir = generate_tree(
+        root, depth, fanout, files, mix, small_ratio, seed
+    )
+    info = json.loads((root / TREE_INFO).read_text(encoding="utf-8"))
+    print(
+        f"Tree {root}: {sum(info['counts'].values())} files, "
+        f"{info['scanned_files']} scanned .rtdc files "
+        f"(ready in {time.perf_counter() - start:.1f} s)"
+    )
+
+    results = []
+    for mode in modes or SCANNER_MODES:
+        runs = [run_mode(mode, data_dir, root / "out") for _ in range(repeat)]
+        results.append(min(runs, key=lambda x: x["time"]))
+    print(format_results(results, info["scanned_files"]))
+
+    if save:
+        with open(save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if baseline:
+        with open(baseline, encoding="utf-8") as file:
+            regressions = find_regressions(results, json.load(file), tolerance)
+        if regressions:
+            print("Regressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+
+
+@cli.command(name="measure", hidden=True)
+@click.argument("mode")
+@click.argument("data_dir")
+@click.argument("result_path")
+def measure_command(mode, data_dir, result_path):
+    """Run a scanner mode and print the measurements as JSON"""
+    print(json.dumps(measure(mode, Path(data_dir), Path(result_path))))
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,85 +1,1326 @@
 from datetime import datetime as dt, timedelta
 from pathlib import Path
+import argparse
+import collections
+import contextlib
+import cProfile
+import ctypes
+import itertools
+import json
+import multiprocessing
 import pickle
 import os
+import pstats
+import select
+import shutil
+import sqlite3
+import struct
+import threading
 import time
 
+try:
+    import h5py
+except ImportError:
+    # The metadata of .rtdc files is not extracted without h5py
+    h5py = None
+
+from hsm_snapshot import (
+    DELTA_FORMAT,
+    SNAPSHOT_FORMAT,
+    entry_key,
+    filepath_key,
+    generation_path,
+    iter_entries,
+    merge_folder_aggregates,
+    new_folder_aggregates,
+    partition_file,
+    partition_of,
+    read_header,
+    read_manifest,
+    write_manifest,
+)
+
+# Number of entries per pickled chunk
+CHUNK_SIZE = 10000
+# Number of snapshot generations and deltas that are kept
+KEEP_GENERATIONS = 2
+KEEP_DELTAS = 48
+# Seconds between the checkpoints of a scan
+CHECKPOINT_INTERVAL = 60
+# Files that are smaller are not listed (bytes)
+MIN_FILE_SIZE = 1024**2
+# Files with fewer allocated bytes than this ratio of their size are offline
+# (stubs of files that were migrated to tape)
+OFFLINE_ALLOCATED_RATIO = 0.1
+# Metadata of the .rtdc files from their HDF5 attributes
+METADATA_ATTRS = {
+    "event_count": "experiment:event count",
+    "region": "setup:chip region",
+    "flow_rate": "setup:flow rate",
+    "setup": "setup:identifier",
+}
+# Worker processes and seconds per file of the metadata extraction
+METADATA_WORKERS = 4
+METADATA_TIMEOUT = 10
+# Format of the update time of the snapshots
+UPDATE_TIME_FORMAT = "%H:%M %p, %d-%b-%y"
+
+
+def publish(src, path):
+    """Atomically publish `src` (a finished file) as `path`"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        # File systems without hard links
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class SnapshotWriter:
+    """Write the entries of a drive scan to a numbered snapshot generation
+    and the delta to the previous generation.
+
+    The entries are pickled in chunks of `chunk_size` to
+    `<path stem>.<generation><suffix>.part` while the drive is scanned, so
+    that the memory does not grow with the number of entries and a crashed
+    scan keeps the chunks written so far. When the snapshot is finalized,
+    it is renamed to the generation path, and the delta and the snapshot
+    are published with atomic renames (the current generation is also
+    available at `path`).
+
+    The entries have to be added in the order of `entry_key` to compute
+    the delta (added, removed, and modified entries) with a merge of the
+    previous generation; otherwise no delta is written. Like the entries,
+    the changes are written to `<delta path>.part` with every chunk (see
+    `hsm_snapshot.read_delta`). The aggregates of a
+    folder (see `aggregate`) are complete when the entries leave it; they
+    are written after the chunk of entries, so that only the aggregates of
+    the folders of the current entry are kept in memory. The delta contains
+    the aggregates of the folders of the changed entries.
+
+    With `resume=True`, the writer saves a checkpoint (`<path>.checkpoint`)
+    after a chunk is written every `checkpoint_interval` seconds, and
+    resumes from the checkpoint of an interrupted scan or of a partial
+    snapshot (see `finalize`). `resume_key` is then the key of the last
+    entry that was already written; the scan has to continue after it.
+    """
+
+    def __init__(
+        self,
+        path,
+        chunk_size=CHUNK_SIZE,
+        resume=False,
+        checkpoint_interval=CHECKPOINT_INTERVAL,
+    ):
+        self.path = Path(path)
+        self.chunk_size = chunk_size
+        self.chunk = []
+        self.num_entries = 0
+        # Aggregates of all the files
+        self.totals = new_folder_aggregates()
+        # Folder paths and aggregates of the folders of the last entry, and
+        # aggregates of the folders that were completed since the last chunk
+        # (see `aggregate`)
+        self.open_folders = []
+        self.closed_folders = {}
+        self.checkpoint_path = self.path.with_name(
+            self.path.name + ".checkpoint"
+        )
+        self.checkpoint_interval = checkpoint_interval if resume else None
+        self.last_checkpoint = time.monotonic()
+
+        self.previous_file = None
+        self.previous = None
+        base_generation = 0
+        if self.path.exists():
+            self.previous_file = open(self.path, "rb")
+            header = read_header(self.previous_file)
+            base_generation = header.get("generation", 0)
+            if base_generation:
+                self.previous = iter_entries(self.previous_file)
+        self.generation = base_generation + 1
+        self.last_key = None
+        self.pending = None
+        self.resume_key = None
+        self.partial = False
+        # Changes that are not written to the delta file yet
+        self.delta = {
+            "added": [],
+            "removed": [],
+            "modified": [],
+            # Aggregates of the folders of the changed entries (None for
+            # folders without files)
+            "folders": {},
+        }
+
+        self.snapshot_path = generation_path(self.path, self.generation)
+        self.part_path = self.snapshot_path.with_name(
+            self.snapshot_path.name + ".part"
+        )
+        self.delta_path = generation_path(self.path, self.generation, "delta")
+        self.delta_part_path = self.delta_path.with_name(
+            self.delta_path.name + ".part"
+        )
+        self.delta_file = None
+        checkpoint = self.read_checkpoint() if resume else None
+        if (
+            checkpoint
+            and checkpoint["generation"] == self.generation
+            and self.part_path.exists()
+            and self.part_path.stat().st_size >= checkpoint["offset"]
+        ):
+            self.resume_interrupted(checkpoint)
+            return
+
+        self.file = open(self.part_path, "wb")
+        self.dump({"format": SNAPSHOT_FORMAT, "generation": self.generation})
+        if self.previous is not None:
+            self.delta_file = open(self.delta_part_path, "wb")
+            self.dump(
+                {
+                    "format": DELTA_FORMAT,
+                    "generation": self.generation,
+                    "base_generation": base_generation,
+                },
+                self.delta_file,
+            )
+        if (
+            checkpoint
+            and checkpoint.get("partial")
+            and checkpoint["generation"] == base_generation
+        ):
+            self.resume_partial(checkpoint)
+        else:
+            self.checkpoint_path.unlink(missing_ok=True)
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "rb") as file:
+                return pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def resume_interrupted(self, checkpoint):
+        """Continue the part file of an interrupted scan after the last
+        checkpoint"""
+        self.file = open(self.part_path, "r+b")
+        self.file.truncate(checkpoint["offset"])
+        self.file.seek(checkpoint["offset"])
+        self.num_entries = checkpoint["num_entries"]
+        self.totals = checkpoint["totals"]
+        self.open_folders = checkpoint["open_folders"]
+        self.last_key = self.resume_key = checkpoint["last_key"]
+        delta = checkpoint["delta"]
+        if (
+            delta is None
+            or not self.delta_part_path.exists()
+            or self.delta_part_path.stat().st_size < delta["offset"]
+        ):
+            self.previous = None
+            self.delta_part_path.unlink(missing_ok=True)
+        elif self.previous is not None:
+            self.delta_file = open(self.delta_part_path, "r+b")
+            self.delta_file.truncate(delta["offset"])
+            self.delta_file.seek(delta["offset"])
+            self.delta["folders"] = delta["folders"]
+        if self.previous is not None and self.last_key is not None:
+            # Skip the entries of the previous generation that were merged
+            for previous in self.previous:
+                if entry_key(previous) > self.last_key:
+                    self.pending = previous
+                    break
+        print(f"Resuming the scan after {self.num_entries} entries")
+
+    def resume_partial(self, checkpoint):
+        """Start from the entries of a partial snapshot that were scanned"""
+        if checkpoint["resume_key"] is None:
+            return
+        with open(self.path, "rb") as file:
+            read_header(file)
+            for entry in iter_entries(file):
+                if entry_key(entry) > checkpoint["resume_key"]:
+                    break
+                self.add(entry)
+        self.last_key = self.resume_key = checkpoint["resume_key"]
+        print(f"Resuming the partial scan after {self.num_entries} entries")
+
+    def save_checkpoint(self, **extra):
+        """Save the state of the writer (after a chunk was written)"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        delta = None
+        if self.previous is not None:
+            self.delta_file.flush()
+            os.fsync(self.delta_file.fileno())
+            delta = {
+                "offset": self.delta_file.tell(),
+                "folders": self.delta["folders"],
+            }
+        checkpoint = {
+            "generation": self.generation,
+            "offset": self.file.tell(),
+            "num_entries": self.num_entries,
+            "totals": self.totals,
+            "open_folders": self.open_folders,
+            "last_key": self.last_key,
+            "delta": delta,
+            **extra,
+        }
+        tmp_path = self.checkpoint_path.with_name(
+            self.checkpoint_path.name + ".part"
+        )
+        with open(tmp_path, "wb") as file:
+            self.dump(checkpoint, file)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.last_checkpoint = time.monotonic()
+
+    def dump(self, obj, file=None):
+        pickle.dump(obj, file or self.file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def add(self, entry):
+        self.compare(entry)
+        self.aggregate(entry)
+        self.chunk.append(entry)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def aggregate(self, entry):
+        """Add an entry to the totals and to the aggregates of its folders
+        (number of files, total size, newest modification time, and number
+        of offline files). The folders of the previous entry that do not
+        contain the entry are completed (see `close_folders`)."""
+        item = {
+            "num_files": 1,
+            "size": entry.get("size", 0),
+            "dateModified": entry.get("dateModified"),
+            "num_offline": int(bool(entry.get("offline"))),
+        }
+        merge_folder_aggregates(self.totals, item)
+        filepath = entry["filepath"]
+        folders = [tuple(filepath[:end]) for end in range(1, len(filepath))]
+        depth = 0
+        for (folder, _), new_folder in zip(self.open_folders, folders):
+            if folder != new_folder:
+                break
+            depth += 1
+        self.close_folders(depth)
+        for folder in folders[depth:]:
+            self.open_folders.append((folder, new_folder_aggregates()))
+        for _, aggregates in self.open_folders:
+            merge_folder_aggregates(aggregates, item)
+
+    def close_folders(self, depth=0):
+        """Complete the open folders below `depth`. Their aggregates are
+        written with the next chunk. Entries that are not sorted may leave
+        and enter a folder again; the aggregates of a folder are then the
+        sum of all its records."""
+        while len(self.open_folders) > depth:
+            folder, aggregates = self.open_folders.pop()
+            closed = self.closed_folders.get(folder)
+            if closed is None:
+                self.closed_folders[folder] = aggregates
+            else:
+                merge_folder_aggregates(closed, aggregates)
+            if folder in self.delta["folders"]:
+                self.delta["folders"][folder] = aggregates
+
+    def mark_changed(self, filepath):
+        """Add the folders of a changed entry to the delta. Their aggregates
+        are set when the folders are completed."""
+        for end in range(1, len(filepath)):
+            self.delta["folders"].setdefault(tuple(filepath[:end]), None)
+
+    def compare(self, entry):
+        """Merge the entry with the entries of the previous generation"""
+        key = entry_key(entry)
+        if self.last_key is not None and key < self.last_key:
+            # Not in sorted order, no delta
+            self.previous = None
+        self.last_key = key
+        if self.previous is None:
+            return
+        while True:
+            previous = self.pending or next(self.previous, None)
+            self.pending = None
+            if previous is None or entry_key(previous) > key:
+                # Keep the previous entry for the next comparisons
+                self.pending = previous
+                self.delta["added"].append(entry)
+                self.mark_changed(entry["filepath"])
+                return
+            if entry_key(previous) == key:
+                if previous != entry:
+                    self.delta["modified"].append(entry)
+                    self.mark_changed(entry["filepath"])
+                return
+            self.delta["removed"].append(previous["filepath"])
+            self.mark_changed(previous["filepath"])
+            if len(self.delta["removed"]) >= self.chunk_size:
+                self.flush_delta()
+
+    def flush(self):
+        """Write the pending entries as a chunk, followed by the aggregates
+        of the completed folders, and the pending changes to the delta"""
+        if not self.chunk and not self.closed_folders:
+            self.flush_delta()
+            return
+        if self.chunk:
+            self.dump(self.chunk)
+            self.num_entries += len(self.chunk)
+            self.chunk = []
+        if self.closed_folders:
+            self.dump(tuple(self.closed_folders.items()))
+            self.closed_folders = {}
+        self.file.flush()
+        self.flush_delta()
+        if (
+            self.checkpoint_interval is not None
+            and time.monotonic() - self.last_checkpoint
+            > self.checkpoint_interval
+        ):
+            self.save_checkpoint()
+
+    def flush_delta(self):
+        """Write the pending changes and the aggregates of the completed
+        folders of the changed entries to the delta file"""
+        if self.delta_file is None:
+            return
+        open_folders = {folder for folder, _ in self.open_folders}
+        folders = {
+            folder: aggregates
+            for folder, aggregates in self.delta["folders"].items()
+            if folder not in open_folders
+        }
+        chunk = {
+            "added": self.delta["added"],
+            "removed": self.delta["removed"],
+            "modified": self.delta["modified"],
+            "folders": folders,
+        }
+        if any(chunk.values()):
+            self.dump(chunk, self.delta_file)
+            self.delta_file.flush()
+        self.delta = {
+            "added": [],
+            "removed": [],
+            "modified": [],
+            "folders": {
+                folder: aggregates
+                for folder, aggregates in self.delta["folders"].items()
+                if folder in open_folders
+            },
+        }
+
+    def finalize(self, update_time, partial=False):
+        """Write the footer, and publish the delta and the snapshot.
+
+        A `partial` snapshot contains the entries that were scanned and the
+        entries of the previous generation after them, so that it is
+        consistent. The next scan with `resume=True` continues after the
+        scanned entries.
+        """
+        self.partial = partial
+        resume_key = self.last_key
+        if partial and self.previous is not None:
+            # Unchanged entries of the previous generation
+            for entry in itertools.chain([self.pending], self.previous):
+                if entry is not None:
+                    self.aggregate(entry)
+                    self.chunk.append(entry)
+                    if len(self.chunk) >= self.chunk_size:
+                        self.flush()
+            self.pending = None
+        if self.previous is not None:
+            # Entries of the previous generation after the last entry
+            for entry in itertools.chain([self.pending], self.previous):
+                if entry is not None:
+                    self.delta["removed"].append(entry["filepath"])
+                    self.mark_changed(entry["filepath"])
+                    if len(self.delta["removed"]) >= self.chunk_size:
+                        self.flush_delta()
+            self.pending = None
+        self.close_folders()
+        self.flush()
+        self.dump(
+            {
+                "update_time": update_time,
+                "num_entries": self.num_entries,
+                "total_size": self.totals["size"],
+                "generation": self.generation,
+                "partial": partial,
+            }
+        )
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.part_path, self.snapshot_path)
+
+        if self.delta_file is not None:
+            self.dump({"update_time": update_time}, self.delta_file)
+            self.delta_file.close()
+            if self.previous is None:
+                # Entries not in sorted order
+                self.delta_part_path.unlink()
+            else:
+                os.replace(self.delta_part_path, self.delta_path)
+        self.close()
+
+        publish(self.snapshot_path, self.path)
+        if partial:
+            checkpoint = {
+                "generation": self.generation,
+                "partial": True,
+                "resume_key": resume_key,
+            }
+            with open(self.checkpoint_path, "wb") as file:
+                self.dump(checkpoint, file)
+        else:
+            self.checkpoint_path.unlink(missing_ok=True)
+        self.prune()
+
+    def prune(self):
+        """Remove the old generations and deltas"""
+        stem, suffix = self.path.stem, self.path.suffix
+        for path in self.path.parent.glob(f"{stem}.*{suffix}"):
+            name = path.name.removeprefix(stem + ".")
+            generation, _, kind = name.partition(".")
+            if not generation.isdigit():
+                continue
+            keep = (
+                KEEP_DELTAS if kind.startswith("delta") else KEEP_GENERATIONS
+            )
+            if int(generation) <= self.generation - keep:
+                path.unlink(missing_ok=True)
+
+    def close(self):
+        """Close the files without publishing the snapshot"""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+        if self.delta_file is not None:
+            self.delta_file.close()
+        if self.previous_file is not None:
+            self.previous_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_offline(stat):
+    """Return whether a file is migrated to tape (an offline stub of a HSM
+    file system) from its stat result: only a small part of the file has
+    allocated blocks on disk. The file is never opened, since reading
+    offline files triggers a recall from tape. Returns None if the file
+    system does not report allocated blocks."""
+    blocks = getattr(stat, "st_blocks", None)
+    if blocks is None:
+        return None
+    return blocks * 512 < stat.st_size * OFFLINE_ALLOCATED_RATIO
+
+
+def read_rtdc_metadata(path):
+    """Read the metadata of a .rtdc file from its HDF5 attributes and the
+    time of its last event (the duration of the measurement)"""
+    metadata = {}
+    with h5py.File(path, "r") as h5:
+        for key, name in METADATA_ATTRS.items():
+            if name in h5.attrs:
+                value = h5.attrs[name]
+                if isinstance(value, bytes):
+                    value = value.decode("utf-8", "replace")
+                metadata[key] = (
+                    value.item() if hasattr(value, "item") else value
+                )
+        if "events/time" in h5 and h5["events/time"].size:
+            metadata["duration"] = float(h5["events/time"][-1])
+    return metadata
+
+
+class MetadataCache:
+    """Metadata of the .rtdc files by (inode, size, mtime) in a SQLite
+    database, so that every file is read only once"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (inode INTEGER, "
+            "size INTEGER, mtime INTEGER, data TEXT, "
+            "PRIMARY KEY (inode, size, mtime))"
+        )
+
+    def get(self, key):
+        row = self.db.execute(
+            "SELECT data FROM metadata WHERE inode=? AND size=? AND mtime=?",
+            key,
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, metadata):
+        self.db.execute(
+            "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+            (*key, json.dumps(metadata)),
+        )
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+class MetadataExtractor:
+    """Add the metadata of the .rtdc files to the entries of a scan and
+    pass them on to `add` in the same order.
+
+    The metadata of files that are not in the cache is read in a pool of
+    `workers` processes. At most `workers * 4` entries wait for their
+    metadata, so the memory stays bounded. Only one file per worker is
+    submitted at a time, so that a file starts to be read when it is
+    submitted. A file that is read for more than `timeout` seconds (e.g. a
+    hanging mount) gets no metadata and the pool is replaced. Offline files
+    are never read, that would recall them from tape. Without `cache_path`
+    or h5py, the entries are passed on unchanged.
+    """
+
+    def __init__(
+        self,
+        cache_path,
+        add,
+        drive_path,
+        workers=METADATA_WORKERS,
+        timeout=METADATA_TIMEOUT,
+    ):
+        self.enabled = cache_path is not None and h5py is not None
+        self.cache = MetadataCache(cache_path) if self.enabled else None
+        self.next_add = add
+        self.drive_path = Path(drive_path)
+        self.workers = workers
+        self.timeout = timeout
+        self.pool = None
+        # Entries with their cache key (None if the metadata is not read),
+        # metadata result, and deadline of the result
+        self.queue = collections.deque()
+
+    def add(self, entry):
+        key = None
+        if (
+            self.enabled
+            and "metadata" not in entry
+            and not entry.get("offline")
+        ):
+            key = (entry["inode"], entry["size"], entry["dateModified"])
+            metadata = self.cache.get(key)
+            if metadata is not None:
+                entry["metadata"] = metadata
+                key = None
+        self.queue.append([entry, key, None, None])
+        self.submit()
+        self.drain(max_pending=self.workers * 4)
+
+    def submit(self):
+        """Submit the files of the queue that wait for a free worker"""
+        running = 0
+        for item in self.queue:
+            entry, key, result, _ = item
+            if key is None or (result is not None and result.ready()):
+                continue
+            if running >= self.workers:
+                return
+            running += 1
+            if result is None:
+                if self.pool is None:
+                    self.pool = multiprocessing.Pool(self.workers)
+                path = self.drive_path.joinpath(*entry["filepath"][2:])
+                item[2] = self.pool.apply_async(read_rtdc_metadata, (path,))
+                item[3] = time.monotonic() + self.timeout
+
+    def drain(self, max_pending=0):
+        """Pass on the entries at the start of the queue that are done (or
+        all but `max_pending` entries)"""
+        while self.queue:
+            entry, key, result, deadline = self.queue[0]
+            if key is not None and not result.ready():
+                if len(self.queue) <= max_pending:
+                    return
+                result.wait(max(deadline - time.monotonic(), 0))
+            self.queue.popleft()
+            if key is not None:
+                name = "/".join(entry["filepath"])
+                if not result.ready():
+                    metadata = {}
+                    print(f"Metadata timeout: {name}")
+                    self.restart_pool()
+                else:
+                    try:
+                        metadata = result.get()
+                    except Exception as exc:
+                        metadata = {}
+                        print(f"Metadata error: {name}: {exc}")
+                self.cache.set(key, metadata)
+                entry["metadata"] = metadata
+            self.next_add(entry)
+            self.submit()
+
+    def restart_pool(self):
+        """Replace a pool with a stuck worker and resubmit the files that
+        were not read"""
+        self.pool.terminate()
+        self.pool = None
+        for item in self.queue:
+            if item[2] is not None and not item[2].ready():
+                item[2] = item[3] = None
+        self.submit()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.drain()
+        self.close()
+
 
 class DriveFileScanner:
-    def __init__(self, drive_path, result_path, file_suffix, identifier):
+    def __init__(
+        self,
+        drive_path,
+        result_path,
+        file_suffix,
+        identifier,
+        chunk_size=CHUNK_SIZE,
+        checkpoint_interval=CHECKPOINT_INTERVAL,
+        metadata_cache=None,
+        partitioned=False,
+    ):
         self.drive_path = drive_path
         self.result_path = result_path
         self.file_suffix = file_suffix
         self.identifier = identifier
-        if not result_path.parent.is_dir():
+        self.chunk_size = chunk_size
+        self.checkpoint_interval = checkpoint_interval
+        # Extract the metadata of the files if a cache file is given
+        self.metadata_cache = metadata_cache
+        # Write a snapshot per top-level folder to the `result_path`
+        # directory (see `process_partitions`)
+        self.partitioned = partitioned
+        # Called with every directory of a scan before it is listed (see
+        # `DriveWatcher.reconcile`)
+        self.on_directory = None
+        if not partitioned and not result_path.parent.is_dir():
             result_path.parent.mkdir(parents=True, exist_ok=True)
 
-    @staticmethod
-    def get_file_size(file_path):
-        """Compute size of the file."""
-        file_size_bytes = os.path.getsize(file_path)
-        if file_size_bytes < 1024**2:  # Less than 1 MB
-            return None
-        elif file_size_bytes < 1024**3:  # Less than 1 GB
-            return f"{file_size_bytes / (1024 ** 2):.1f} MB"
-        else:
-            return f"{file_size_bytes / (1024 ** 3):.1f} GB"
-
     def save_data(self, data):
-        """Save extracted paths as a pickle file in resources dir."""
-        with open(self.result_path, "wb") as f:
-            pickle.dump(data, f)
+        """Save extracted paths as a snapshot file in resources dir."""
+        with SnapshotWriter(self.result_path, self.chunk_size) as writer:
+            for entry in data["cache_data"]:
+                writer.add(entry)
+            writer.finalize(data["update_time"])
 
-    def process_drive(self):
+    def process_drive(self, deadline=None, partitions=None):
+        """Scan the drive and publish a new snapshot generation. The scan
+        resumes from the checkpoint of an interrupted or partial scan. If
+        the scan takes longer than `deadline` seconds, a partial snapshot
+        is published (see `SnapshotWriter.finalize`).
+
+        With `partitioned=True`, every top-level folder of the drive is
+        written to its own snapshot (see `process_partitions`), and
+        `partitions` restricts the scan to some of them."""
         t1 = time.time()
 
-        cache_data = []
+        if deadline is not None:
+            deadline += time.monotonic()
+        stop = (
+            None if deadline is None else (lambda: time.monotonic() > deadline)
+        )
+
+        if self.partitioned:
+            complete = self.process_partitions(stop, partitions)
+        else:
+            complete = self.scan_snapshot(self.result_path, stop=stop)[1]
+
+        disc_time = str(timedelta(seconds=time.time() - t1)).split(".")[0]
+        if complete:
+            print(f"Disc scanning time: {disc_time}")
+        else:
+            print(f"Deadline hit, partial snapshot published: {disc_time}")
+
+    def scan_snapshot(self, result_path, top=None, stop=None, recursive=True):
+        """Scan the drive (or the directory `top`) to a new snapshot
+        generation at `result_path`. Returns the writer and whether the
+        scan is complete."""
+        with SnapshotWriter(
+            result_path,
+            self.chunk_size,
+            resume=True,
+            checkpoint_interval=self.checkpoint_interval,
+        ) as writer:
+            with self.metadata_extractor(writer.add) as extractor:
+                complete = self.scan_entries(
+                    extractor.add,
+                    top=top,
+                    after=writer.resume_key,
+                    stop=stop,
+                    recursive=recursive,
+                )
+            # Get the time at which the data was processed
+            writer.finalize(
+                dt.now().strftime(UPDATE_TIME_FORMAT), partial=not complete
+            )
+        return writer, complete
 
-        for dirpath, dirnames, filenames in os.walk(self.drive_path):
-            filenames = [f for f in filenames if f.endswith(self.file_suffix)]
+    def process_partitions(self, stop=None, partitions=None):
+        """Scan the partitions of the drive: the files directly in the
+        drive directory (partition "") and every top-level folder. The
+        partition snapshots and the manifest are written to the
+        `result_path` directory.
+
+        The partitions that were scanned least recently are scanned first,
+        so that scans which are stopped continue with the other partitions.
+        Returns False if the scan was stopped."""
+        self.result_path.mkdir(parents=True, exist_ok=True)
+        manifest = read_manifest(self.result_path)
+        names = [""] + sorted(
+            entry.name
+            for entry in os.scandir(self.drive_path)
+            if entry.is_dir()
+        )
+        # Folders that were removed
+        removed = set(manifest["partitions"]) - set(names)
+        if partitions is not None:
+            removed &= set(partitions)
+            names = [name for name in names if name in partitions]
+        for name in sorted(removed):
+            self.remove_partition(manifest, name)
+
+        def scan_order(name):
+            info = manifest["partitions"].get(name, {})
+            return not info.get("partial"), info.get("scanned_at", 0)
+
+        for name in sorted(names, key=scan_order):
+            if stop is not None and stop():
+                return False
+            writer, complete = self.scan_snapshot(
+                self.result_path / partition_file(name),
+                top=os.path.join(self.drive_path, name),
+                stop=stop,
+                recursive=bool(name),
+            )
+            self.update_manifest(manifest, name, writer)
+            if not complete:
+                return False
+        return True
+
+    def update_manifest(self, manifest, name, writer):
+        """Publish a new partition generation in the manifest"""
+        path = self.result_path / partition_file(name)
+        manifest["partitions"][name] = {
+            "file": path.name,
+            "generation": writer.generation,
+            "num_entries": writer.num_entries,
+            "total_size": writer.totals["size"],
+            # Aggregates of the files of the partition (all of them are in
+            # the partition folder)
+            "folder": writer.totals,
+            "file_size": path.stat().st_size,
+            "partial": writer.partial,
+            "scanned_at": time.time(),
+        }
+        manifest["generation"] += 1
+        manifest["update_time"] = dt.now().strftime(UPDATE_TIME_FORMAT)
+        write_manifest(self.result_path, manifest)
+
+    def remove_partition(self, manifest, name):
+        """Remove a partition (its folder was removed from the drive)"""
+        manifest["partitions"].pop(name, None)
+        manifest["generation"] += 1
+        manifest["update_time"] = dt.now().strftime(UPDATE_TIME_FORMAT)
+        write_manifest(self.result_path, manifest)
+        stem = Path(partition_file(name)).stem
+        for path in self.result_path.glob(stem + ".*"):
+            path.unlink(missing_ok=True)
+
+    def metadata_extractor(self, add):
+        """Return the metadata extractor that passes the entries on to
+        `add`"""
+        return MetadataExtractor(self.metadata_cache, add, self.drive_path)
+
+    def scan_entries(
+        self, add, top=None, after=None, stop=None, recursive=True
+    ):
+        """Walk the drive (or the directory `top` of the drive) and call
+        `add` with the entries of the files. The files up to the key
+        `after` (see `entry_key`) are skipped. Returns False if the walk
+        was stopped because `stop()` returned True."""
+        top = top or self.drive_path
+        if self.on_directory is not None:
+            self.on_directory(top)
+        for dirpath, dirnames, filenames in os.walk(top):
+            if stop is not None and stop():
+                return False
+            if not recursive:
+                dirnames.clear()
+            # Walk in sorted order (see `entry_key`)
+            dirnames.sort()
+            if after is not None:
+                # Skip the directories that were scanned completely
+                parent = self.filepath_list(os.path.join(dirpath, ""))[:-1]
+                skipped = [
+                    d
+                    for d in dirnames
+                    if parent + [d] < after[0][: len(parent) + 1]
+                ]
+                if self.on_directory is not None:
+                    for name in skipped:
+                        for subdir, _, _ in os.walk(
+                            os.path.join(dirpath, name)
+                        ):
+                            self.on_directory(subdir)
+                dirnames[:] = [d for d in dirnames if d not in skipped]
+            if self.on_directory is not None:
+                for name in dirnames:
+                    self.on_directory(os.path.join(dirpath, name))
+            filenames = sorted(
+                f for f in filenames if f.endswith(self.file_suffix)
+            )
             for fname in filenames:
                 fpath = os.path.join(dirpath, fname)
-                file_size = self.get_file_size(fpath)
-                if file_size:
-                    # Standardize the file path
-                    fpath = fpath.replace("\\", "/").replace("//", "/")
-                    # Get the modified date of the file
-                    modified_time = os.path.getmtime(fpath)
-                    modified_time = dt.fromtimestamp(modified_time).strftime(
-                        "%d-%b-%Y %I.%M %p"
-                    )
-
-                    # Save files in "HSMFS:/Data/path/to/the/rtdc/file"
-                    fpath = str(fpath).strip()
-                    # Get the path starts from 'Data' (eg: Data/path/to/file)
-                    data_dir_idx = fpath.index("Data/")
-                    fpath = fpath[data_dir_idx:]
-                    # Split the path into a list (eg: [Data, path, to, file])
-                    fpath_split_list = list(fpath.split("/"))
-                    # Add identifier to split list
-                    # (eg: [HSMFS:, Data, path, to, file])
-                    fpath_list = [f"{self.identifier}:"] + fpath_split_list
-
-                    entry = {
-                        "filepath": fpath_list,
-                        "dateModified": modified_time,
-                        "size": file_size,
-                    }
-                    cache_data.append(entry)
-
-        # Get the time at which the data was processed
-        update_time = dt.now().strftime("%H:%M %p, %d-%b-%y")
-        data_dict = {"cache_data": cache_data, "update_time": update_time}
-        # Save the processed data to a pickle file
-        self.save_data(data_dict)
+                if (
+                    after is not None
+                    and filepath_key(self.filepath_list(fpath)) <= after
+                ):
+                    continue
+                entry = self.file_entry(fpath)
+                if entry:
+                    add(entry)
+        return True
 
-        disc_time = str(timedelta(seconds=time.time() - t1)).split(".")[0]
-        print(f"Disc scanning time: {disc_time}")
+    def filepath_list(self, fpath):
+        """Return the path of a file as saved in the snapshot"""
+        # Standardize the file path
+        fpath = str(fpath).replace("\\", "/").replace("//", "/").strip()
+        # Save files in "HSMFS:/Data/path/to/the/rtdc/file"
+        # Get the path starts from 'Data' (eg: Data/path/to/file)
+        data_dir_idx = fpath.index("Data/")
+        fpath = fpath[data_dir_idx:]
+        # Split the path into a list (eg: [Data, path, to, file])
+        fpath_split_list = list(fpath.split("/"))
+        # Add identifier to split list
+        # (eg: [HSMFS:, Data, path, to, file])
+        return [f"{self.identifier}:"] + fpath_split_list
+
+    def file_entry(self, fpath):
+        """Return the snapshot entry of a file (None for files smaller than
+        1 MB or files that do not exist anymore)"""
+        try:
+            stat = os.stat(fpath)
+        except FileNotFoundError:
+            return None
+        if stat.st_size < MIN_FILE_SIZE:
+            return None
+        # Sizes in bytes and modification times in epoch seconds (the
+        # dashboard formats them)
+        return {
+            "filepath": self.filepath_list(fpath),
+            "dateModified": int(stat.st_mtime),
+            "size": stat.st_size,
+            "offline": is_offline(stat),
+            "inode": stat.st_ino,
+        }
+
+    def apply_changes(self, changes, removed_dirs=()):
+        """Publish a new snapshot generation with the changed entries
+        without rescanning the drive (only the changed partitions with
+        `partitioned=True`).
+
+        Parameters
+        ----------
+        changes: dict
+            New entries (or None for removed files) by file path
+            (tuple of `filepath_list`)
+        removed_dirs: list
+            Paths (`filepath_list`) of removed directories
+        """
+        if not self.partitioned:
+            self.apply_snapshot_changes(
+                self.result_path, changes, removed_dirs
+            )
+            return
+
+        manifest = read_manifest(self.result_path)
+        groups = {}
+        for path in removed_dirs:
+            if len(path) == 3:
+                # Top-level folder
+                self.remove_partition(manifest, path[2])
+            else:
+                groups.setdefault(path[2], ({}, []))[1].append(path)
+        for filepath, entry in changes.items():
+            groups.setdefault(partition_of(filepath), ({}, []))[0][
+                filepath
+            ] = entry
+        for name, (partition_changes, partition_removed) in groups.items():
+            writer = self.apply_snapshot_changes(
+                self.result_path / partition_file(name),
+                partition_changes,
+                partition_removed,
+            )
+            self.update_manifest(manifest, name, writer)
+
+    def apply_snapshot_changes(self, result_path, changes, removed_dirs):
+        """Publish a new generation of the snapshot at `result_path` with
+        the changed entries. Returns the writer."""
+        with contextlib.ExitStack() as stack:
+            entries = ()
+            if result_path.exists():
+                file = stack.enter_context(open(result_path, "rb"))
+                read_header(file)
+                entries = iter_entries(file)
+            entries = merge_changes(entries, changes, removed_dirs)
+            with SnapshotWriter(result_path, self.chunk_size) as writer:
+                with self.metadata_extractor(writer.add) as extractor:
+                    for entry in entries:
+                        extractor.add(entry)
+                writer.finalize(dt.now().strftime(UPDATE_TIME_FORMAT))
+        return writer
+
+
+def merge_changes(entries, changes, removed_dirs=()):
+    """Merge sorted snapshot entries with changed entries (see
+    `DriveFileScanner.apply_changes`) and yield the entries in sorted
+    order"""
+    updates = sorted(
+        changes.items(), key=lambda item: filepath_key(list(item[0]))
+    )
+    removed_dirs = [list(path) for path in removed_dirs]
+    idx = 0
+    for entry in entries:
+        key = entry_key(entry)
+        replaced = False
+        while (
+            idx < len(updates) and filepath_key(list(updates[idx][0])) <= key
+        ):
+            filepath, update = updates[idx]
+            idx += 1
+            replaced = replaced or list(filepath) == entry["filepath"]
+            if update is not None:
+                yield update
+        if replaced or any(
+            entry["filepath"][: len(path)] == path for path in removed_dirs
+        ):
+            continue
+        yield entry
+    for _, update in updates[idx:]:
+        if update is not None:
+            yield update
+
+
+class Inotify:
+    """Minimal Linux inotify interface (ctypes, no dependencies)"""
+
+    # Event masks from <sys/inotify.h>
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = (
+        IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+    )
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watched directories by watch descriptor
+        self.paths = {}
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(path), self.WATCH_MASK
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        self.paths[wd] = str(path)
+
+    def read_events(self, timeout):
+        """Wait up to `timeout` seconds for events and return them as
+        (directory path, mask, file name) tuples"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 1024**2)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            end = offset + length
+            name = os.fsdecode(data[offset:end].rstrip(b"\0"))
+            offset = end
+            if mask & self.IN_IGNORED:
+                # Watched directory was removed
+                self.paths.pop(wd, None)
+            elif wd in self.paths or mask & self.IN_Q_OVERFLOW:
+                events.append((self.paths.get(wd), mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DriveWatcher:
+    """Keep the snapshot of a drive up to date with inotify events.
+
+    The drive is scanned completely at the start and every
+    `reconcile_interval` seconds (mounts such as HSM file systems or network
+    shares may not report all changes). In between, the changed files are
+    collected from the inotify events and published as a new snapshot
+    generation (see `DriveFileScanner.apply_changes`) once no event
+    arrived for `batch_delay` seconds.
+    """
+
+    def __init__(self, scanner, reconcile_interval=3600, batch_delay=2):
+        self.scanner = scanner
+        self.reconcile_interval = reconcile_interval
+        self.batch_delay = batch_delay
+        self.inotify = None
+        # Changed file paths and removed directories since the last update
+        self.changed = set()
+        self.removed_dirs = set()
+        self.reconcile_needed = False
+        # No more directories are watched until the next rescan
+        self.watch_failed = False
+
+    def watch_directory(self, dirpath):
+        """Watch a directory (not its subdirectories)"""
+        if self.watch_failed:
+            return
+        try:
+            self.inotify.add_watch(dirpath)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            # E.g. the limit of watches (fs.inotify.max_user_watches)
+            print(f"Cannot watch {dirpath}, rely on rescans: {exc}")
+            self.watch_failed = True
+
+    def watch_tree(self, top):
+        """Watch a directory and its subdirectories"""
+        for dirpath, _, _ in os.walk(top):
+            self.watch_directory(dirpath)
+            if self.watch_failed:
+                return
+
+    def handle_event(self, dirpath, mask, name):
+        if mask & Inotify.IN_Q_OVERFLOW:
+            self.reconcile_needed = True
+            return
+        path = os.path.join(dirpath, name)
+        if mask & Inotify.IN_ISDIR:
+            if mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO):
+                self.watch_tree(path)
+                self.changed.add(path)
+            elif mask & (Inotify.IN_DELETE | Inotify.IN_MOVED_FROM):
+                self.removed_dirs.add(path)
+        elif name.endswith(self.scanner.file_suffix):
+            self.changed.add(path)
+
+    def apply_changes(self):
+        """Publish the collected changes as a new snapshot generation"""
+        changes = {}
+        for path in self.changed:
+            if os.path.isdir(path):
+                # New directory, scan its files
+                new_entries = []
+                self.scanner.scan_entries(new_entries.append, top=path)
+                for entry in new_entries:
+                    changes[tuple(entry["filepath"])] = entry
+            else:
+                filepath = tuple(self.scanner.filepath_list(path))
+                changes[filepath] = self.scanner.file_entry(path)
+        removed_dirs = [
+            self.scanner.filepath_list(path) for path in self.removed_dirs
+        ]
+        self.changed.clear()
+        self.removed_dirs.clear()
+        self.scanner.apply_changes(changes, removed_dirs)
+        print(
+            f"Snapshot updated: {len(changes)} changed files, "
+            f"{len(removed_dirs)} removed directories"
+        )
+
+    def reconcile(self):
+        """Rescan the drive and watch all its directories again. The
+        directories are watched during the scan, before they are listed, so
+        that the drive is walked once and no change is missed."""
+        if self.inotify is not None:
+            self.inotify.close()
+        self.inotify = Inotify()
+        self.watch_failed = False
+        self.changed.clear()
+        self.removed_dirs.clear()
+        self.reconcile_needed = False
+        self.scanner.on_directory = self.watch_directory
+        try:
+            self.scanner.process_drive()
+        finally:
+            self.scanner.on_directory = None
+
+    def run(self, stop_event=None):
+        """Watch the drive until `stop_event` is set"""
+        stop_event = stop_event or threading.Event()
+        self.reconcile()
+        last_reconcile = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                events = self.inotify.read_events(self.batch_delay)
+                for event in events:
+                    self.handle_event(*event)
+                if time.monotonic() - last_reconcile > self.reconcile_interval:
+                    self.reconcile_needed = True
+                if self.reconcile_needed:
+                    self.reconcile()
+                    last_reconcile = time.monotonic()
+                elif not events and (self.changed or self.removed_dirs):
+                    self.apply_changes()
+        finally:
+            self.inotify.close()
+
+
+def profile_scan(
+    scanner, profile_dir, num_stats=25, deadline=None, partitions=None
+):
+    """Run a drive scan with the deterministic profiler, save the dump to
+    `profile_dir` and print the functions with the largest cumulative time.
+    `deadline` and `partitions` are passed to `process_drive`.
+    """
+    profile_dir = Path(profile_dir)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    stamp = dt.now().strftime("%Y%m%d-%H%M%S")
+    dump_path = profile_dir / f"{stamp}-scan-{scanner.identifier}.prof"
+
+    profiler = cProfile.Profile()
+    profiler.runcall(
+        scanner.process_drive, deadline=deadline, partitions=partitions
+    )
+    profiler.dump_stats(dump_path)
+
+    stats = pstats.Stats(profiler)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(num_stats)
+    print(f"Profile saved to: {dump_path}")
+    return dump_path
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan the HSMFS drive")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile the scan and print the slowest functions",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=os.getenv(
+            "PROFILE_DIR", Path(__file__).parents[0] / "resources" / "profiles"
+        ),
+        help="directory of the profile dumps (default: resources/profiles)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="publish a partial snapshot after this many seconds of scanning "
+        "(the next scan continues after the scanned files)",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=CHECKPOINT_INTERVAL,
+        help="seconds between the checkpoints of a scan, an interrupted scan "
+        f"resumes from the last checkpoint (default: {CHECKPOINT_INTERVAL})",
+    )
+    parser.add_argument(
+        "--no-metadata",
+        action="store_true",
+        help="do not extract the metadata of the .rtdc files",
+    )
+    parser.add_argument(
+        "--partition",
+        action="append",
+        dest="partitions",
+        metavar="FOLDER",
+        help="rescan only this top-level folder of the drive (repeatable, "
+        'use "" for the files directly in the drive directory)',
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep the snapshot up to date with inotify events (Linux)",
+    )
+    parser.add_argument(
+        "--reconcile-interval",
+        type=float,
+        default=3600,
+        help="seconds between full rescans in watch mode (default: 3600)",
+    )
+    parser.add_argument(
+        "--batch-delay",
+        type=float,
+        default=2,
+        help="seconds without events before the changes are published in "
+        "watch mode (default: 2)",
+    )
+    args = parser.parse_args()
+
     # Restrict the dashboard to scan only `Data` directory from mounted HSMFS
     HSM_PATH = Path(__file__).parents[1] / "HSMFS" / "Data"
-    RESOURCE_PATH = Path(__file__).parents[0] / "resources" / "hsm_drive.pkl"
-    hsm_processor = DriveFileScanner(HSM_PATH, RESOURCE_PATH, ".rtdc", "HSMFS")
-    hsm_processor.process_drive()
+    # The snapshot is partitioned by the top-level folders of the drive
+    RESOURCE_PATH = Path(__file__).parents[0] / "resources" / "hsm_partitions"
+    METADATA_PATH = RESOURCE_PATH.with_name("rtdc_metadata.sqlite")
+    hsm_processor = DriveFileScanner(
+        HSM_PATH,
+        RESOURCE_PATH,
+        ".rtdc",
+        "HSMFS",
+        checkpoint_interval=args.checkpoint_interval,
+        metadata_cache=None if args.no_metadata else METADATA_PATH,
+        partitioned=True,
+    )
+    if args.profile:
+        profile_scan(
+            hsm_processor,
+            args.profile_dir,
+            deadline=args.deadline,
+            partitions=args.partitions,
+        )
+    elif args.watch:
+        DriveWatcher(
+            hsm_processor, args.reconcile_interval, args.batch_delay
+        ).run()
+    else:
+        hsm_processor.process_drive(
+            deadline=args.deadline, partitions=args.partitions
+        )
@@ -6,15 +6,36 @@ from .app_main import app
 @click.command()
 @click.option("--port", default=8050, help="Port for the Dash app.")
 @click.option("--local", is_flag=True, help="Run app locally.")
-def serve(port=8050, local=False):
+@click.option(
+    "--workers",
+    default=None,
+    type=int,
+    envvar="DASHBOARD_WORKERS",
+    help="Number of worker processes (production mode).",
+)
+@click.option(
+    "--threads",
+    default=None,
+    type=int,
+    envvar="DASHBOARD_THREADS",
+    help="Number of threads of every worker (production mode).",
+)
+def serve(port=8050, local=False, workers=None, threads=None):
     """Run the dashboard"""
-    if not local:
-        host = "0.0.0.0"  # Host IP address
-        debug = False
-    else:
-        host = "127.0.0.1"
-        debug = True  # Enable debug mode for local mode
-    app.run_server(port=port, host=host, debug=debug)
+    if local:
+        # Run the development server with debug mode for local mode
+        app.run_server(port=port, host="127.0.0.1", debug=True)
+        return
+
+    from .server import DEFAULT_THREADS, DEFAULT_WORKERS, run_production_server
+
+    run_production_server(
+        app.server,
+        host="0.0.0.0",  # Host IP address
+        port=port,
+        workers=workers or DEFAULT_WORKERS,
+        threads=threads or DEFAULT_THREADS,
+    )
 
 
 if __name__ == "__main__":
@@ -3,6 +3,11 @@ import os
 import dash_bootstrap_components as dbc
 from dash import Dash, Input, Output, dcc, html
 
+from .health import register_health_routes
+from .jobs import create_job_manager
+from .metrics import callback_name, register_metrics
+from .profiling import register_profiling
+from .tracing import register_tracing
 from .pages import (
     advanced_page_layout,
     home_page_layout,
@@ -28,9 +33,15 @@ app = Dash(
     requests_pathname_prefix=BASENAME_PREFIX,
     routes_pathname_prefix=BASENAME_PREFIX,
     suppress_callback_exceptions=True,
+    # Run slow GitLab callbacks as background jobs
+    background_callback_manager=create_job_manager(),
 )
 
 server = app.server
+register_health_routes(server, prefix=BASENAME_PREFIX)
+register_metrics(app, prefix=BASENAME_PREFIX)
+register_tracing(app, callback_name)
+register_profiling(app, callback_name, prefix=BASENAME_PREFIX)
 
 app.title = "HPC Pipelines"
 app._favicon = "dashboard/assets/favicon.ico"
@@ -3,3 +3,45 @@ var dagfuncs = window.dashAgGridFunctions = window.dashAgGridFunctions || {};
 dagfuncs.getDataPath = function (data) {
     return data.filepath;
 }
+
+// Format file sizes in bytes (e.g. "1.2 GB")
+dagfuncs.formatFileSize = function (value) {
+    if (typeof value !== "number") {
+        // Preformatted sizes of older HSMFS snapshots
+        return value;
+    }
+    if (value < 1024 ** 3) {
+        return (value / 1024 ** 2).toFixed(1) + " MB";
+    }
+    return (value / 1024 ** 3).toFixed(1) + " GB";
+}
+
+// Format modification times in epoch seconds (e.g. "05-Mar-2024 02.30 PM")
+dagfuncs.formatEpochTime = function (value) {
+    if (typeof value !== "number") {
+        return value;
+    }
+    const date = new Date(value * 1000);
+    const months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                    "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+    const pad = (num) => String(num).padStart(2, "0");
+    const hours = date.getHours() % 12 || 12;
+    return pad(date.getDate()) + "-" + months[date.getMonth()] + "-" +
+        date.getFullYear() + " " + pad(hours) + "." +
+        pad(date.getMinutes()) + (date.getHours() < 12 ? " AM" : " PM");
+}
+
+// Compare modification times in epoch seconds with the date filter
+dagfuncs.compareEpochDate = function (filterLocalDateAtMidnight, value) {
+    const cellDate = new Date(value * 1000);
+    cellDate.setHours(0, 0, 0, 0);
+    return cellDate - filterLocalDateAtMidnight;
+}
+
+// Residency of HSMFS files ("offline" files are migrated to tape)
+dagfuncs.residency = function (data) {
+    if (!data || data.offline === undefined || data.offline === null) {
+        return null;
+    }
+    return data.offline ? "offline" : "online";
+}
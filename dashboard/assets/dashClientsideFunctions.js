@@ -0,0 +1,53 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    clientside: {
+        // Display the number of selected files
+        countSelectedFiles: function (selectedRows) {
+            return selectedRows ? selectedRows.length : 0;
+        },
+
+        // Activate Add button in DCOR input bar only when the dropdown
+        // value and DCOR identifier is entered
+        toggleDcorButton: function (dropValue, filename) {
+            return !(dropValue && filename);
+        },
+
+        // Filter HSMFS grid rows based on filter value
+        updateGridFilter: function (filterValue, gridOptions) {
+            return Object.assign({}, gridOptions, {
+                quickFilterText: filterValue,
+            });
+        },
+
+        // Activate create pipeline button only when author name, title,
+        // data files, and segmentation method are entered
+        toggleCreatePipelineButton: function (
+            authorName, title, selectedRows, cachedParams
+        ) {
+            return !(
+                authorName &&
+                title &&
+                title.trim() &&
+                selectedRows &&
+                selectedRows.length > 0 &&
+                cachedParams &&
+                Object.keys(cachedParams).length > 0
+            );
+        },
+
+        // Enable the load older comments button of a pipeline only when
+        // older comments are not shown yet
+        toggleOlderComments: function (snapshot) {
+            return !(snapshot && snapshot.has_older_comments);
+        },
+
+        // Show the options of every switched on checklist (one style for
+        // each given checklist value)
+        toggleOptions: function (...switchValues) {
+            return switchValues.map(function (value) {
+                return value && value.length > 0
+                    ? {display: "block"}
+                    : {display: "none"};
+            });
+        },
+    },
+});
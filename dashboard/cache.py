@@ -0,0 +1,38 @@
+import functools
+import os
+from pathlib import Path
+
+from cachelib import FileSystemCache, RedisCache
+
+# Default directory of the cache that is shared by all the workers
+CACHE_DIR = Path(__file__).parents[1] / "resources" / "cache"
+
+# Cached GitLab data is kept until the data is updated (no expiration)
+CACHE_TIMEOUT = 0
+
+
+@functools.lru_cache()
+def get_cache():
+    """Return the cache backend that is shared by all the dashboard workers.
+
+    Notes
+    -----
+    A Redis cache is used if the `CACHE_REDIS_URL` environment variable is
+    set (requires the `redis` package). Otherwise, the cache is stored in the
+    `CACHE_DIR` environment variable directory (default: resources/cache),
+    which works for all the workers of a single host.
+    """
+    redis_url = os.getenv("CACHE_REDIS_URL")
+    if redis_url:
+        import redis
+
+        return RedisCache(
+            host=redis.from_url(redis_url),
+            default_timeout=CACHE_TIMEOUT,
+            key_prefix="dashboard:",
+        )
+    return FileSystemCache(
+        os.getenv("CACHE_DIR", str(CACHE_DIR)),
+        threshold=int(os.getenv("CACHE_THRESHOLD", 5000)),
+        default_timeout=CACHE_TIMEOUT,
+    )
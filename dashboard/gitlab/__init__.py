@@ -23,3 +23,15 @@ def get_gitlab_instances():
         os.getenv("DVC_REPO_PROJECT_NUM"),
     )
     return request_gitlab, dvc_gitlab
+
+
+def close_inherited_connections():
+    """Close the GitLab connections inherited from the parent process, so
+    that forked processes (e.g. background callback jobs) do not share the
+    connections of the parent process"""
+    if get_gitlab_instances.cache_info().currsize:
+        for instance in get_gitlab_instances():
+            instance.close_connections()
+
+
+os.register_at_fork(after_in_child=close_inherited_connections)
@@ -4,11 +4,17 @@ from datetime import datetime, timedelta
 import gitlab
 from gitlab.exceptions import GitlabAuthenticationError
 
+from ..metrics import instrument_api, observe_gitlab_response
+from ..tracing import trace_api, trace_http_response
+from .cassette import use_cassette
+
 
 class AuthenticationError(Exception):
     """Authentication Exception"""
 
 
+@trace_api
+@instrument_api
 class BaseAPI:
     """Gitlab API"""
 
@@ -21,6 +27,12 @@ class BaseAPI:
             gitlab_obj = gitlab.Gitlab(
                 url=gitlab_url, private_token=access_token
             )
+            # Record the latency and payload size of GitLab requests
+            gitlab_obj.session.hooks["response"].extend(
+                [observe_gitlab_response, trace_http_response]
+            )
+            # Record or replay the GitLab responses (GITLAB_CASSETTE)
+            use_cassette(gitlab_obj)
             gitlab_obj.auth()
             self.project = gitlab_obj.projects.get(project_num)
         except GitlabAuthenticationError as exc:
@@ -30,6 +42,16 @@ class BaseAPI:
                 "settings."
             ) from exc
 
+    def ping(self, timeout=None):
+        """Request the project from GitLab (raises if GitLab or the project
+        cannot be reached within `timeout` seconds)"""
+        self.project.manager.get(self.project_num, timeout=timeout)
+
+    def close_connections(self):
+        """Close the open HTTP connections to GitLab. The next request opens
+        a new connection."""
+        self.project.manager.gitlab.session.close()
+
     @staticmethod
     def human_readable_date(date):
         """Convert gitlab date into human-readable format"""
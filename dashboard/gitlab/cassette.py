@@ -0,0 +1,250 @@
+import base64
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Placeholder of the GitLab URL in the recorded responses
+URL_PLACEHOLDER = "{gitlab}"
+
+# Recorded response headers (pagination and content type)
+KEPT_HEADERS = (
+    "Content-Type",
+    "Link",
+    "X-Next-Page",
+    "X-Page",
+    "X-Per-Page",
+    "X-Prev-Page",
+    "X-Total",
+    "X-Total-Pages",
+)
+
+# Fields that are removed from the recorded responses
+SECRET_FIELDS = {
+    "avatar_url",
+    "commit_email",
+    "email",
+    "private_token",
+    "public_email",
+    "token",
+}
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+MENTION_PATTERN = re.compile(r"(?<![\w@])@([\w.-]+)")
+USERNAME_PATTERN = re.compile(r"(username=)([\w.-]+)", flags=re.IGNORECASE)
+
+
+def pseudonym(username):
+    """Return the stable pseudonym of a username"""
+    return "user_" + hashlib.sha1(username.encode()).hexdigest()[:8]
+
+
+def sanitize(value, base_url):
+    """Remove the secrets and personal data (emails, usernames, and names)
+    of a GitLab response. Usernames are replaced with stable pseudonyms, so
+    that the usernames in issue descriptions still match the members."""
+    if isinstance(value, dict):
+        sanitized = {}
+        for key, item in value.items():
+            if key in SECRET_FIELDS:
+                continue
+            if key == "content" and value.get("encoding") == "base64":
+                # Repository files, e.g. issue templates
+                text = base64.b64decode(item).decode("utf-8", "replace")
+                sanitized[key] = base64.b64encode(
+                    sanitize(text, base_url).encode("utf-8")
+                ).decode()
+            elif key == "username" and isinstance(item, str):
+                sanitized[key] = pseudonym(item)
+            elif (
+                key == "name"
+                and isinstance(item, str)
+                and "username" in value
+                and "*" not in item
+            ):
+                # Access tokens ("****") are kept, the dashboard hides them
+                sanitized[key] = pseudonym(value["username"]).replace(
+                    "user_", "User "
+                )
+            else:
+                sanitized[key] = sanitize(item, base_url)
+        return sanitized
+    if isinstance(value, list):
+        return [sanitize(item, base_url) for item in value]
+    if isinstance(value, str):
+        value = value.replace(base_url, URL_PLACEHOLDER)
+        value = EMAIL_PATTERN.sub("user@example.com", value)
+        value = USERNAME_PATTERN.sub(
+            lambda m: m.group(1) + pseudonym(m.group(2)), value
+        )
+        return MENTION_PATTERN.sub(
+            lambda m: "@" + pseudonym(m.group(1)), value
+        )
+    return value
+
+
+def request_key(method, url):
+    """Return the key of a request: method, API path, and sorted query"""
+    parts = urlsplit(url)
+    query = "&".join(
+        f"{k}={v}" for k, v in sorted(parse_qsl(parts.query, True))
+    )
+    return f"{method} {parts.path}?{query}"
+
+
+class CassetteRecorder:
+    """Append the sanitized responses of a GitLab session to a cassette
+    (JSON lines, one interaction per line)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, response, base_url):
+        try:
+            body = {"json": sanitize(response.json(), base_url)}
+        except ValueError:
+            body = {"text": sanitize(response.text, base_url)}
+        headers = {
+            key: sanitize(response.headers[key], base_url)
+            for key in KEPT_HEADERS
+            if key in response.headers
+        }
+        interaction = {
+            "key": request_key(response.request.method, response.url),
+            "status": response.status_code,
+            "headers": headers,
+            "elapsed": response.elapsed.total_seconds(),
+            **body,
+        }
+        line = json.dumps(interaction) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line)
+
+    def hook(self, base_url):
+        """Return a response hook that records the responses"""
+
+        def record_response(response, *args, **kwargs):
+            self.record(response, base_url)
+            return response
+
+        return record_response
+
+
+class CassetteAdapter(BaseAdapter):
+    """Transport adapter that serves the recorded responses of a cassette.
+
+    Notes
+    -----
+    The responses of a request are served in the recorded order; the last
+    one is repeated when they are used up. Requests that were not recorded
+    get a "404 Not recorded" response. If `timing` is not zero, every
+    response is delayed by its recorded latency times `timing`.
+    """
+
+    def __init__(self, path, base_url, timing=0):
+        super().__init__()
+        self.base_url = base_url
+        self.timing = timing
+        self.lock = threading.Lock()
+        self.interactions = {}
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                interaction = json.loads(line)
+                self.interactions.setdefault(interaction["key"], []).append(
+                    interaction
+                )
+        self.served = {}
+
+    def next_interaction(self, key):
+        with self.lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                return None
+            count = self.served.get(key, 0)
+            self.served[key] = count + 1
+            return recorded[min(count, len(recorded) - 1)]
+
+    def send(self, request, **kwargs):
+        interaction = self.next_interaction(
+            request_key(request.method, request.url)
+        ) or {
+            "status": 404,
+            "headers": {"Content-Type": "application/json"},
+            "json": {"message": "404 Not recorded"},
+            "elapsed": 0,
+        }
+        if self.timing:
+            time.sleep(interaction["elapsed"] * self.timing)
+
+        if "json" in interaction:
+            content = json.dumps(interaction["json"])
+        else:
+            content = interaction["text"]
+
+        response = Response()
+        response.status_code = interaction["status"]
+        response.headers = CaseInsensitiveDict(
+            {
+                key: value.replace(URL_PLACEHOLDER, self.base_url)
+                for key, value in interaction["headers"].items()
+            }
+        )
+        response._content = content.replace(
+            URL_PLACEHOLDER, self.base_url
+        ).encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=interaction["elapsed"])
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+@functools.lru_cache()
+def get_recorder(path):
+    """Return the recorder of a cassette (shared by all the sessions)"""
+    return CassetteRecorder(path)
+
+
+@functools.lru_cache()
+def get_replay_adapter(path, base_url, timing):
+    """Return the replay adapter of a cassette (shared by all the sessions,
+    so that the recorded responses are served in order)"""
+    return CassetteAdapter(path, base_url, timing)
+
+
+def use_cassette(gitlab_obj):
+    """Record the responses of a GitLab client to a cassette or replay them
+    from a cassette, depending on the environment variables:
+
+    - `GITLAB_CASSETTE`: path of the cassette (nothing is done if unset)
+    - `GITLAB_CASSETTE_MODE`: "record" or "replay" (default)
+    - `GITLAB_CASSETTE_TIMING`: replay the recorded latency times this
+      factor (default: 0, no latency)
+    """
+    path = os.getenv("GITLAB_CASSETTE")
+    if not path:
+        return
+    base_url = gitlab_obj.url
+    if os.getenv("GITLAB_CASSETTE_MODE", "replay") == "record":
+        gitlab_obj.session.hooks["response"].append(
+            get_recorder(path).hook(base_url)
+        )
+    else:
+        timing = float(os.getenv("GITLAB_CASSETTE_TIMING", 0))
+        adapter = get_replay_adapter(path, base_url, timing)
+        gitlab_obj.session.mount("http://", adapter)
+        gitlab_obj.session.mount("https://", adapter)
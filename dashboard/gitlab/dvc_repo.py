@@ -2,9 +2,13 @@ from collections import defaultdict
 
 import yaml
 
+from ..metrics import instrument_api
+from ..tracing import trace_api
 from .base import BaseAPI
 
 
+@trace_api
+@instrument_api
 class DVCRepoAPI(BaseAPI):
     """HPC Pipeline Data repository API inherited from BaseAPI"""
 
@@ -0,0 +1,189 @@
+import functools
+from types import MappingProxyType
+from typing import NamedTuple
+
+import yaml
+
+# Path of the dcevent defaults file in the request repo
+DEFAULTS_PATH = "dashboard_dcevent_defaults.yaml"
+
+# Titles of the request templates in the request repo
+REQUEST_TITLES = {
+    "simple": "# Pipeline Request",
+    "advanced": "# Pipeline Request ADVANCED",
+}
+
+# Markers shared by the template generation and the description parsing
+FIRST_SECTION = "- **Segmentation**"
+DATA_SECTION = "- **Data to Process**"
+AUTHOR_SECTION = "- __Author__"
+OPTION_END = "<!-- option end -->"
+USERNAME_KEY = "username"
+HSM_DATA_KEY = "HSMFS:/Data"
+S3_FLAGS = {
+    "keep_results": "keep results",
+    "keep_raw_data": "keep raw data",
+}
+
+# Labels of the options (dashboard checklist values and template entries)
+UNET_LABEL = "mlunet: UNET"
+UNET_DEFAULT_MODEL = "unet-double-d3-f3_g1_81bbe.ckp"
+CLASSIFIER_LABEL = "bloody-bunny_g1_bacae: Bloody Bunny"
+FURTHER_FLAGS = ("--reproduce", "--transfer-fluorescence", "--num-frames")
+OPTION_LABELS = {
+    "legacy": "legacy: Legacy thresholding with OpenCV",
+    "thresh": "thresh: thresholding segmentation",
+    "watershed": "watershed: Watershed algorithm",
+    "std": "std: Standard-deviation-based thresholding",
+    "rollmed": "rollmed: Rolling median RT-DC background image computation",
+    "sparsemed": "sparsemed: Sparse median background correction with "
+    "cleansing",
+    "norm_gate": "norm gating",
+}
+
+
+class RequestOption(NamedTuple):
+    """A checkable option of the request template. `params` is a tuple of
+    (name, default) pairs or None for flag options. `unchecked` holds the
+    pre-rendered template text of the option when it is not selected."""
+
+    label: str
+    params: tuple
+    unchecked: str
+
+
+class RequestGroup(NamedTuple):
+    """A group of options. A group without options is itself a checkbox."""
+
+    name: str
+    options: tuple
+    header: str
+
+
+class RequestSection(NamedTuple):
+    """A bold section (e.g. Segmentation) of the request template."""
+
+    name: str
+    groups: tuple
+    header: str
+
+
+class RequestSchema(NamedTuple):
+    """Immutable request schema for both request types"""
+
+    defaults: MappingProxyType
+    simple: tuple
+    advanced: tuple
+
+
+def freeze(data):
+    """Recursively convert dicts and lists into read-only containers"""
+    if isinstance(data, dict):
+        return MappingProxyType({k: freeze(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return tuple(freeze(v) for v in data)
+    return data
+
+
+def make_option(label, params=None):
+    """Create an option and pre-render its unchecked template text"""
+    if params is None:
+        unchecked = f"\n    - [ ] {label} "
+    else:
+        params = tuple(params)
+        unchecked = f"\n    - [ ] {label}"
+        unchecked += "".join(f"\n      - [ ] {k}={v}" for k, v in params)
+        unchecked += f"\n    {OPTION_END}"
+    return RequestOption(label, params, unchecked)
+
+
+def make_group(name, options=()):
+    """Create a group of options"""
+    header = f"\n  - {name}" if options else f"\n  - [ ] {name}"
+    return RequestGroup(name, tuple(options), header)
+
+
+def make_section(name, groups):
+    """Create a bold section"""
+    return RequestSection(name, tuple(groups), f"\n- **{name}**")
+
+
+def default_params(defaults, method, keys=None):
+    """Return (name, default) pairs of a dcevent method from the defaults"""
+    method_params = defaults[method]
+    keys = keys or [k for k in method_params if k != "name"]
+    return [(k, method_params[k]["default"]) for k in keys]
+
+
+def build_sections(defaults, advanced):
+    """Build the template sections of a request type from the defaults"""
+    segmentation = [
+        make_option(UNET_LABEL, [("model_file", UNET_DEFAULT_MODEL)]),
+        make_option(
+            OPTION_LABELS["legacy"],
+            default_params(
+                defaults, "legacy", keys=None if advanced else ["thresh"]
+            ),
+        ),
+    ]
+    for method in ["thresh", "watershed", "std"]:
+        params = default_params(defaults, method) if advanced else []
+        segmentation.append(make_option(OPTION_LABELS[method], params))
+
+    groups = [
+        make_group(
+            "dcevent version",
+            [make_option("dcevent version=latest", params=())],
+        ),
+        make_group("Segmentation Algorithm", segmentation),
+    ]
+    if advanced:
+        groups += [
+            make_group(
+                "Background Correction/Subtraction Method",
+                [
+                    make_option(OPTION_LABELS[m], default_params(defaults, m))
+                    for m in ["rollmed", "sparsemed"]
+                ],
+            ),
+            make_group(
+                "Available gating options",
+                [
+                    make_option(
+                        OPTION_LABELS["norm_gate"],
+                        default_params(defaults, "norm_gate"),
+                    )
+                ],
+            ),
+        ]
+    groups.append(
+        make_group("Further Options", [make_option(f) for f in FURTHER_FLAGS])
+    )
+
+    return (
+        make_section("Segmentation", groups),
+        make_section(
+            "Prediction",
+            [
+                make_group(
+                    "Classification Model", [make_option(CLASSIFIER_LABEL)]
+                )
+            ],
+        ),
+        make_section(
+            "Post Analysis",
+            [make_group("Benchmarking"), make_group("Scatter Plot")],
+        ),
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def compile_request_schema(defaults_text):
+    """Compile the request schema from the dcevent defaults (yaml string).
+    The schema is compiled only once for every distinct defaults file."""
+    defaults = yaml.safe_load(defaults_text)
+    return RequestSchema(
+        defaults=freeze(defaults),
+        simple=build_sections(defaults, advanced=False),
+        advanced=build_sections(defaults, advanced=True),
+    )
@@ -1,48 +1,57 @@
-import pickle
 import re
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from pathlib import Path
-
-import yaml
 
+from ..cache import get_cache
+from ..metrics import instrument_api
+from ..tracing import add_event, submit, trace_api
 from .base import BaseAPI
+from .request_schema import (
+    DEFAULTS_PATH,
+    HSM_DATA_KEY,
+    REQUEST_TITLES,
+    S3_FLAGS,
+    USERNAME_KEY,
+    compile_request_schema,
+)
+
+ISSUE_CACHE_KEY = "gitlab_issue_{}"
+
+# The dcevent defaults file is fetched from the request repo again after
+# this many seconds
+DEFAULTS_TTL = 300
 
-GIT_ISSUE_DIR = Path(__file__).parents[2] / "resources" / "gitlab_issues"
+# Fetch time and content of the defaults file by GitLab project
+_defaults_files = {}
 
 
+@trace_api
+@instrument_api
 class RequestRepoAPI(BaseAPI):
     """HPC Pipeline Request repository API inherited from BaseAPI"""
 
     @staticmethod
     def read_cached_issue_data(issue_iid):
-        """Load gitlab issue meta data"""
-        issue_cache_path = GIT_ISSUE_DIR / f"git_{issue_iid}.pkl"
-
-        if not issue_cache_path.exists():
-            return None
-
-        if issue_cache_path.stat().st_size == 0:
-            return None
-
+        """Load gitlab issue meta data from the shared cache"""
         try:
-            with issue_cache_path.open("rb") as f:
-                data = pickle.load(f)
-            return data
-        except EOFError:
-            return None
+            return get_cache().get(ISSUE_CACHE_KEY.format(issue_iid))
         except Exception:
             return None
 
     @staticmethod
     def write_cached_issue_data(data, issue_iid):
-        """Save extracted paths as a pickle file in resources dir."""
-        issue_cache_path = GIT_ISSUE_DIR / f"git_{issue_iid}.pkl"
-        if not issue_cache_path.parent.is_dir():
-            issue_cache_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(issue_cache_path, "wb") as f:
-            pickle.dump(data, f)
-
-    def get_issues_meta(self, state, page, per_page=10, search_term=None):
+        """Save gitlab issue meta data in the shared cache, so that it is
+        available to all the dashboard workers"""
+        get_cache().set(ISSUE_CACHE_KEY.format(issue_iid), data)
+
+    def get_issues_meta(
+        self,
+        state,
+        page,
+        per_page=10,
+        search_term=None,
+        on_progress=None,
+    ):
         """Filter issues based on the state and search term if it exists and
         returns a list of dictionaries containing information about each issue.
 
@@ -56,6 +65,9 @@ class RequestRepoAPI(BaseAPI):
                 Set the number of issues to be displayed per page
             search_term: str
                 Search for issues that match the term
+            on_progress: callable
+                Called with the number of processed issues and the number of
+                issues every time an issue is processed
 
         Returns
         -------
@@ -72,16 +84,20 @@ class RequestRepoAPI(BaseAPI):
 
         issues_meta = []
         with ThreadPoolExecutor() as executor:
+            # Run every issue in a copy of the current context, so that the
+            # GitLab requests are recorded and traced for the current callback
             future_to_issue = {
-                executor.submit(self.process_issue, ii): ii for ii in issues
+                submit(executor, self.process_issue, ii): ii for ii in issues
             }
-            for future in as_completed(future_to_issue):
+            for num_done, future in enumerate(as_completed(future_to_issue)):
                 try:
                     result = future.result()
                     issues_meta.append(result)
                 except Exception as exc:
                     issue = future_to_issue[future]
                     print(f"Issue {issue.iid} generated an exception: {exc}")
+                if on_progress:
+                    on_progress(num_done + 1, len(issues))
 
         issues_meta = sorted(issues_meta, key=lambda x: x["id"], reverse=True)
         return issues_meta
@@ -102,15 +118,17 @@ class RequestRepoAPI(BaseAPI):
             "user": parsed_description["username"] or issue.author["name"],
             "web_url": issue.web_url,
             "date": self.human_readable_date(issue.created_at),
+            "updated_at": issue.updated_at,
             "type": parsed_description["type"],
             "pipe_state": pipe_state,
             "s3_results_flag": parsed_description["s3_results_flag"],
             "s3_raw_data_flag": parsed_description["s3_raw_data_flag"],
         }
 
-    def get_processed_issue_notes(self, issue_iid):
+    def get_processed_issue_notes(self, issue_iid, issue_object=None):
         """Fetch comments with dates of an issue and parse issue comments
-        for specific information"""
+        for specific information. An already fetched `issue_object` can be
+        passed to skip fetching the issue again."""
 
         job_comments = [
             re.compile(r"^Completed job"),
@@ -121,15 +139,24 @@ class RequestRepoAPI(BaseAPI):
         # Comments that indicate the progress of the pipeline
         progress_comments = ["state: setup", "state: queued", "state: done"]
 
-        issue_object = self.get_issue_object(issue_iid)
+        if issue_object is None:
+            issue_object = self.get_issue_object(issue_iid)
 
         # Read the cached issue data
         issue_cache = self.read_cached_issue_data(issue_iid)
 
         # If cached issue data exists and it's not outdated, return it
-        if issue_cache:
+        # (data cached before the note ids, or with dates and authors of
+        # skipped notes, is read again)
+        if (
+            issue_cache
+            and "note_ids" in issue_cache
+            and len(issue_cache["dates"]) == len(issue_cache["comments"])
+        ):
             if issue_object.updated_at <= issue_cache["updated_at"]:
+                add_event("cache hit", issue=issue_iid)
                 return issue_cache
+        add_event("cache miss", issue=issue_iid)
 
         data = {
             "updated_at": issue_object.updated_at,
@@ -137,6 +164,8 @@ class RequestRepoAPI(BaseAPI):
             "finished_jobs": 0,
             "results_path": "Result path is not found!",
             "comments": [],
+            # GitLab ids of the notes of the comments
+            "note_ids": [],
             "comment_authors": [],
             "dates": [],
             "pipe_state": "run",
@@ -148,13 +177,6 @@ class RequestRepoAPI(BaseAPI):
 
         for note in issue_notes:
             note_body_lower = note.body.lower()
-            time_stamp = self.human_readable_date(note.created_at)
-            auth_name = note.author["name"]
-
-            data["dates"].append(time_stamp)
-            data["comment_authors"].append(
-                "bot" if "*" in auth_name else auth_name
-            )
             # Check for pipeline state
             if "cancel" in note_body_lower:
                 data["pipe_state"] = "cancel"
@@ -198,6 +220,13 @@ class RequestRepoAPI(BaseAPI):
                 continue
             else:
                 data["comments"].append(note.body)
+            # The authors and dates are aligned with the kept comments
+            data["note_ids"].append(note.id)
+            auth_name = note.author["name"]
+            data["comment_authors"].append(
+                "bot" if "*" in auth_name else auth_name
+            )
+            data["dates"].append(self.human_readable_date(note.created_at))
 
             # Check for completed job
             if job_comments[0].match(note.body):
@@ -241,18 +270,15 @@ class RequestRepoAPI(BaseAPI):
         # Note: 1 is added to the latest issue iid and added to the issue
         # description. As a result, users will be able to search for the
         # specific issue on the dashboard via the search bar.
-        issue_titles = {
-            "simple": "# Pipeline Request",
-            "advanced": "# Pipeline Request ADVANCED",
-        }
+        issue_title = REQUEST_TITLES[temp_type]
         latest_issue_iid = self.get_latest_issue_iid()
         issue_template = self.read_repo_file(templates[temp_type])
-        title_idx = issue_template.find(issue_titles[temp_type])
+        title_idx = issue_template.find(issue_title)
 
         # Split the string at the position of the specific word
-        first_part = issue_template[: title_idx + len(issue_titles[temp_type])]
+        first_part = issue_template[: title_idx + len(issue_title)]
         second_part = issue_template[
-            title_idx + len(issue_titles[temp_type]) :  # noqa E2023
+            title_idx + len(issue_title) :  # noqa E2023
         ]
         # Add new iid to the issue description
         return first_part + f"\n#{latest_issue_iid + 1}" + second_part
@@ -271,17 +297,17 @@ class RequestRepoAPI(BaseAPI):
         }
 
         if "[x] keep_results" in lower_text:
-            data["s3_results_flag"] = "keep results"
+            data["s3_results_flag"] = S3_FLAGS["keep_results"]
 
         if "[x] keep_raw_data" in lower_text:
-            data["s3_raw_data_flag"] = "keep raw data"
+            data["s3_raw_data_flag"] = S3_FLAGS["keep_raw_data"]
 
-        if "[x] hsmfs:/data" in lower_text:
+        if f"[x] {HSM_DATA_KEY.lower()}" in lower_text:
             data["has_hsm_data"] = True
 
         # Search for the username in reverse order
         for line in reversed(lower_text.split("\n")):
-            if "[x] username" in line:
+            if f"[x] {USERNAME_KEY}" in line:
                 name = line.split("=")[1].strip()
                 break
         else:
@@ -329,22 +355,80 @@ class RequestRepoAPI(BaseAPI):
         latest_issue = self.project.issues.list(per_page=1, get_all=False)[0]
         return latest_issue.iid
 
-    def total_issues(self, state, filter_params=None):
-        """Return total issues in a state or based on filter_params"""
-        # NOTE: Retrieve all the issues via the API is an expensive operation,
-        # so we only retrieve the total number of issues from the latest issue
-        # and subtract the number of issues in the opened state to get the
-        # total number of issues in the closed state.
-        open_len = len(self.project.issues.list(state="opened", get_all=True))
-        if state == "opened" and not filter_params:
-            return open_len
-        elif state == "closed" and not filter_params:
-            total_issues = self.get_latest_issue_iid()
-            return total_issues - open_len
-        else:
-            filter_params.update({"state": state})
-            # Retrieve total number of issues based on filter_params
-            return len(self.project.issues.list(**filter_params))
+    def get_updated_issues(self, issue_iids):
+        """Fetch several opened issues with a single request to check which
+        of them have been updated.
+
+        Parameters
+        ----------
+            issue_iids: list
+                The iids of the issues to be checked
+
+        Returns
+        -------
+            A dictionary of issue objects by iid
+        """
+        if not issue_iids:
+            return {}
+        issues = self.project.issues.list(
+            iids=list(issue_iids),
+            state="opened",
+            per_page=len(issue_iids),
+            get_all=False,
+        )
+        return {issue.iid: issue for issue in issues}
+
+    def get_issue_counts(self, search_term=None):
+        """Return the number of opened and closed issues (that match the
+        search term if it exists) with a single issues statistics request"""
+        # NOTE: Retrieving all the issues via the API only to count them is
+        # an expensive operation. GitLab computes the counts for us.
+        filter_params = {"search": search_term} if search_term else {}
+        statistics = self.project.issues_statistics.get(**filter_params)
+        counts = statistics.statistics["counts"]
+        return {"opened": counts["opened"], "closed": counts["closed"]}
+
+    def get_issues_page(
+        self,
+        state,
+        page,
+        per_page=10,
+        search_term=None,
+        on_progress=None,
+    ):
+        """Fetch a page of issues together with the issue counts, so that a
+        single fetch feeds the pipeline list, pagination, and tab badges.
+
+        Parameters
+        ----------
+            state: str
+                Filter issues by state
+            page: int
+                Get the page number of issues to be displayed
+            per_page: int
+                Set the number of issues to be displayed per page
+            search_term: str
+                Search for issues that match the term
+            on_progress: callable
+                Called with the number of processed issues and the number of
+                issues of the page
+
+        Returns
+        -------
+            A dictionary with the issues meta of the page and the number of
+            opened and closed issues
+        """
+        issues = self.get_issues_meta(
+            state,
+            page,
+            per_page=per_page,
+            search_term=search_term,
+            on_progress=on_progress,
+        )
+        return {
+            "issues": issues,
+            "counts": self.get_issue_counts(search_term=search_term),
+        }
 
     def change_s3_flag(self, issue_iid, flag_name):
         """Change the s3 flag (results or raw data) in an issue"""
@@ -363,7 +447,16 @@ class RequestRepoAPI(BaseAPI):
         issue_obj.description = desc
         issue_obj.save()
 
+    def get_request_schema(self):
+        """Return the request schema compiled from the dcevent defaults. The
+        defaults file is fetched again only every `DEFAULTS_TTL` seconds."""
+        key = (self.gitlab_url, self.project_num)
+        fetched = _defaults_files.get(key)
+        if fetched is None or time.monotonic() - fetched[0] > DEFAULTS_TTL:
+            fetched = (time.monotonic(), self.read_repo_file(DEFAULTS_PATH))
+            _defaults_files[key] = fetched
+        return compile_request_schema(fetched[1])
+
     def get_defaults(self):
-        defaults_path = "dashboard_dcevent_defaults.yaml"
-        default_str = self.read_repo_file(defaults_path)
-        return yaml.safe_load(default_str)
+        """Return the (read-only) dcevent defaults"""
+        return self.get_request_schema().defaults
@@ -0,0 +1,58 @@
+import time
+
+from flask import jsonify
+
+from .cache import get_cache
+from .gitlab import get_gitlab_instances
+
+# Timeout of the GitLab requests of the readiness check (seconds)
+GITLAB_TIMEOUT = 2
+
+# The result of the GitLab check is reused for this many seconds, so that
+# frequent probes of all the workers do not load GitLab
+GITLAB_CHECK_TTL = 5
+
+# Time and result of the last GitLab check
+_gitlab_check = {"time": None, "result": None}
+
+
+def check_gitlab():
+    """Request the projects from GitLab (at most every `GITLAB_CHECK_TTL`
+    seconds). Returns "ok" or the error message."""
+    now = time.monotonic()
+    last_time = _gitlab_check["time"]
+    if last_time is None or now - last_time > GITLAB_CHECK_TTL:
+        try:
+            for instance in get_gitlab_instances():
+                instance.ping(timeout=GITLAB_TIMEOUT)
+            result = "ok"
+        except Exception as exc:
+            result = str(exc)
+        _gitlab_check.update(time=now, result=result)
+    return _gitlab_check["result"]
+
+
+def liveness():
+    """The worker process is up and serves requests"""
+    return jsonify(status="ok")
+
+
+def readiness():
+    """The worker can reach GitLab and the shared cache backend"""
+    checks = {"gitlab": check_gitlab()}
+    try:
+        get_cache().has("readyz")
+        checks["cache"] = "ok"
+    except Exception as exc:
+        checks["cache"] = str(exc)
+
+    ready = all(check == "ok" for check in checks.values())
+    status = 200 if ready else 503
+    return jsonify(status="ok" if ready else "unavailable", **checks), status
+
+
+def register_health_routes(server, prefix="/"):
+    """Add the liveness (healthz) and readiness (readyz) endpoints to the
+    Flask server of the app"""
+    server.add_url_rule(f"{prefix}healthz", "healthz", liveness)
+    server.add_url_rule(f"{prefix}readyz", "readyz", readiness)
@@ -0,0 +1,198 @@
+import os
+import time
+from pathlib import Path
+
+import diskcache
+from dash import DiskcacheManager
+
+from .metrics import mark_process_dead, timed_job
+from .profiling import profiled_job
+from .tracing import traced
+
+# Default directory of the background callback jobs and results
+JOBS_DIR = Path(__file__).parents[1] / "resources" / "jobs"
+
+# Job entries and results of crashed workers are dropped after a while (s)
+JOB_EXPIRE = 600
+
+# A job that is not started after this time (s) by the request that
+# reserved it (e.g. the worker crashed) is started again
+JOB_START_TIMEOUT = 10
+
+# Job id of the requests for a job that another request is starting, which
+# is followed by the cache key of the job
+PENDING_JOB_PREFIX = "pending-"
+
+
+class SharedJobManager(DiskcacheManager):
+    """Disk-backed manager of background callbacks that runs identical jobs
+    (same callback and arguments) only once. Requests for a job that is
+    already running wait for the result of the running job instead of
+    starting a new one.
+
+    Notes
+    -----
+    Every job keeps the number of requests that wait for its result. The
+    result is removed when the last request gets it or is cancelled, and
+    the job process is killed only when no request waits for it anymore
+    (e.g. cancelled or superseded requests). Requests for a job that
+    another request is still starting get a pending job id, which the
+    polling requests resolve to the job process once it is started.
+    """
+
+    @staticmethod
+    def _make_job_key(key):
+        return f"{key}-job"
+
+    @staticmethod
+    def _make_pid_key(job):
+        return f"job-pid-{job}"
+
+    @staticmethod
+    def _pending_key(job):
+        """Return the cache key of a pending job id (None for the ids of
+        job processes)"""
+        if isinstance(job, str) and job.startswith(PENDING_JOB_PREFIX):
+            return job.removeprefix(PENDING_JOB_PREFIX)
+        return None
+
+    @staticmethod
+    def _starting(entry):
+        """Return whether the job of an entry is being started"""
+        return (
+            entry["job"] is None
+            and time.time() - entry["reserved_at"] < JOB_START_TIMEOUT
+        )
+
+    def make_job_fn(self, fn, progress, key=None):
+        # Record, trace, and (on demand) profile the jobs of every
+        # background callback
+        job = profiled_job(traced(f"job {fn.__name__}")(fn))
+        job_fn = super().make_job_fn(timed_job(job), progress, key)
+        cache = self.handle
+
+        def expiring_job_fn(result_key, progress_key, args, context):
+            job_fn(result_key, progress_key, args, context)
+            # Results that no request reads are dropped after a while
+            cache.touch(result_key, expire=JOB_EXPIRE)
+
+        return expiring_job_fn
+
+    def call_job_fn(self, key, job_fn, args, context):
+        job_key = self._make_job_key(key)
+        # Wait for the job of another request, or reserve the job
+        with self.handle.transact():
+            entry = self.handle.get(job_key)
+            if entry and (
+                self._starting(entry)
+                or (
+                    entry["job"] is not None and self.job_running(entry["job"])
+                )
+                or self.result_ready(key)
+            ):
+                entry["waiters"] += 1
+                self.handle.set(job_key, entry, expire=JOB_EXPIRE)
+                if entry["job"] is None:
+                    return PENDING_JOB_PREFIX + key
+                return entry["job"]
+            self.handle.set(
+                job_key,
+                {"job": None, "waiters": 1, "reserved_at": time.time()},
+                expire=JOB_EXPIRE,
+            )
+
+        # Start the job process outside of the transaction, so that the
+        # requests of other workers are not blocked while it is forked
+        try:
+            job = super().call_job_fn(key, job_fn, args, context)
+        except BaseException:
+            self.handle.delete(job_key)
+            raise
+        with self.handle.transact():
+            entry = self.handle.get(job_key) or {"waiters": 1}
+            entry["job"] = job
+            self.handle.set(job_key, entry, expire=JOB_EXPIRE)
+            self.handle.set(self._make_pid_key(job), key, expire=JOB_EXPIRE)
+        return job
+
+    def _job_process(self, job):
+        """Return the process of a job id (None for a pending job that is
+        not started)"""
+        key = self._pending_key(job)
+        if key is None:
+            return job
+        entry = self.handle.get(self._make_job_key(key))
+        return entry and entry["job"]
+
+    def job_running(self, job):
+        key = self._pending_key(job)
+        if key is not None:
+            entry = self.handle.get(self._make_job_key(key))
+            if not entry:
+                return False
+            if entry["job"] is None:
+                return self._starting(entry)
+            job = entry["job"]
+        return super().job_running(job)
+
+    def _release(self, key):
+        """Release a request waiting for the job of the given key. Returns
+        True if it was the last waiting request."""
+        job_key = self._make_job_key(key)
+        with self.handle.transact():
+            entry = self.handle.get(job_key)
+            if entry and entry["waiters"] > 1:
+                entry["waiters"] -= 1
+                self.handle.set(job_key, entry, expire=JOB_EXPIRE)
+                return False
+            if entry and entry["job"] is not None:
+                self.handle.delete(self._make_pid_key(entry["job"]))
+            self.handle.delete(job_key)
+        return True
+
+    def _kill(self, job):
+        """Kill a job process and drop its live metrics"""
+        super().terminate_job(job)
+        mark_process_dead(job)
+
+    def terminate_job(self, job):
+        if job is None:
+            return
+        key = self._pending_key(job)
+        if key is None:
+            key = self.handle.get(self._make_pid_key(job))
+        else:
+            job = self._job_process(job)
+        if key is not None:
+            if not self._release(key):
+                return
+            # The result of the last waiting request is not read anymore
+            self.clear_cache_entry(key)
+            self.clear_cache_entry(self._make_progress_key(key))
+        if job is not None:
+            self._kill(job)
+
+    def get_progress(self, key):
+        # Keep the progress for all the requests waiting for the job
+        return self.handle.get(self._make_progress_key(key))
+
+    def get_result(self, key, job):
+        result = self.handle.get(key, self.UNDEFINED)
+        if result is self.UNDEFINED:
+            return self.UNDEFINED
+
+        job = self._job_process(job)
+        if self._release(key):
+            self.clear_cache_entry(key)
+            self.clear_cache_entry(self._make_progress_key(key))
+            if job:
+                self._kill(job)
+        return result
+
+
+def create_job_manager():
+    """Create the manager of the background callbacks. The jobs are stored
+    in the `JOBS_DIR` environment variable directory (default:
+    resources/jobs), which is shared by all the workers of a host."""
+    cache = diskcache.Cache(os.getenv("JOBS_DIR", str(JOBS_DIR)))
+    return SharedJobManager(cache)
@@ -0,0 +1,197 @@
+import functools
+import inspect
+import os
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+import flask
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Name of the Dash callback that is handled in the current context
+current_callback = ContextVar("current_callback", default="none")
+# GitLab API method that is called in the current context
+current_method = ContextVar("current_method", default="none")
+
+# Buckets of the payload size histograms (bytes)
+SIZE_BUCKETS = (1e2, 1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+CALLBACK_DURATION = Histogram(
+    "dashboard_callback_duration_seconds",
+    "Wall time of Dash callback requests and background callback jobs",
+    ["callback", "phase"],
+)
+CALLBACK_RESPONSE_BYTES = Histogram(
+    "dashboard_callback_response_bytes",
+    "Response payload size of Dash callback requests",
+    ["callback"],
+    buckets=SIZE_BUCKETS,
+)
+GITLAB_REQUEST_DURATION = Histogram(
+    "dashboard_gitlab_request_duration_seconds",
+    "Latency of GitLab API requests by the Dash callback that made them",
+    ["callback"],
+)
+GITLAB_REQUESTS = Counter(
+    "dashboard_gitlab_requests",
+    "GitLab API requests by the Dash callback and the API method that made "
+    "them",
+    ["callback", "method"],
+)
+GITLAB_RESPONSE_BYTES = Counter(
+    "dashboard_gitlab_response_bytes",
+    "Payload size of GitLab API responses by the Dash callback",
+    ["callback"],
+)
+API_METHOD_DURATION = Histogram(
+    "dashboard_api_method_duration_seconds",
+    "Wall time of GitLab repository API methods",
+    ["method"],
+)
+
+
+def clear_multiproc_dir():
+    """Remove the metric files of previous server runs from the
+    `PROMETHEUS_MULTIPROC_DIR` directory (if set). Call it at server start,
+    before any process records metrics."""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for db_file in path.glob("*.db"):
+        db_file.unlink(missing_ok=True)
+
+
+def mark_process_dead(pid):
+    """Drop the live metrics of an exited process (server worker or
+    background job) if the metrics of all the processes are collected"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
+
+
+def observe_gitlab_response(response, *args, **kwargs):
+    """Record a GitLab API response (requests response hook)"""
+    callback_name = current_callback.get()
+    GITLAB_REQUESTS.labels(callback_name, current_method.get()).inc()
+    GITLAB_REQUEST_DURATION.labels(callback_name).observe(
+        response.elapsed.total_seconds()
+    )
+    GITLAB_RESPONSE_BYTES.labels(callback_name).inc(len(response.content))
+    return response
+
+
+def timed_method(cls_name, method):
+    """Wrap an API method to record its wall time and the GitLab requests
+    it makes"""
+    name = f"{cls_name}.{method.__name__}"
+    histogram = API_METHOD_DURATION.labels(name)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        token = current_method.set(name)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+            current_method.reset(token)
+
+    return wrapper
+
+
+def instrument_api(cls):
+    """Class decorator that records the wall time of the public methods
+    defined in a GitLab API class"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(attr):
+            continue
+        setattr(cls, name, timed_method(cls.__name__, attr))
+    return cls
+
+
+def timed_job(func):
+    """Wrap a background callback function to record the wall time of its
+    jobs"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_callback.set(func.__name__)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            CALLBACK_DURATION.labels(func.__name__, "job").observe(
+                time.perf_counter() - start
+            )
+            current_callback.reset(token)
+
+    return wrapper
+
+
+def callback_name(app, output_id):
+    """Return the function name of the callback of the given output id"""
+    callback = app.callback_map.get(output_id, {}).get("callback")
+    return getattr(callback, "__name__", "unknown")
+
+
+def register_metrics(app, prefix="/"):
+    """Record the wall time and response size of every Dash callback
+    request and expose all the metrics on the `<prefix>metrics` route.
+
+    Notes
+    -----
+    The metrics of all the processes (server workers and background jobs)
+    are collected if the `PROMETHEUS_MULTIPROC_DIR` environment variable is
+    set. Otherwise, every process exposes only its own metrics.
+    """
+    server = app.server
+    update_path = f"{app.config.routes_pathname_prefix}_dash-update-component"
+
+    @server.before_request
+    def start_callback_timer():
+        if flask.request.path != update_path:
+            return
+        body = flask.request.get_json(silent=True) or {}
+        name = callback_name(app, body.get("output", ""))
+        flask.g.callback_token = current_callback.set(name)
+        flask.g.callback_start = time.perf_counter()
+
+    @server.after_request
+    def observe_callback(response):
+        start = flask.g.pop("callback_start", None)
+        if start is not None:
+            name = current_callback.get()
+            CALLBACK_DURATION.labels(name, "request").observe(
+                time.perf_counter() - start
+            )
+            CALLBACK_RESPONSE_BYTES.labels(name).observe(
+                response.calculate_content_length() or 0
+            )
+        return response
+
+    @server.teardown_request
+    def reset_callback(exc=None):
+        token = flask.g.pop("callback_token", None)
+        if token is not None:
+            current_callback.reset(token)
+
+    def metrics():
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return flask.Response(
+            generate_latest(registry), mimetype=CONTENT_TYPE_LATEST
+        )
+
+    server.add_url_rule(f"{prefix}metrics", "metrics", metrics)
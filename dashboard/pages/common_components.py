@@ -4,6 +4,12 @@ import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
 from dash import html
 
+# Number of comments shown at once in a chat box
+CHAT_WINDOW = 50
+
+# Bot comments of the finished jobs of a pipeline
+COMPLETED_JOB_PREFIX = "Completed job"
+
 
 def button_comp(label, comp_id, type="primary", disabled=False):
     return dbc.Button(
@@ -17,8 +23,112 @@ def button_comp(label, comp_id, type="primary", disabled=False):
     )
 
 
-def chat_box(messages, gap=18):
-    """Creates a list of dbc.Card items from a dictionary of comments.
+def comment_card(comment, author, date, gap=18):
+    """Creates a dbc.Card item of a single issue comment"""
+    return dbc.Card(
+        children=[
+            dmc.Stack(
+                children=[
+                    html.P(
+                        web_link_check(comment),
+                        style={
+                            "color": "white",
+                            "fontSize": 15,
+                            "margin": "0",
+                        },
+                    ),
+                    html.Code(
+                        date,
+                        lang="python",
+                        style={
+                            "color": "black",
+                            "fontSize": 12,
+                            "margin": "1",
+                        },
+                    ),
+                ],
+                spacing=0,
+            ),
+            dbc.Badge(
+                author,
+                pill=False,
+                color="primary",
+                text_color="white",
+                style={"font-weight": "normal"},
+                className="position-absolute top-0 start-100 "
+                "translate-middle",
+            ),
+        ],
+        className="message-box",
+        style={
+            "margin-bottom": f"{gap}px",
+            "margin-top": f"{gap}px",
+            "border": "0",
+        },
+    )
+
+
+def job_summary_row(job_comments, gap=18):
+    """Creates a collapsible summary row of consecutive "Completed job"
+    comments, the comments are shown as plain text when expanded"""
+    first_date, last_date = job_comments[0][2], job_comments[-1][2]
+    return html.Details(
+        children=[
+            html.Summary(
+                f"{len(job_comments)} completed jobs "
+                f"({first_date} - {last_date})",
+                style={"color": "#10e84a", "cursor": "pointer"},
+            ),
+            html.Ul(
+                [
+                    html.Li(f"{comment} ({date})")
+                    for comment, _, date in job_comments
+                ],
+                style={"color": "white", "fontSize": 13},
+            ),
+        ],
+        className="message-box",
+        style={
+            "margin-bottom": f"{gap}px",
+            "margin-top": f"{gap}px",
+        },
+    )
+
+
+def job_rows(job_comments, gap=18):
+    """Creates a card for a single "Completed job" comment, otherwise an
+    aggregated summary row"""
+    if len(job_comments) == 1:
+        return comment_card(*job_comments[0], gap)
+    return job_summary_row(job_comments, gap)
+
+
+def chat_rows(messages, start=0, stop=None, gap=18):
+    """Creates the chat rows of the comments from `start` to `stop` index.
+    Consecutive "Completed job" comments are aggregated into a collapsible
+    summary row."""
+    rows = []
+    job_comments = []
+    for comment, author, date in zip(
+        messages["comments"][start:stop],
+        messages["comment_authors"][start:stop],
+        messages["dates"][start:stop],
+    ):
+        if comment.startswith(COMPLETED_JOB_PREFIX):
+            job_comments.append((comment, author, date))
+            continue
+        if job_comments:
+            rows.append(job_rows(job_comments, gap))
+            job_comments = []
+        rows.append(comment_card(comment, author, date, gap))
+    if job_comments:
+        rows.append(job_rows(job_comments, gap))
+    return rows
+
+
+def chat_box(messages, gap=18, window=CHAT_WINDOW):
+    """Creates a list of dbc.Card items from a dictionary of comments. Only
+    the newest comments are shown, the older ones are loaded on request.
 
     Parameters
     ----------
@@ -26,60 +136,16 @@ def chat_box(messages, gap=18):
             Pass the messages dataframe to the chat_box function
         gap: int
             Set the vertical space between each comment card
+        window: int
+            Number of the newest comments to be shown
 
     Returns
     -------
         A dbc.ListGroupItem with a list of dbc.Card components
     """
-    comment_cards = []
-
-    for comment, author, date in zip(
-        messages["comments"], messages["comment_authors"], messages["dates"]
-    ):
-        comment_card = dbc.Card(
-            children=[
-                dmc.Stack(
-                    children=[
-                        html.P(
-                            web_link_check(comment),
-                            style={
-                                "color": "white",
-                                "fontSize": 15,
-                                "margin": "0",
-                            },
-                        ),
-                        html.Code(
-                            date,
-                            lang="python",
-                            style={
-                                "color": "black",
-                                "fontSize": 12,
-                                "margin": "1",
-                            },
-                        ),
-                    ],
-                    spacing=0,
-                ),
-                dbc.Badge(
-                    author,
-                    pill=False,
-                    color="primary",
-                    text_color="white",
-                    style={"font-weight": "normal"},
-                    className="position-absolute top-0 start-100 "
-                    "translate-middle",
-                ),
-            ],
-            className="message-box",
-            style={
-                "margin-bottom": f"{gap}px",
-                "margin-top": f"{gap}px",
-                "border": "0",
-            },
-        )
-        comment_cards.append(comment_card)
+    start = max(len(messages["comments"]) - window, 0)
     return dbc.ListGroupItem(
-        children=comment_cards,
+        children=chat_rows(messages, start=start, gap=gap),
         style={
             "max-height": "30rem",
             "width": "100%",
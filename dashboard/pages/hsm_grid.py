@@ -1,27 +1,202 @@
+import json
 import pickle
+import threading
 from pathlib import Path
 
 import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
-from dash import Input, Output, State, callback
+from dash import (
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    clientside_callback,
+)
 from dash import callback_context as cc
 from dash import dcc, html
 from dash.exceptions import PreventUpdate
 from dash_iconify import DashIconify
+from hsm_snapshot import (
+    MANIFEST_FILE,
+    generation_path,
+    load_delta,
+    load_snapshot,
+    merge_folder_aggregates,
+)
 
 from .common_components import hover_card, line_breaks
 
 HSM_DATA_FILE = Path(__file__).parents[2] / "resources" / "hsm_drive.pkl"
+# Snapshots of the top-level folders of the drive, listed in a manifest
+HSM_PARTITIONS_DIR = HSM_DATA_FILE.with_name("hsm_partitions")
+HSM_MANIFEST_FILE = HSM_PARTITIONS_DIR / MANIFEST_FILE
+
+
+# Unpickled HSMFS drive snapshots, the file states they were loaded from,
+# and the indices of their entries (see `apply_hsm_deltas`) by snapshot path
+_hsm_snapshots = {}
+_hsm_snapshot_lock = threading.Lock()
+
+
+def apply_hsm_deltas(path, snapshot, generation):
+    """Apply the deltas written by `cache_handler.py` in place to a loaded
+    snapshot to bring it to `generation`, so that the cost is proportional
+    to the number of changes. Returns False if a delta is missing."""
+    data = snapshot["data"]
+    if generation <= data["generation"] or "folders" not in data:
+        return False
+    deltas = []
+    for gen in range(data["generation"] + 1, generation + 1):
+        try:
+            with open(generation_path(path, gen, "delta"), "rb") as file:
+                deltas.append(load_delta(file))
+        except FileNotFoundError:
+            return False
+        if "folders" not in deltas[-1]:
+            # Written before the folder aggregates
+            return False
+
+    cache_data = data["cache_data"]
+    folders = data["folders"]
+    if snapshot["positions"] is None:
+        # Indices of the entries by file path, built once per snapshot
+        snapshot["positions"] = {
+            tuple(entry["filepath"]): index
+            for index, entry in enumerate(cache_data)
+        }
+    positions = snapshot["positions"]
+    for delta in deltas:
+        for filepath in delta["removed"]:
+            index = positions.pop(tuple(filepath), None)
+            if index is None:
+                continue
+            # The last entry takes the place of the removed one
+            last = cache_data.pop()
+            if index < len(cache_data):
+                cache_data[index] = last
+                positions[tuple(last["filepath"])] = index
+        for entry in delta["modified"] + delta["added"]:
+            filepath = tuple(entry["filepath"])
+            if filepath in positions:
+                cache_data[positions[filepath]] = entry
+            else:
+                positions[filepath] = len(cache_data)
+                cache_data.append(entry)
+        for folder, aggregates in delta["folders"].items():
+            if aggregates is None:
+                folders.pop(folder, None)
+            else:
+                folders[folder] = aggregates
+    data.update(
+        update_time=deltas[-1]["update_time"],
+        num_entries=len(cache_data),
+        generation=generation,
+    )
+    return True
+
+
+def load_hsm_snapshot(path):
+    """Load a HSMFS drive snapshot. The snapshot is loaded again only when
+    the file changes, by applying the deltas to the new generation if they
+    are available. The snapshots loaded before forking the server workers
+    are shared by all of them."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    file_state = (stat.st_mtime_ns, stat.st_size)
+    with _hsm_snapshot_lock:
+        snapshot = _hsm_snapshots.setdefault(
+            path, {"file_state": None, "data": None, "positions": None}
+        )
+        if snapshot["file_state"] != file_state:
+            with open(path, "rb") as file:
+                header = pickle.load(file)
+                data = snapshot["data"]
+                generation = header.get("generation")
+                if not (
+                    data
+                    and data.get("generation")
+                    and generation
+                    and apply_hsm_deltas(path, snapshot, generation)
+                ):
+                    snapshot["data"] = load_snapshot(file, header)
+                    snapshot["positions"] = None
+            snapshot["file_state"] = file_state
+        return snapshot["data"]
 
 
 def load_hsm_data():
     """Load rtdc file paths from pickled HSMFS drive"""
-    if HSM_DATA_FILE.exists():
-        with open(HSM_DATA_FILE, "rb") as file:
-            return pickle.load(file)
-    else:
+    return load_hsm_snapshot(HSM_DATA_FILE)
+
+
+def load_hsm_manifest():
+    """Load the manifest of the partitioned HSMFS drive snapshot (None if
+    the drive is scanned to a single snapshot)"""
+    try:
+        with open(HSM_MANIFEST_FILE, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def load_hsm_partition(name, manifest=None):
+    """Load the snapshot of a top-level folder of the HSMFS drive ("" for
+    the files directly in the drive directory)"""
+    manifest = manifest or load_hsm_manifest()
+    info = (manifest or {"partitions": {}})["partitions"].get(name)
+    if info is None:
         return None
+    return load_hsm_snapshot(HSM_PARTITIONS_DIR / info["file"])
+
+
+def folder_rows(data, min_depth=1):
+    """Return the grid rows of the folders of a snapshot with the
+    aggregates computed by the drive scanner (number of files, total size,
+    newest modification time, and number of offline files). They are the
+    data of the group rows of the grid."""
+    return [
+        {"filepath": list(folder), "folder": True, **aggregates}
+        for folder, aggregates in data.get("folders", {}).items()
+        if len(folder) >= min_depth
+    ]
+
+
+def partitioned_rows(manifest):
+    """Return the grid rows of a partitioned snapshot: the files directly
+    in the drive directory, and the drive and top-level folders with their
+    aggregates. The files of a top-level folder are loaded when its row is
+    clicked (see `load_hsm_partition_rows`)."""
+    totals = {
+        "num_files": 0,
+        "size": 0,
+        "dateModified": None,
+        "num_offline": 0,
+    }
+    rows = []
+    for name, info in sorted(manifest["partitions"].items()):
+        aggregates = info["folder"]
+        merge_folder_aggregates(totals, aggregates)
+        if name:
+            rows.append(
+                {
+                    "filepath": ["HSMFS:", "Data", name],
+                    "folder": True,
+                    "partition": name,
+                    **aggregates,
+                }
+            )
+        else:
+            root = load_hsm_partition(name, manifest)
+            if root:
+                rows += root["cache_data"]
+    for folder in (["HSMFS:"], ["HSMFS:", "Data"]):
+        rows.append({"filepath": folder, "folder": True, **totals})
+    return rows
 
 
 def create_hsm_grid():
@@ -31,6 +206,8 @@ def create_hsm_grid():
             # Cache component to store selected files (dcor and hsm)
             dcc.Store(id="cache_dcor_files", data=[]),
             dcc.Store(id="cache_hsm_files", data=[]),
+            # Top-level HSMFS folders whose files are not loaded yet
+            dcc.Store(id="hsm_unloaded_partitions", data=[]),
             # DCOR heading section
             dmc.Group(
                 children=[
@@ -103,9 +280,12 @@ def create_hsm_grid():
                             color="yellow",
                             width=22,
                         ),
-                        notes="NOTE: The HSMFS drive gets updated every one "
-                        "hour. If you do not find your dataset in the "
-                        "below grid, please comeback after one hour.",
+                        notes="NOTE: New datasets on the HSMFS drive show up "
+                        "within a few seconds and the whole drive is "
+                        "rescanned every hour. If you do not find your "
+                        "dataset in the below grid, please reopen this "
+                        "section in a minute. Click a top-level folder to "
+                        "load its files.",
                     ),
                 ],
                 spacing=5,
@@ -124,8 +304,107 @@ def create_hsm_grid():
                 id="hsm_grid",
                 className="ag-theme-alpine-dark",
                 columnDefs=[
-                    {"field": "size", "width": 50, "maxWidth": 200},
-                    {"field": "dateModified", "width": 50, "maxWidth": 300},
+                    # Sizes in bytes and modification times in epoch
+                    # seconds, formatted in the browser
+                    {
+                        "field": "size",
+                        "width": 50,
+                        "maxWidth": 200,
+                        "valueFormatter": {
+                            "function": "formatFileSize(params.value)"
+                        },
+                        # Filter sizes in MB
+                        "filter": "agNumberColumnFilter",
+                        "filterValueGetter": {
+                            "function": "params.data "
+                            "&& params.data.size / 1024 ** 2"
+                        },
+                        "headerTooltip": "Size filter in MB (total size "
+                        "of the files of a folder)",
+                    },
+                    {
+                        "field": "dateModified",
+                        "width": 50,
+                        "maxWidth": 300,
+                        "valueFormatter": {
+                            "function": "formatEpochTime(params.value)"
+                        },
+                        "filter": "agDateColumnFilter",
+                        "filterParams": {
+                            "comparator": {"function": "compareEpochDate"}
+                        },
+                    },
+                    # Files on disk (online) or migrated to tape (offline,
+                    # opening them recalls them from tape)
+                    {
+                        "headerName": "Residency",
+                        "colId": "residency",
+                        "width": 50,
+                        "maxWidth": 150,
+                        "valueGetter": {"function": "residency(params.data)"},
+                        "filter": "agSetColumnFilter",
+                        "headerTooltip": "Offline files are on tape and take "
+                        "longer to process",
+                    },
+                    # Aggregates of the folders and their subfolders
+                    # (computed by the drive scanner, also for the folders
+                    # whose files are not loaded)
+                    {
+                        "headerName": "Files",
+                        "field": "num_files",
+                        "width": 50,
+                        "maxWidth": 150,
+                        "filter": "agNumberColumnFilter",
+                        "headerTooltip": "Number of files in a folder",
+                    },
+                    {
+                        "headerName": "Offline files",
+                        "field": "num_offline",
+                        "width": 50,
+                        "maxWidth": 150,
+                        "filter": "agNumberColumnFilter",
+                        "headerTooltip": "Number of offline files in a "
+                        "folder",
+                    },
+                    # Metadata of the .rtdc files
+                    {
+                        "headerName": "Events",
+                        "field": "metadata.event_count",
+                        "width": 50,
+                        "maxWidth": 150,
+                        "filter": "agNumberColumnFilter",
+                    },
+                    {
+                        "headerName": "Duration [s]",
+                        "field": "metadata.duration",
+                        "width": 50,
+                        "maxWidth": 150,
+                        "valueFormatter": {
+                            "function": "params.value == null ? null : "
+                            "Math.round(params.value)"
+                        },
+                        "filter": "agNumberColumnFilter",
+                    },
+                    {
+                        "headerName": "Flow rate [µL/s]",
+                        "field": "metadata.flow_rate",
+                        "width": 50,
+                        "maxWidth": 150,
+                        "filter": "agNumberColumnFilter",
+                    },
+                    {
+                        "headerName": "Region",
+                        "field": "metadata.region",
+                        "width": 50,
+                        "maxWidth": 150,
+                        "filter": "agSetColumnFilter",
+                    },
+                    {
+                        "headerName": "Setup",
+                        "field": "metadata.setup",
+                        "width": 50,
+                        "maxWidth": 150,
+                    },
                 ],
                 defaultColDef={
                     "flex": 1,
@@ -167,7 +446,7 @@ def create_hsm_grid():
                 },
                 enableEnterpriseModules=True,
                 style={"height": 600},
-                # getRowId="params.data.filepath",
+                getRowId="params.data.filepath.join('/')",
             ),
         ]
     )
@@ -235,16 +514,75 @@ def create_show_grid(show_grid_id):
 @callback(
     Output("hsm_grid", "rowData"),
     Output("hsm_time_badge", "children"),
+    Output("hsm_unloaded_partitions", "data"),
     Input("pipeline_accord", "active_item"),
 )
 def load_hms_grid_data(pipeline_active_accord):
     """Show HSMFS grid and update time only when user clicks on
-    `Data to Process` accord"""
-    data = load_hsm_data()
-    if pipeline_active_accord == "hsm_accord" and data:
+    `Data to Process` accord. With a partitioned drive snapshot, only the
+    files directly in the drive directory are loaded and the top-level
+    folders are loaded on click (see `load_hsm_partition_rows`)."""
+    if pipeline_active_accord != "hsm_accord":
+        return None, "Last Update: N/A", []
+    manifest = load_hsm_manifest()
+    unloaded = []
+    if manifest:
+        unloaded = sorted(name for name in manifest["partitions"] if name)
+        data = {
+            "cache_data": partitioned_rows(manifest),
+            "update_time": manifest["update_time"],
+            "partial": any(
+                info["partial"] for info in manifest["partitions"].values()
+            ),
+        }
+    else:
+        data = load_hsm_data()
+        if data:
+            data = dict(
+                data, cache_data=data["cache_data"] + folder_rows(data)
+            )
+    if data:
         hsm_grid_data, hsm_time = data["cache_data"], data["update_time"]
-        return hsm_grid_data, f"Last Update: {hsm_time}"
-    return None, "Last Update: N/A"
+        if data.get("partial"):
+            return (
+                hsm_grid_data,
+                f"Last Update: {hsm_time} (partial scan)",
+                unloaded,
+            )
+        return hsm_grid_data, f"Last Update: {hsm_time}", unloaded
+    return None, "Last Update: N/A", []
+
+
+@callback(
+    Output("hsm_grid", "rowTransaction"),
+    Output("hsm_unloaded_partitions", "data", allow_duplicate=True),
+    Input("hsm_grid", "cellClicked"),
+    State("hsm_unloaded_partitions", "data"),
+    prevent_initial_call=True,
+)
+def load_hsm_partition_rows(clicked_cell, unloaded):
+    """Add the files and subfolders of a top-level HSMFS folder when the
+    user clicks it"""
+    filepath = str((clicked_cell or {}).get("rowId")).split("/")
+    if len(filepath) != 3 or filepath[2] not in unloaded:
+        raise PreventUpdate
+    data = load_hsm_partition(filepath[2])
+    if data is None:
+        raise PreventUpdate
+    unloaded.remove(filepath[2])
+    # The folder row is updated (it is not a placeholder anymore)
+    folder = {"filepath": filepath, "folder": True}
+    subfolders = []
+    for row in folder_rows(data, min_depth=3):
+        if len(row["filepath"]) == 3:
+            folder = row
+        else:
+            subfolders.append(row)
+    transaction = {
+        "update": [folder],
+        "add": data["cache_data"] + subfolders,
+    }
+    return transaction, unloaded
 
 
 @callback(
@@ -261,27 +599,26 @@ def update_show_grid_data(dcor_files, hsm_files):
     return rowdata, rowdata
 
 
-@callback(
+# Display the number of selected files (runs in the browser)
+clientside_callback(
+    ClientsideFunction(
+        namespace="clientside", function_name="countSelectedFiles"
+    ),
     Output("num_files", "children"),
     Input("show_grid", "selectedRows"),
     prevent_initial_call=True,
 )
-def display_selected_files_number(show_grid_rows):
-    """Display the number of selected files"""
-    return len(show_grid_rows)
-
 
-@callback(
+# Activates Add button in DCOR input bar only when the dropdown value and
+# DCOR identifier is entered (runs in the browser)
+clientside_callback(
+    ClientsideFunction(
+        namespace="clientside", function_name="toggleDcorButton"
+    ),
     Output("dcor_button", "disabled"),
     Input("dcor_drop_down", "value"),
     Input("dcor_text_input", "value"),
 )
-def toggle_dcor_button(drop_value, filename):
-    """Activates Add button in DCOR input bar only when the dropdown value
-    and DCOR identifier is entered"""
-    if drop_value and filename:
-        return False
-    return True
 
 
 @callback(
@@ -316,7 +653,18 @@ def cache_user_given_dcor_files(_, drop_input, text_input, cached_files):
 def cache_user_given_hsm_files(hsm_selection, cached_files):
     """Collects the user selected hsm files and cache them"""
     if hsm_selection:
-        hsm_files = ["/".join(s["filepath"]) for s in hsm_selection]
+        hsm_files = []
+        for row in hsm_selection:
+            if "partition" in row:
+                # Folder whose files are not loaded in the grid
+                data = load_hsm_partition(row["partition"])
+                rows = data["cache_data"] if data else []
+            elif "folder" in row:
+                # Its files are selected with it
+                continue
+            else:
+                rows = [row]
+            hsm_files += ["/".join(r["filepath"]) for r in rows]
         # Convert list of strings into ag grid rowdata
         for hfile in hsm_files:
             if hfile not in cached_files:
@@ -325,13 +673,13 @@ def cache_user_given_hsm_files(hsm_selection, cached_files):
     raise PreventUpdate
 
 
-@callback(
+# Filter grid rows based on filter value (runs in the browser)
+clientside_callback(
+    ClientsideFunction(
+        namespace="clientside", function_name="updateGridFilter"
+    ),
     Output("hsm_grid", "dashGridOptions"),
     Input("grid_filter_text", "value"),
     State("hsm_grid", "dashGridOptions"),
     prevent_initial_call=True,
 )
-def update_filter(filter_value, grid_options):
-    """Filter grid rows based on filter value"""
-    grid_options["quickFilterText"] = filter_value
-    return grid_options
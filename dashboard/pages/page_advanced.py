@@ -1,11 +1,20 @@
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
-from dash import ALL, Input, Output, State, callback
+from dash import (
+    ALL,
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    clientside_callback,
+)
 from dash import callback_context as cc
 from dash import dcc, html
 from dash_iconify import DashIconify
 
 from ..gitlab import get_gitlab_instances
+from ..gitlab.request_schema import OPTION_LABELS
 from .common_components import (
     checklist_comp,
     divider_line_comp,
@@ -36,9 +45,13 @@ DEFAULTS_FILE = (
 
 
 def get_advanced_template():
-    """Fetch the advanced request template from request repo"""
+    """Fetch the advanced request template and the request schema from
+    request repo"""
     request_gitlab, _ = get_gitlab_instances()
-    return request_gitlab.get_request_template(temp_type="advanced")
+    return (
+        request_gitlab.get_request_template(temp_type="advanced"),
+        request_gitlab.get_request_schema(),
+    )
 
 
 def advanced_segmentation_section():
@@ -67,10 +80,8 @@ def advanced_segmentation_section():
                         comp_id="legacy_click",
                         options=[
                             {
-                                "label": "legacy: Legacy thresholding "
-                                "with OpenCV",
-                                "value": "legacy: Legacy thresholding "
-                                "with OpenCV",
+                                "label": OPTION_LABELS["legacy"],
+                                "value": OPTION_LABELS["legacy"],
                                 "disabled": False,
                             }
                         ],
@@ -159,8 +170,8 @@ def advanced_segmentation_section():
                         comp_id="thresh_click",
                         options=[
                             {
-                                "label": "thresh: thresholding segmentation",
-                                "value": "thresh: thresholding segmentation",
+                                "label": OPTION_LABELS["thresh"],
+                                "value": OPTION_LABELS["thresh"],
                                 "disabled": False,
                             }
                         ],
@@ -220,8 +231,8 @@ def advanced_segmentation_section():
                 comp_id="water_click",
                 options=[
                     {
-                        "label": "watershed: Watershed algorithm",
-                        "value": "watershed: Watershed algorithm",
+                        "label": OPTION_LABELS["watershed"],
+                        "value": OPTION_LABELS["watershed"],
                         "disabled": False,
                     }
                 ],
@@ -260,10 +271,8 @@ def advanced_segmentation_section():
                 comp_id="std_click",
                 options=[
                     {
-                        "label": "std: Standard-deviation-"
-                        "based thresholding",
-                        "value": "std: Standard-deviation-"
-                        "based thresholding",
+                        "label": OPTION_LABELS["std"],
+                        "value": OPTION_LABELS["std"],
                         "disabled": False,
                     }
                 ],
@@ -313,10 +322,8 @@ def background_correction_section():
                 comp_id="romed_click",
                 options=[
                     {
-                        "label": "rollmed: Rolling median RT-DC background "
-                        "image computation",
-                        "value": "rollmed: Rolling median RT-DC background "
-                        "image computation",
+                        "label": OPTION_LABELS["rollmed"],
+                        "value": OPTION_LABELS["rollmed"],
                         "disabled": False,
                     }
                 ],
@@ -349,17 +356,12 @@ def background_correction_section():
                 comp_id="spmed_click",
                 options=[
                     {
-                        "label": "sparsemed: Sparse median background "
-                        "correction with cleansing",
-                        "value": "sparsemed: Sparse median background "
-                        "correction with cleansing",
+                        "label": OPTION_LABELS["sparsemed"],
+                        "value": OPTION_LABELS["sparsemed"],
                         "disabled": False,
                     }
                 ],
-                defaults=[
-                    "sparsemed: Sparse median background correction with "
-                    "cleansing"
-                ],
+                defaults=[OPTION_LABELS["sparsemed"]],
             ),
             html.Ul(
                 id="spmed_toggle",
@@ -425,8 +427,8 @@ def gating_options_section():
                 comp_id="ngate_click",
                 options=[
                     {
-                        "label": "norm gating",
-                        "value": "norm gating",
+                        "label": OPTION_LABELS["norm_gate"],
+                        "value": OPTION_LABELS["norm_gate"],
                         "disabled": False,
                     }
                 ],
@@ -546,12 +548,15 @@ def advanced_page_layout(refresh_path):
 @callback(
     Output("advance_unet_model", "children"),
     Input("advance_unet_click", "value"),
+    background=True,
+    cancel=[Input("url", "pathname")],
 )
 def fetch_and_show_unet_models(unet_click):
     """This circular callback fetches unet model metadata from the
     DVC repo and shows it as dmc.RadioGroup options, enable the user
     to select the appropriate options from the same dmc.RadioItem
-    options."""
+    options. It runs as a background job, so that slow GitLab requests do
+    not block a server worker."""
 
     _, dvc_gitlab = get_gitlab_instances()
 
@@ -563,15 +568,6 @@ def fetch_and_show_unet_models(unet_click):
 
 @callback(
     Output("cache_advance_params", "data"),
-    Output("advance_unet_toggle", "style"),
-    Output("legacy_toggle", "style"),
-    Output("thresh_toggle", "style"),
-    Output("water_toggle", "style"),
-    Output("std_toggle", "style"),
-    Output("romed_toggle", "style"),
-    Output("spmed_toggle", "style"),
-    Output("ngate_toggle", "style"),
-    Output("advance_nframe_toggle", "style"),
     # Unet inputs
     Input("advance_unet_click", "value"),
     Input("advance_unet_model", "value"),
@@ -643,7 +639,7 @@ def toggle_and_cache_params(
     nframe_click,
     nframe_value,
 ):
-    """Consolidated callback for toggling and caching parameters"""
+    """Consolidated callback for caching parameters"""
 
     cache_data = {
         **format_params(
@@ -662,18 +658,31 @@ def toggle_and_cache_params(
         **format_params(fluorescence_click, ""),
     }
 
-    return (
-        cache_data,
-        {"display": "block"} if unet_click else {"display": "none"},
-        {"display": "block"} if legacy_click else {"display": "none"},
-        {"display": "block"} if thresh_click else {"display": "none"},
-        {"display": "block"} if water_click else {"display": "none"},
-        {"display": "block"} if std_click else {"display": "none"},
-        {"display": "block"} if romed_click else {"display": "none"},
-        {"display": "block"} if spmed_click else {"display": "none"},
-        {"display": "block"} if ngate_click else {"display": "none"},
-        {"display": "block"} if nframe_click else {"display": "none"},
-    )
+    return cache_data
+
+
+# Show the options of the switched on methods (runs in the browser)
+clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggleOptions"),
+    Output("advance_unet_toggle", "style"),
+    Output("legacy_toggle", "style"),
+    Output("thresh_toggle", "style"),
+    Output("water_toggle", "style"),
+    Output("std_toggle", "style"),
+    Output("romed_toggle", "style"),
+    Output("spmed_toggle", "style"),
+    Output("ngate_toggle", "style"),
+    Output("advance_nframe_toggle", "style"),
+    Input("advance_unet_click", "value"),
+    Input("legacy_click", "value"),
+    Input("thresh_click", "value"),
+    Input("water_click", "value"),
+    Input("std_click", "value"),
+    Input("romed_click", "value"),
+    Input("spmed_click", "value"),
+    Input("ngate_click", "value"),
+    Input("advance_nframe_click", "value"),
+)
 
 
 @callback(
@@ -701,8 +710,9 @@ def collect_advanced_pipeline_params(
     if author_name and advance_title and rtdc_files:
         rtdc_files = [s["filepath"] for s in selected_rows]
         pipeline_template = {"title": advance_title}
+        template, schema = get_advanced_template()
         description = update_advanced_template(
-            cache_params, author_name, rtdc_files, get_advanced_template()
+            cache_params, author_name, rtdc_files, template, schema
         )
         pipeline_template["description"] = description
 
@@ -731,22 +741,15 @@ def advanced_request_submission_popup(_, cached_adv_temp, close_popup, popup):
     return popup
 
 
-@callback(
+# Activates create pipeline button only when author name, title, data files,
+# and segmentation method are entered (runs in the browser)
+clientside_callback(
+    ClientsideFunction(
+        namespace="clientside", function_name="toggleCreatePipelineButton"
+    ),
     Output("advance_create_pipeline_click", "disabled"),
     Input("title_drop", "value"),
     Input("title_text", "value"),
     Input("show_grid", "selectedRows"),
     Input("cache_advance_params", "data"),
 )
-def toggle_advanced_create_pipeline_button(
-    author_name,
-    title,
-    selected_rows,
-    cached_params,
-):
-    """Activates create pipeline button only when author name, title,
-    data files, and segmentation method are entered"""
-    if author_name and title and title.strip() and selected_rows:
-        if cached_params:
-            return False
-    return True
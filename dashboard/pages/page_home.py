@@ -1,17 +1,34 @@
+import bisect
+import json
 import os
 from pathlib import Path
 
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
-from dash import MATCH, Input, Output, State, callback
+from dash import (
+    ALL,
+    MATCH,
+    ClientsideFunction,
+    Input,
+    Output,
+    Patch,
+    State,
+    callback,
+    clientside_callback,
+)
 from dash import callback_context as ctx
 from dash import dcc, html, no_update
 from dash.exceptions import PreventUpdate
 from dash_iconify import DashIconify
+from plotly.io.json import to_json_plotly
 
+from ..cache import get_cache
 from ..gitlab import get_gitlab_instances
+from ..tracing import add_event, span
 from .common_components import (
+    CHAT_WINDOW,
     chat_box,
+    chat_rows,
     create_badge,
     create_list_group,
     header_comp,
@@ -31,6 +48,16 @@ CHANGELOG_PATH = Path(__file__).parents[2] / "CHANGELOG"
 
 PIPELINES_PER_PAGE = 10
 
+# Rendered accordion items are cached by pipeline iid, update time, and state
+ACCORDION_ITEM_CACHE_KEY = "accordion_item_{iid}_{updated_at}_{pipe_state}"
+ACCORDION_ITEM_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Wait until the user stops typing before searching pipelines (ms)
+SEARCH_DEBOUNCE = 500
+
+# Check the running pipelines for new comments and progress (ms)
+LIVE_UPDATE_INTERVAL = 15000
+
 
 def welcome_tab_content():
     """Welcome tab content"""
@@ -85,7 +112,7 @@ def workflow_tab_content():
     )
 
 
-def get_tab_content(tab_id, load_id, pagination_id):
+def get_tab_content(tab_id, load_id, progress_id, pagination_id):
     """Placeholder for opened and closed tab content. This function has
     search bar to find specific pipeline and `Previous` and `Next` buttons
     for the pagination.
@@ -104,15 +131,25 @@ def get_tab_content(tab_id, load_id, pagination_id):
                             icon=DashIconify(icon="tabler:search", width=22),
                             size="sm",
                             persistence=True,
+                            debounce=SEARCH_DEBOUNCE,
                         ),
                         style={"width": "80%"},
                     ),
                     dbc.ListGroupItem(
-                        children=dcc.Loading(
-                            color="#10e84a",
-                            id=load_id,
-                            parent_style={"position": "center"},
-                        ),
+                        children=[
+                            dcc.Loading(
+                                color="#10e84a",
+                                id=load_id,
+                                parent_style={"position": "center"},
+                            ),
+                            # Number of loaded pipelines of the page
+                            dmc.Text(
+                                id=progress_id,
+                                color="#10e84a",
+                                size="sm",
+                                style={"display": "none"},
+                            ),
+                        ],
                         style={"width": "20%"},
                     ),
                 ],
@@ -140,12 +177,6 @@ def get_tab_content(tab_id, load_id, pagination_id):
                 horizontal=True,
                 style={"justify-content": "center"},
             ),
-            # Cache page number on the browser
-            dcc.Store(
-                id="cache_page_num",
-                storage_type="memory",
-                data={"opened": 1, "closed": 1},
-            ),
         ]
     )
 
@@ -451,6 +482,24 @@ def create_pipeline_accordion_item(pipeline):
                     ),
                     line_breaks(1),
                     html.Strong("Comments:"),
+                    dmc.Button(
+                        "Load older comments",
+                        id={
+                            "type": "pipeline_older_comments",
+                            "index": pipeline["iid"],
+                        },
+                        disabled=True,
+                        size="xs",
+                        variant="subtle",
+                        leftIcon=DashIconify(icon="mdi:chevron-double-up"),
+                    ),
+                    # Snapshot of the pipeline data shown in the browser
+                    dcc.Store(
+                        id={
+                            "type": "pipeline_live",
+                            "index": pipeline["iid"],
+                        }
+                    ),
                     dmc.LoadingOverlay(
                         children=dbc.ListGroup(
                             id={
@@ -473,10 +522,27 @@ def create_pipeline_accordion_item(pipeline):
     )
 
 
+def render_pipeline_accordion_item(pipeline):
+    """Return the accordion item of a pipeline as component JSON. The
+    serialized items are cached in the shared cache, so an item is rendered
+    again only when its pipeline is updated or changes its state."""
+    cache = get_cache()
+    cache_key = ACCORDION_ITEM_CACHE_KEY.format(**pipeline)
+    item_json = cache.get(cache_key)
+    add_event(
+        "cache miss" if item_json is None else "cache hit",
+        pipeline=pipeline["iid"],
+    )
+    if item_json is None:
+        item_json = to_json_plotly(create_pipeline_accordion_item(pipeline))
+        cache.set(cache_key, item_json, timeout=ACCORDION_ITEM_CACHE_TIMEOUT)
+    return json.loads(item_json)
+
+
 def create_pipelines_accordion(pipelines_meta):
     """Creates an accordion of GitLab issues"""
     children_items = [
-        create_pipeline_accordion_item(pipeline) for pipeline in pipelines_meta
+        render_pipeline_accordion_item(pipeline) for pipeline in pipelines_meta
     ]
     return dmc.Accordion(
         children=children_items,
@@ -519,6 +585,12 @@ def home_page_layout():
     """Creates home page layout"""
     return dbc.Card(
         [
+            # A single poll updates all the shown running pipelines
+            dcc.Interval(
+                id="pipeline_live_interval", interval=LIVE_UPDATE_INTERVAL
+            ),
+            # Page of the pipeline list to fetch (see `route_tab_request`)
+            dcc.Store(id="pipeline_list_query"),
             dmc.Tabs(
                 children=[
                     dmc.TabsList(
@@ -564,6 +636,7 @@ def home_page_layout():
                         children=get_tab_content(
                             tab_id="opened_content",
                             load_id="opened_loading",
+                            progress_id="opened_progress",
                             pagination_id="opened_pagination",
                         ),
                         value="opened",
@@ -572,6 +645,7 @@ def home_page_layout():
                         children=get_tab_content(
                             tab_id="closed_content",
                             load_id="closed_loading",
+                            progress_id="closed_progress",
                             pagination_id="closed_pagination",
                         ),
                         value="closed",
@@ -585,57 +659,44 @@ def home_page_layout():
                 persistence=True,
                 value="welcome",
                 variant="outline",
-            )
+            ),
         ]
     )
 
 
+def count_pages(num_pipelines):
+    """Return the number of pages needed to show the given pipelines"""
+    return max(
+        (num_pipelines + PIPELINES_PER_PAGE - 1) // PIPELINES_PER_PAGE, 1
+    )
+
+
 @callback(
-    Output("cache_page_num", "data"),
-    Output("opened_pagination", "max_value"),
-    Output("closed_pagination", "max_value"),
+    Output("pipeline_list_query", "data"),
+    Output("open_tab_badge", "children"),
+    Output("close_tab_badge", "children"),
     Input("main_tabs", "value"),
     Input("opened_pagination", "active_page"),
     Input("closed_pagination", "active_page"),
     Input("pipeline_filter", "value"),
-    State("cache_page_num", "data"),
 )
-def change_page(
-    active_tab, opened_curr_page, closed_curr_page, search_term, cache_page
-):
-    """Cache page number when user clicks on pagination buttons."""
+def route_tab_request(active_tab, opened_page, closed_page, search_term):
+    """Request the pipelines of the page in the opened and closed tabs (see
+    `switch_tabs`). Only the tab badges are shown in the welcome and
+    workflow tabs; the counts are fetched right away, without starting a
+    background job."""
     if active_tab in ["opened", "closed"]:
-        request_gitlab, _ = get_gitlab_instances()
-        filter_dict = (
-            {"search": search_term, "get_all": True} if search_term else None
-        )
-        total_pipe_num = request_gitlab.total_issues(
-            state=active_tab, filter_params=filter_dict
-        )
-        # Default pipelines per page 10. Divide by 10 to get number of pages.
-        temp = total_pipe_num + PIPELINES_PER_PAGE - 1
-        num_pages = temp // PIPELINES_PER_PAGE
-        cache_page[active_tab] = (
-            opened_curr_page if active_tab == "opened" else closed_curr_page
-        )
-        return cache_page, num_pages, num_pages
-    return no_update
+        page = opened_page if active_tab == "opened" else closed_page
+        query = {
+            "active_tab": active_tab,
+            "page": page,
+            "search_term": search_term,
+        }
+        return query, no_update, no_update
 
-
-@callback(
-    Output("open_tab_badge", "children"),
-    Output("close_tab_badge", "children"),
-    Input("url", "pathname"),
-)
-def show_pipeline_number(pathname):
-    """Display how many pipelines available in opened and closed tabs"""
     request_gitlab, _ = get_gitlab_instances()
-
-    if pathname == BASENAME_PREFIX:
-        open_num = request_gitlab.total_issues(state="opened")
-        close_num = request_gitlab.total_issues(state="closed")
-        return open_num, close_num
-    return no_update, no_update
+    counts = request_gitlab.get_issue_counts(search_term=search_term)
+    return no_update, counts["opened"], counts["closed"]
 
 
 @callback(
@@ -643,58 +704,181 @@ def show_pipeline_number(pathname):
     Output("closed_content", "children"),
     Output("opened_loading", "parent_style"),
     Output("closed_loading", "parent_style"),
-    Input("main_tabs", "value"),
-    Input("cache_page_num", "data"),
-    Input("pipeline_filter", "value"),
+    Output("opened_pagination", "max_value"),
+    Output("closed_pagination", "max_value"),
+    Output("open_tab_badge", "children", allow_duplicate=True),
+    Output("close_tab_badge", "children", allow_duplicate=True),
+    Input("pipeline_list_query", "data"),
+    background=True,
+    progress=[
+        Output("opened_progress", "children"),
+        Output("closed_progress", "children"),
+    ],
+    running=[
+        (
+            Output("opened_progress", "style"),
+            {"display": "inline"},
+            {"display": "none"},
+        ),
+        (
+            Output("closed_progress", "style"),
+            {"display": "inline"},
+            {"display": "none"},
+        ),
+    ],
+    cancel=[Input("url", "pathname")],
+    prevent_initial_call=True,
 )
-def switch_tabs(active_tab, cache_page, search_term):
-    """Allow user to switch between welcome, opened, and closed tabs"""
+def switch_tabs(set_progress, query):
+    """Show the pipelines of the opened or closed tab. Every interaction
+    (tab switch, pagination, and search) performs a single fetch that
+    returns the pipelines of the page together with the pipeline counts,
+    which feed the pipeline list, the pagination, and the tab badges.
+
+    Notes
+    -----
+    The callback runs as a background job, so the fetch does not block a
+    server worker and the number of loaded pipelines is shown while it runs.
+    The search input is debounced, and a newer request (or leaving the page)
+    terminates the job of a running request, so only the work of the latest
+    query is performed.
+    """
+    if not query:
+        raise PreventUpdate
+    active_tab = query["active_tab"]
     load_style = {"position": "center"}
 
     request_gitlab, _ = get_gitlab_instances()
 
-    if active_tab in ["welcome", "workflow"]:
-        raise PreventUpdate
+    def show_progress(num_done, num_issues):
+        progress = f"{num_done} / {num_issues}"
+        set_progress((progress, progress))
 
-    # if active_tab in ["opened", "closed"]:
-    pipeline_meta = request_gitlab.get_issues_meta(
+    page_data = request_gitlab.get_issues_page(
         state=active_tab,
-        page=cache_page[active_tab],
+        page=query["page"],
         per_page=PIPELINES_PER_PAGE,
-        search_term=search_term,
+        search_term=query["search_term"],
+        on_progress=show_progress,
     )
+    pipeline_meta = page_data["issues"]
+    counts = page_data["counts"]
 
     if len(pipeline_meta) == 0:
-        return [
-            html.Div(
-                [
-                    line_breaks(1),
-                    header_comp("⦿ No active requests found!", indent=40),
-                    line_breaks(5),
-                ]
-            ),
-            no_update,
-            no_update,
-            no_update,
-        ]
-    # else:
+        content = html.Div(
+            [
+                line_breaks(1),
+                header_comp("⦿ No active requests found!", indent=40),
+                line_breaks(5),
+            ]
+        )
+    else:
+        with span("render pipelines", pipelines=len(pipeline_meta)):
+            content = create_pipelines_accordion(pipeline_meta)
+
     if active_tab == "opened":
-        return [
-            create_pipelines_accordion(pipeline_meta),
-            no_update,
-            load_style,
-            no_update,
-        ]
-    if active_tab == "closed":
-        return [
-            no_update,
-            create_pipelines_accordion(pipeline_meta),
-            no_update,
-            load_style,
-        ]
+        tab_outputs = [content, no_update, load_style, no_update]
+    else:
+        tab_outputs = [no_update, content, no_update, load_style]
 
-    # Default return statement in case none of the conditions are met
-    raise PreventUpdate
+    return tab_outputs + [
+        count_pages(counts["opened"]),
+        count_pages(counts["closed"]),
+        counts["opened"],
+        counts["closed"],
+    ]
+
+
+def progress_fields(pipeline_notes):
+    """Return the jobs text, progress value, and progress label of a
+    pipeline"""
+    finished_jobs = pipeline_notes["finished_jobs"]
+    total_jobs = pipeline_notes["total_jobs"]
+    progress = pipeline_notes["progress"]
+
+    # Show only comments if total jobs equal to zero
+    if total_jobs == 0:
+        return "Jobs: [0 / 0]", None, None
+    return (
+        f"Jobs: [{finished_jobs} / {total_jobs}]",
+        progress,
+        f"{progress:.0f} %",
+    )
+
+
+def older_comments_stop(pipeline_notes, first_note_id):
+    """Return the index of the first comment that is not older than the
+    note `first_note_id`. The note ids increase with the creation of the
+    notes, so the comments are found even if notes were removed."""
+    if first_note_id is None:
+        return 0
+    return bisect.bisect_left(pipeline_notes["note_ids"], first_note_id)
+
+
+def pipeline_snapshot(pipeline_num, pipeline_notes, first_note_id=None):
+    """Return the snapshot of the pipeline data that is shown in the
+    browser, which is compared against the new notes of the pipeline.
+    `first_note_id` is the note id of the oldest shown comment (default:
+    the first comment of the newest chat box window)."""
+    jobs, progress, _ = progress_fields(pipeline_notes)
+    note_ids = pipeline_notes["note_ids"]
+    num_comments = len(pipeline_notes["comments"])
+    if first_note_id is None and note_ids:
+        first_note_id = note_ids[max(len(note_ids) - CHAT_WINDOW, 0)]
+    return {
+        "iid": str(pipeline_num),
+        "updated_at": pipeline_notes["updated_at"],
+        "pipe_state": pipeline_notes["pipe_state"],
+        "num_comments": num_comments,
+        "first_note_id": first_note_id,
+        "has_older_comments": older_comments_stop(
+            pipeline_notes, first_note_id
+        )
+        > 0,
+        "jobs": jobs,
+        "progress": progress,
+    }
+
+
+def pipeline_updates(snapshot, pipeline_notes):
+    """Compare the shown pipeline data with the new notes of the pipeline.
+
+    Returns
+    -------
+        A list with the comments, jobs text, progress value, progress label,
+        and new snapshot, where only the changed fields are updated. New
+        comments are appended to the shown ones.
+    """
+    jobs, progress, label = progress_fields(pipeline_notes)
+    num_comments = len(pipeline_notes["comments"])
+
+    first_note_id = snapshot["first_note_id"]
+    if num_comments == snapshot["num_comments"]:
+        comments = no_update
+    elif num_comments > snapshot["num_comments"]:
+        comments = Patch()
+        comments["props"]["children"].extend(
+            chat_rows(pipeline_notes, start=snapshot["num_comments"])
+        )
+        if first_note_id is None:
+            # No comments were shown
+            first_note_id = pipeline_notes["note_ids"][
+                snapshot["num_comments"]
+            ]
+    else:
+        comments = chat_box(pipeline_notes)
+        first_note_id = None
+
+    if progress == snapshot["progress"]:
+        progress = label = no_update
+
+    return [
+        comments,
+        jobs if jobs != snapshot["jobs"] else no_update,
+        progress,
+        label,
+        pipeline_snapshot(snapshot["iid"], pipeline_notes, first_note_id),
+    ]
 
 
 @callback(
@@ -703,41 +887,168 @@ def switch_tabs(active_tab, cache_page, search_term):
     Output({"type": "pipeline_progress_num", "index": MATCH}, "children"),
     Output({"type": "pipeline_progress_bar", "index": MATCH}, "value"),
     Output({"type": "pipeline_progress_bar", "index": MATCH}, "label"),
+    Output({"type": "pipeline_live", "index": MATCH}, "data"),
     Input("pipeline_accordion", "value"),
+    State({"type": "pipeline_live", "index": MATCH}, "data"),
+    background=True,
+    cancel=[Input("url", "pathname")],
     prevent_initial_call=True,
 )
-def show_pipeline_data(pipeline_num):
-    """Display pipeline data when the user clicks on pipeline accordion"""
+def show_pipeline_data(pipeline_num, snapshot=None):
+    """Display pipeline data when the user clicks on pipeline accordion. A
+    pipeline that has already been shown is kept up to date by
+    `push_pipeline_updates`, so it is not rebuilt when it is reopened. The
+    callback runs as a background job, so that slow GitLab requests do not
+    block a server worker."""
 
     request_gitlab, _ = get_gitlab_instances()
 
     # Check if there is an active_item selected
     if not pipeline_num:
-        return [no_update] * 5
+        return [no_update] * 6
+
+    if snapshot and snapshot["iid"] == str(pipeline_num):
+        return [no_update] * 6
 
     pipeline_notes = request_gitlab.get_processed_issue_notes(pipeline_num)
 
     # Create dash chat box from the notes
     chat = chat_box(pipeline_notes)
 
-    finished_jobs = pipeline_notes["finished_jobs"]
-    total_jobs = pipeline_notes["total_jobs"]
-    result_path = pipeline_notes["results_path"]
-    progress = pipeline_notes["progress"]
-
-    # Show only comments if total jobs equal to zero
-    if total_jobs == 0:
-        return chat, result_path, "Jobs: [0 / 0]", None, None
-
-    result = [
+    return [
         chat,
-        result_path,
-        f"Jobs: [{finished_jobs} / {total_jobs}]",
-        progress,
-        f"{progress:.0f} %",
+        pipeline_notes["results_path"],
+        *progress_fields(pipeline_notes),
+        pipeline_snapshot(pipeline_num, pipeline_notes),
     ]
 
-    return result
+
+@callback(
+    Output(
+        {"type": "pipeline_comments", "index": MATCH},
+        "children",
+        allow_duplicate=True,
+    ),
+    Output(
+        {"type": "pipeline_live", "index": MATCH},
+        "data",
+        allow_duplicate=True,
+    ),
+    Input({"type": "pipeline_older_comments", "index": MATCH}, "n_clicks"),
+    State({"type": "pipeline_live", "index": MATCH}, "data"),
+    prevent_initial_call=True,
+)
+def load_older_comments(n_clicks, snapshot):
+    """Prepend the previous window of comments to the shown comments of a
+    pipeline. The comments are paged by the note id of the oldest shown
+    comment, since the indices of the comments change when notes are
+    removed."""
+    if not snapshot or not snapshot["has_older_comments"]:
+        raise PreventUpdate
+
+    request_gitlab, _ = get_gitlab_instances()
+    pipeline_notes = request_gitlab.get_processed_issue_notes(
+        int(snapshot["iid"])
+    )
+
+    stop = older_comments_stop(pipeline_notes, snapshot["first_note_id"])
+    if stop == 0:
+        return no_update, {**snapshot, "has_older_comments": False}
+    start = max(stop - CHAT_WINDOW, 0)
+    comments = Patch()
+    for row in reversed(chat_rows(pipeline_notes, start=start, stop=stop)):
+        comments["props"]["children"].prepend(row)
+
+    return comments, {
+        **snapshot,
+        "first_note_id": pipeline_notes["note_ids"][start],
+        "has_older_comments": start > 0,
+    }
+
+
+# Enable the load older comments button only when there are older comments
+clientside_callback(
+    ClientsideFunction(
+        namespace="clientside", function_name="toggleOlderComments"
+    ),
+    Output({"type": "pipeline_older_comments", "index": MATCH}, "disabled"),
+    Input({"type": "pipeline_live", "index": MATCH}, "data"),
+)
+
+
+@callback(
+    Output(
+        {"type": "pipeline_comments", "index": ALL},
+        "children",
+        allow_duplicate=True,
+    ),
+    Output(
+        {"type": "pipeline_progress_num", "index": ALL},
+        "children",
+        allow_duplicate=True,
+    ),
+    Output(
+        {"type": "pipeline_progress_bar", "index": ALL},
+        "value",
+        allow_duplicate=True,
+    ),
+    Output(
+        {"type": "pipeline_progress_bar", "index": ALL},
+        "label",
+        allow_duplicate=True,
+    ),
+    Output(
+        {"type": "pipeline_live", "index": ALL}, "data", allow_duplicate=True
+    ),
+    Input("pipeline_live_interval", "n_intervals"),
+    State("main_tabs", "value"),
+    State({"type": "pipeline_live", "index": ALL}, "data"),
+    prevent_initial_call=True,
+)
+def push_pipeline_updates(n_intervals, active_tab, snapshots):
+    """Push the changes of all the shown running pipelines to the browser.
+
+    Notes
+    -----
+    All the shown running pipelines are checked with a single GitLab request
+    and only the notes of the updated pipelines are fetched. Only the changed
+    fields (new comments, jobs, and progress) are sent to the browser.
+    """
+    if active_tab != "opened":
+        raise PreventUpdate
+
+    running = {
+        snapshot["iid"]
+        for snapshot in snapshots
+        if snapshot and snapshot["pipe_state"] == "run"
+    }
+    if not running:
+        raise PreventUpdate
+
+    request_gitlab, _ = get_gitlab_instances()
+    issues = request_gitlab.get_updated_issues([int(iid) for iid in running])
+
+    outputs = [[no_update] * len(snapshots) for _ in range(5)]
+    notes_by_iid = {}
+    for pos, snapshot in enumerate(snapshots):
+        if not snapshot or snapshot["iid"] not in running:
+            continue
+        issue = issues.get(int(snapshot["iid"]))
+        if issue is None:
+            # The pipeline has been closed, stop checking it
+            outputs[4][pos] = {**snapshot, "pipe_state": "finish"}
+            continue
+        if issue.updated_at <= snapshot["updated_at"]:
+            continue
+        if issue.iid not in notes_by_iid:
+            notes_by_iid[issue.iid] = request_gitlab.get_processed_issue_notes(
+                issue.iid, issue_object=issue
+            )
+        updates = pipeline_updates(snapshot, notes_by_iid[issue.iid])
+        for output, value in zip(outputs, updates):
+            output[pos] = value
+
+    return outputs
 
 
 @callback(
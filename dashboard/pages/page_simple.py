@@ -1,11 +1,19 @@
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
-from dash import Input, Output, State, callback
+from dash import (
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    callback,
+    clientside_callback,
+)
 from dash import callback_context as ctx
 from dash import dcc, html, no_update
 from dash_iconify import DashIconify
 
 from ..gitlab import get_gitlab_instances
+from ..gitlab.request_schema import OPTION_LABELS
 from .common_components import (
     divider_line_comp,
     form_group_input,
@@ -29,9 +37,13 @@ from .utils import update_simple_template
 
 
 def get_simple_template():
-    """Fetch the simple request template from request repo"""
+    """Fetch the simple request template and the request schema from
+    request repo"""
     request_gitlab, _ = get_gitlab_instances()
-    return request_gitlab.get_request_template(temp_type="simple")
+    return (
+        request_gitlab.get_request_template(temp_type="simple"),
+        request_gitlab.get_request_schema(),
+    )
 
 
 def simple_segmentation_section():
@@ -56,10 +68,8 @@ def simple_segmentation_section():
                     dbc.Checklist(
                         options=[
                             {
-                                "label": "legacy: Legacy thresholding "
-                                "with OpenCV",
-                                "value": "legacy: Legacy thresholding "
-                                "with OpenCV",
+                                "label": OPTION_LABELS["legacy"],
+                                "value": OPTION_LABELS["legacy"],
                             },
                         ],
                         id="simple_legacy_click",
@@ -167,12 +177,15 @@ def simple_page_layout(refresh_path):
 @callback(
     Output("simple_unet_model", "children"),
     Input("simple_unet_click", "value"),
+    background=True,
+    cancel=[Input("url", "pathname")],
 )
 def fetch_and_show_unet_models(unet_click):
     """This circular callback fetches unet model metadata from the
     DVC repo and shows it as dmc.RadioGroup options, enable the user
     to select the appropriate options from the same dmc.RadioItem
-    options."""
+    options. It runs as a background job, so that slow GitLab requests do
+    not block a server worker."""
 
     _, dvc_gitlab = get_gitlab_instances()
 
@@ -185,9 +198,6 @@ def fetch_and_show_unet_models(unet_click):
 @callback(
     # Outputs
     Output("cache_simple_params", "data"),
-    Output("simple_unet_toggle", "style"),
-    Output("simple_legacy_toggle", "style"),
-    Output("simple_nframe_toggle", "style"),
     # Unet inputs
     Input("simple_unet_click", "value"),
     Input("simple_unet_model", "value"),
@@ -217,7 +227,7 @@ def toggle_and_cache_params(
     nframe_click,
     nframe_value,
 ):
-    """Consolidated callback for toggling options and caching parameters"""
+    """Consolidated callback for caching parameters"""
     cache_data = {
         **format_params(
             unet_click, [unet_value if unet_value else ""], ["model_file"]
@@ -229,12 +239,19 @@ def toggle_and_cache_params(
         **format_params(fluorescence_click, ""),
     }
 
-    return (
-        cache_data,
-        {"display": "block"} if unet_click else {"display": "none"},
-        {"display": "block"} if legacy_click else {"display": "none"},
-        {"display": "block"} if nframe_click else {"display": "none"},
-    )
+    return cache_data
+
+
+# Show the options of the switched on methods (runs in the browser)
+clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="toggleOptions"),
+    Output("simple_unet_toggle", "style"),
+    Output("simple_legacy_toggle", "style"),
+    Output("simple_nframe_toggle", "style"),
+    Input("simple_unet_click", "value"),
+    Input("simple_legacy_click", "value"),
+    Input("simple_nframe_click", "value"),
+)
 
 
 @callback(
@@ -259,38 +276,31 @@ def collect_simple_pipeline_params(
         # Create a template dict with title
         pipeline_template = {"title": simple_title}
         # Update the simple template from request repo
+        template, schema = get_simple_template()
         description = update_simple_template(
             cached_params,
             author_name,
             rtdc_files,
-            get_simple_template(),
+            template,
+            schema,
         )
         pipeline_template["description"] = description
         return pipeline_template
     return no_update
 
 
-@callback(
+# Activates create pipeline button only when author name, title, data files,
+# and segmentation method are entered (runs in the browser)
+clientside_callback(
+    ClientsideFunction(
+        namespace="clientside", function_name="toggleCreatePipelineButton"
+    ),
     Output("simple_create_pipeline_click", "disabled"),
     Input("title_drop", "value"),
     Input("titel_text", "value"),
     Input("show_grid", "selectedRows"),
     Input("cache_simple_params", "data"),
 )
-def toggle_simple_create_pipeline_button(
-    author_name, title, selected_rows, cached_params
-):
-    """Activates create pipeline button only when author name, title,
-    data files, and segmentation method are entered"""
-    if (
-        author_name
-        and title
-        and title.strip()
-        and selected_rows
-        and cached_params
-    ):
-        return False
-    return True
 
 
 @callback(
@@ -0,0 +1,282 @@
+import cProfile
+import collections
+import contextlib
+import functools
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+import flask
+
+# Profile mode of every callback request ("cprofile" or "sample"). If unset,
+# only the requests of admins (see `PROFILE_TOKEN`) are profiled.
+PROFILE_MODE = os.getenv("PROFILE_MODE")
+
+# Admins enable profiling for their browser with `?profile=<token>`
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+# Directory of the profile dumps
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", str(Path(__file__).parents[1] / "resources" / "profiles")
+)
+
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_COOKIE = "dashboard_profile"
+INDEX_FILE = "index.jsonl"
+
+# Interval between the stack samples of the sampling profiler (s)
+SAMPLE_INTERVAL = 0.005
+
+# Number of recent profiles that are considered on the index page
+RECENT_PROFILES = 500
+
+# Profile mode requested in the current context (inherited by background
+# callback jobs)
+current_profile = ContextVar("current_profile", default=None)
+
+_index_lock = threading.Lock()
+
+
+class Sampler:
+    """Sampling profiler that records the stack of a thread at a fixed
+    interval. Has the same interface as `cProfile.Profile`; the stacks are
+    dumped in the folded format of flame graph tools."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                file_name = os.path.basename(code.co_filename)
+                stack.append(
+                    f"{code.co_name} ({file_name}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+def save_profile(profiler, name, mode, duration):
+    """Write the dump of a profiler to the profile directory and add it to
+    the index of the profiles"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    suffix = ".prof" if mode == "cprofile" else ".folded"
+    file_name = "{}-{}-{}{}".format(
+        time.strftime("%Y%m%d-%H%M%S"),
+        secrets.token_hex(3),
+        re.sub(r"[^\w.-]+", "_", name),
+        suffix,
+    )
+    profiler.dump_stats(os.path.join(PROFILE_DIR, file_name))
+    entry = {
+        "file": file_name,
+        "name": name,
+        "mode": mode,
+        "duration_ms": round(duration * 1e3, 1),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "pid": os.getpid(),
+    }
+    index_path = os.path.join(PROFILE_DIR, INDEX_FILE)
+    with _index_lock, open(index_path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+@contextlib.contextmanager
+def profile(name, mode):
+    """Profile the `with` block with the given mode and save the dump.
+    Does nothing if the mode is None."""
+    if mode not in PROFILE_MODES:
+        yield
+        return
+
+    profiler = cProfile.Profile() if mode == "cprofile" else Sampler()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another deterministic profiler is active in this thread
+        yield
+        return
+
+    token = current_profile.set(mode)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        current_profile.reset(token)
+        save_profile(profiler, name, mode, time.perf_counter() - start)
+
+
+def profiled_job(func):
+    """Wrap a background callback function to profile its jobs if the
+    request that started the job was profiled"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile(f"job {func.__name__}", current_profile.get()):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def recent_profiles(num_profiles=50):
+    """Return the index entries of the slowest recent profiles"""
+    index_path = os.path.join(PROFILE_DIR, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, encoding="utf-8") as file:
+        lines = collections.deque(file, maxlen=RECENT_PROFILES)
+    entries = [json.loads(line) for line in lines]
+    entries.sort(key=lambda x: x["duration_ms"], reverse=True)
+    return entries[:num_profiles]
+
+
+def admin_mode():
+    """Return the profile mode enabled by an admin for the browser of the
+    current request (None if the request is not from an admin)"""
+    if not PROFILE_TOKEN:
+        return None
+    mode, _, token = flask.request.cookies.get(PROFILE_COOKIE, "").partition(
+        ":"
+    )
+    if mode in PROFILE_MODES and secrets.compare_digest(token, PROFILE_TOKEN):
+        return mode
+    return None
+
+
+def requested_mode():
+    """Return the profile mode of the current request (None if the request
+    is not profiled)"""
+    return PROFILE_MODE or admin_mode()
+
+
+PROFILES_TEMPLATE = """<!doctype html>
+<title>Profiles</title>
+<h1>Slowest recent profiles</h1>
+<table>
+  <tr><th>Time</th><th>Name</th><th>Mode</th><th>Duration (ms)</th></tr>
+  {% for entry in entries %}
+  <tr>
+    <td>{{ entry.time }}</td>
+    <td>
+      <a href="{{ prefix }}profiles/{{ entry.file }}">{{ entry.name }}</a>
+    </td>
+    <td>{{ entry.mode }}</td>
+    <td>{{ entry.duration_ms }}</td>
+  </tr>
+  {% endfor %}
+</table>
+"""
+
+
+def register_profiling(app, callback_name, prefix="/"):
+    """Profile Dash callback requests on demand and list the slowest recent
+    profiles on the `<prefix>profiles` route.
+
+    Notes
+    -----
+    All the callback requests are profiled if the `PROFILE_MODE`
+    environment variable is set. Otherwise, an admin enables profiling for
+    their browser by opening a page with `?profile=<PROFILE_TOKEN>` (and
+    optionally `&profile_mode=sample`) and disables it with `?profile=off`.
+    Background callback jobs are profiled with the mode of the request that
+    started them. An invalid `PROFILE_MODE` raises a `ValueError` when the
+    app starts. The profiles are only served to admins, also when
+    `PROFILE_MODE` is set.
+    """
+    if PROFILE_MODE and PROFILE_MODE not in PROFILE_MODES:
+        raise ValueError(
+            f"Invalid PROFILE_MODE {PROFILE_MODE!r}, expected one of "
+            f"{', '.join(PROFILE_MODES)}"
+        )
+    server = app.server
+    update_path = f"{app.config.routes_pathname_prefix}_dash-update-component"
+
+    @server.before_request
+    def start_callback_profile():
+        value = flask.request.args.get("profile")
+        if value == "off":
+            flask.g.profile_cookie = ""
+        elif PROFILE_TOKEN and value is not None:
+            mode = flask.request.args.get("profile_mode", "cprofile")
+            if mode in PROFILE_MODES and secrets.compare_digest(
+                value, PROFILE_TOKEN
+            ):
+                flask.g.profile_cookie = f"{mode}:{value}"
+
+        if flask.request.path != update_path:
+            return
+        mode = requested_mode()
+        if mode is None:
+            return
+        body = flask.request.get_json(silent=True) or {}
+        callback_profile = profile(
+            f"callback {callback_name(app, body.get('output', ''))}", mode
+        )
+        callback_profile.__enter__()
+        flask.g.callback_profile = callback_profile
+
+    @server.after_request
+    def set_profile_cookie(response):
+        cookie = flask.g.pop("profile_cookie", None)
+        if cookie:
+            response.set_cookie(
+                PROFILE_COOKIE, cookie, httponly=True, samesite="Lax"
+            )
+        elif cookie is not None:
+            response.delete_cookie(PROFILE_COOKIE)
+        return response
+
+    @server.teardown_request
+    def end_callback_profile(exc=None):
+        callback_profile = flask.g.pop("callback_profile", None)
+        if callback_profile is not None:
+            callback_profile.__exit__(None, None, None)
+
+    def profiles():
+        if admin_mode() is None:
+            flask.abort(404)
+        return flask.render_template_string(
+            PROFILES_TEMPLATE, entries=recent_profiles(), prefix=prefix
+        )
+
+    def profile_dump(file_name):
+        if admin_mode() is None:
+            flask.abort(404)
+        return flask.send_from_directory(
+            PROFILE_DIR, file_name, as_attachment=True
+        )
+
+    server.add_url_rule(f"{prefix}profiles", "profiles", profiles)
+    server.add_url_rule(
+        f"{prefix}profiles/<path:file_name>", "profile_dump", profile_dump
+    )
@@ -0,0 +1,90 @@
+import os
+
+from gunicorn.app.base import BaseApplication
+
+from .cache import get_cache
+from .gitlab import get_gitlab_instances
+from .metrics import clear_multiproc_dir, mark_process_dead
+from .pages.hsm_grid import (
+    load_hsm_data,
+    load_hsm_manifest,
+    load_hsm_partition,
+)
+
+# Default number of worker processes and threads per worker
+DEFAULT_WORKERS = 2 * (os.cpu_count() or 1) + 1
+DEFAULT_THREADS = 4
+
+# GitLab requests of a callback can take a while (s)
+WORKER_TIMEOUT = 120
+
+
+def post_fork(server, worker):
+    """Create new GitLab clients and cache connections in every worker
+    instead of sharing the connections of the parent process"""
+    get_gitlab_instances.cache_clear()
+    get_cache.cache_clear()
+
+
+def child_exit(server, worker):
+    """Drop the live metrics of an exited worker"""
+    mark_process_dead(worker.pid)
+
+
+def preload_hsm_data():
+    """Load the HSMFS drive snapshot that is shown first: the files in the
+    drive directory of a partitioned snapshot, or the single snapshot"""
+    manifest = load_hsm_manifest()
+    if manifest is None:
+        load_hsm_data()
+    else:
+        load_hsm_partition("", manifest)
+
+
+class DashboardServer(BaseApplication):
+    """Prefork WSGI server (gunicorn) for the dashboard"""
+
+    def __init__(self, application, options=None):
+        self.application = application
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def run_production_server(
+    application,
+    host="0.0.0.0",
+    port=8050,
+    workers=DEFAULT_WORKERS,
+    threads=DEFAULT_THREADS,
+):
+    """Serve the dashboard with several worker processes and threads.
+
+    Notes
+    -----
+    The app is preloaded in the parent process, so the workers are forked
+    with the imported app and the already loaded HSMFS drive snapshot (see
+    `preload_hsm_data`). GitLab derived data is shared by the workers
+    through the cache backend (see `dashboard.cache.get_cache`). The
+    metrics of previous runs are removed from `PROMETHEUS_MULTIPROC_DIR`
+    before the app is served.
+    """
+    clear_multiproc_dir()
+    preload_hsm_data()
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "timeout": WORKER_TIMEOUT,
+        "post_fork": post_fork,
+        "child_exit": child_exit,
+    }
+    DashboardServer(application, options).run()
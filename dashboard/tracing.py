@@ -0,0 +1,250 @@
+import contextlib
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from contextvars import ContextVar, copy_context
+
+import flask
+
+# Span of the current context (None outside of traced work)
+current_span = ContextVar("current_span", default=None)
+
+# Traces are written as JSON lines (one span per line) to this file
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+_export_lock = threading.Lock()
+
+
+class Span:
+    """A timed unit of work of a trace"""
+
+    __slots__ = (
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "start",
+        "end",
+        "attributes",
+        "events",
+    )
+
+    def __init__(self, name, parent=None, attributes=None, start=None):
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start = start or time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.events = []
+
+    def to_dict(self):
+        """Return the span in the OpenTelemetry (OTLP/JSON) span layout"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start,
+            "endTimeUnixNano": self.end,
+            "durationMs": (self.end - self.start) / 1e6,
+            "attributes": self.attributes,
+            "events": self.events,
+            "pid": os.getpid(),
+        }
+
+
+def tracing_enabled():
+    """Return True if the spans are exported"""
+    return TRACE_FILE is not None
+
+
+def export(span):
+    """Append a finished span to the trace file"""
+    line = json.dumps(span.to_dict(), default=str) + "\n"
+    with _export_lock, open(TRACE_FILE, "a", encoding="utf-8") as file:
+        file.write(line)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Trace the work of the `with` block as a child span of the current
+    span. Does nothing if tracing is disabled."""
+    if not tracing_enabled():
+        yield None
+        return
+
+    new_span = Span(name, current_span.get(), attributes)
+    token = current_span.set(new_span)
+    try:
+        yield new_span
+    except Exception as exc:
+        new_span.attributes["error"] = repr(exc)
+        raise
+    finally:
+        current_span.reset(token)
+        new_span.end = time.time_ns()
+        export(new_span)
+
+
+def add_event(name, **attributes):
+    """Add an event (e.g. a cache hit) to the current span"""
+    active_span = current_span.get()
+    if active_span is not None:
+        active_span.events.append(
+            {
+                "name": name,
+                "timeUnixNano": time.time_ns(),
+                "attributes": attributes,
+            }
+        )
+
+
+def record_span(name, duration, **attributes):
+    """Record a finished child span of the current span that took the given
+    duration (s), e.g. a GitLab request that is timed by `requests`"""
+    if not tracing_enabled():
+        return
+    end = time.time_ns()
+    finished = Span(
+        name,
+        current_span.get(),
+        attributes,
+        start=end - int(duration * 1e9),
+    )
+    finished.end = end
+    export(finished)
+
+
+def traced(name=None):
+    """Decorator that traces every call of a function"""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_api(cls):
+    """Class decorator that traces the public methods defined in a GitLab
+    API class"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(attr):
+            continue
+        setattr(cls, name, traced(f"{cls.__name__}.{name}")(attr))
+    return cls
+
+
+def submit(executor, func, *args):
+    """Submit a task to an executor in a copy of the current context, so the
+    task is traced as a child of the current span (including the time it
+    waited in the queue)"""
+    queued = time.perf_counter()
+
+    def task():
+        wait_ms = (time.perf_counter() - queued) * 1e3
+        with span(
+            f"task {func.__name__}",
+            queue_wait_ms=round(wait_ms, 3),
+            thread=threading.current_thread().name,
+        ):
+            return func(*args)
+
+    return executor.submit(copy_context().run, task)
+
+
+def register_tracing(app, callback_name):
+    """Trace every Dash callback request as the root span of a trace.
+    `callback_name` returns the callback name of an output id."""
+    server = app.server
+    update_path = f"{app.config.routes_pathname_prefix}_dash-update-component"
+
+    @server.before_request
+    def start_callback_span():
+        if not tracing_enabled() or flask.request.path != update_path:
+            return
+        body = flask.request.get_json(silent=True) or {}
+        output_id = body.get("output", "")
+        callback_span = span(
+            f"callback {callback_name(app, output_id)}", output=output_id
+        )
+        callback_span.__enter__()
+        flask.g.callback_span = callback_span
+
+    @server.teardown_request
+    def end_callback_span(exc=None):
+        callback_span = flask.g.pop("callback_span", None)
+        if callback_span is not None:
+            callback_span.__exit__(None, None, None)
+
+
+def trace_http_response(response, *args, **kwargs):
+    """Record an HTTP response (requests response hook) as a span"""
+    record_span(
+        f"HTTP {response.request.method}",
+        response.elapsed.total_seconds(),
+        url=response.request.path_url,
+        status=response.status_code,
+        bytes=len(response.content),
+    )
+    return response
+
+
+def format_trace(spans):
+    """Format the spans of a trace as an indented tree with the duration of
+    every span"""
+    children = {}
+    for item in sorted(spans, key=lambda x: x["startTimeUnixNano"]):
+        children.setdefault(item["parentSpanId"], []).append(item)
+    span_ids = {item["spanId"] for item in spans}
+
+    lines = []
+
+    def add_lines(item, depth):
+        lines.append(
+            f"{item['durationMs']:10.1f} ms  {'  ' * depth}{item['name']}"
+        )
+        for child in children.get(item["spanId"], []):
+            add_lines(child, depth + 1)
+
+    for parent_id, roots in children.items():
+        if parent_id is None or parent_id not in span_ids:
+            for root in roots:
+                add_lines(root, 0)
+    return "\n".join(lines)
+
+
+def print_slowest_traces(trace_file, num_traces=5):
+    """Print the span trees of the slowest traces of a trace file"""
+    traces = {}
+    with open(trace_file, encoding="utf-8") as file:
+        for line in file:
+            item = json.loads(line)
+            traces.setdefault(item["traceId"], []).append(item)
+
+    def trace_duration(spans):
+        start = min(item["startTimeUnixNano"] for item in spans)
+        end = max(item["endTimeUnixNano"] for item in spans)
+        return end - start
+
+    slowest = sorted(traces.values(), key=trace_duration, reverse=True)
+    for spans in slowest[:num_traces]:
+        print(format_trace(spans), end="\n\n")
+
+
+if __name__ == "__main__":
+    import sys
+
+    print_slowest_traces(sys.argv[1])
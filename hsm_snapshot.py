@@ -0,0 +1,167 @@
+"""File format of the HSM drive snapshots and their deltas.
+
+The snapshots are written by the drive scanner (`cache_handler.py`) and
+read by the scanner and by the dashboard. This module only uses the
+standard library, so that it can be copied next to `cache_handler.py`.
+"""
+
+from pathlib import Path
+from urllib.parse import quote
+import json
+import os
+import pickle
+
+# Format of the snapshot files (a stream of pickles: header, chunks of
+# entries (lists), aggregates of the folders that were completed (tuples of
+# (folder, aggregates) pairs), and footer)
+SNAPSHOT_FORMAT = "hsm-snapshot-chunks"
+# Format of the delta files (a stream of pickles: header, chunks of added,
+# removed, and modified entries, and footer with the update time)
+DELTA_FORMAT = "hsm-delta-chunks"
+# Manifest of the partitions of a partitioned snapshot
+MANIFEST_FILE = "manifest.json"
+# File stem of the partition with the files in the drive directory (other
+# partitions are named after their folder, "@" is always quoted)
+ROOT_PARTITION_STEM = "@root"
+
+
+def generation_path(path, generation, kind="snapshot"):
+    """Return the path of a snapshot generation (`hsm_drive.5.pkl`) or of
+    the delta to a generation (`hsm_drive.5.delta.pkl`)"""
+    path = Path(path)
+    infix = f".{generation}.delta" if kind == "delta" else f".{generation}"
+    return path.with_name(path.stem + infix + path.suffix)
+
+
+def filepath_key(filepath):
+    """Sort key of the file paths in the order of a sorted drive walk (files
+    of a directory before its subdirectories)"""
+    return filepath[:-1], filepath[-1]
+
+
+def entry_key(entry):
+    return filepath_key(entry["filepath"])
+
+
+def read_header(file):
+    """Read the header of a snapshot file (`{}` for older versions)"""
+    header = pickle.load(file)
+    return {} if "cache_data" in header else header
+
+
+def iter_entries(file):
+    """Yield the entries of a snapshot file after its header"""
+    while True:
+        obj = pickle.load(file)
+        if isinstance(obj, dict):
+            return
+        if isinstance(obj, list):
+            yield from obj
+
+
+def load_snapshot(file, header=None):
+    """Read an open snapshot file as a dictionary (`cache_data`, `folders`,
+    `update_time`, `generation`). `header` is the first pickle if it was
+    already read. Raises `EOFError` if the snapshot is incomplete."""
+    if header is None:
+        header = pickle.load(file)
+    if "cache_data" in header:
+        # Snapshot pickled at once by older versions
+        return header
+    cache_data = []
+    folders = {}
+    while True:
+        obj = pickle.load(file)
+        if isinstance(obj, dict):
+            # Footer
+            return {"cache_data": cache_data, "folders": folders, **obj}
+        if isinstance(obj, tuple):
+            for folder, aggregates in obj:
+                if folder in folders:
+                    merge_folder_aggregates(folders[folder], aggregates)
+                else:
+                    folders[folder] = aggregates
+        else:
+            cache_data.extend(obj)
+
+
+def read_snapshot(path):
+    """Read a snapshot file (see `load_snapshot`)"""
+    with open(path, "rb") as file:
+        return load_snapshot(file)
+
+
+def load_delta(file):
+    """Read an open delta file as a dictionary (`added`, `removed`,
+    `modified`, `folders`, `update_time`, `generation`,
+    `base_generation`)"""
+    delta = pickle.load(file)
+    if "added" in delta:
+        # Delta pickled at once by older versions
+        return delta
+    delta.update(added=[], removed=[], modified=[], folders={})
+    while True:
+        obj = pickle.load(file)
+        for key in ("added", "removed", "modified"):
+            delta[key].extend(obj.get(key, ()))
+        delta["folders"].update(obj.get("folders", {}))
+        if "update_time" in obj:
+            # Footer
+            delta["update_time"] = obj["update_time"]
+            return delta
+
+
+def read_delta(path):
+    """Read a delta file (see `load_delta`)"""
+    with open(path, "rb") as file:
+        return load_delta(file)
+
+
+def new_folder_aggregates():
+    """Return the aggregates of an empty folder"""
+    return {"num_files": 0, "size": 0, "dateModified": None, "num_offline": 0}
+
+
+def merge_folder_aggregates(aggregates, other):
+    """Add the aggregates `other` to `aggregates`"""
+    aggregates["num_files"] += other["num_files"]
+    aggregates["size"] += other["size"]
+    aggregates["num_offline"] += other["num_offline"]
+    if other["dateModified"] is not None and (
+        aggregates["dateModified"] is None
+        or other["dateModified"] > aggregates["dateModified"]
+    ):
+        aggregates["dateModified"] = other["dateModified"]
+
+
+def partition_of(filepath):
+    """Return the partition of a file path (its top-level folder below the
+    drive directory, or "" for the files in the drive directory)"""
+    return filepath[2] if len(filepath) > 3 else ""
+
+
+def partition_file(name):
+    """Return the snapshot file name of a partition. Dots are quoted, so
+    that the generations of a partition (`name.5.pkl`) never match the
+    file names of other partitions."""
+    if not name:
+        return ROOT_PARTITION_STEM + ".pkl"
+    return quote(name, safe="").replace(".", "%2E") + ".pkl"
+
+
+def read_manifest(directory):
+    """Read the manifest of a partitioned snapshot"""
+    try:
+        with open(Path(directory) / MANIFEST_FILE, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"generation": 0, "update_time": None, "partitions": {}}
+
+
+def write_manifest(directory, manifest):
+    """Atomically publish the manifest of a partitioned snapshot"""
+    path = Path(directory) / MANIFEST_FILE
+    tmp_path = path.with_name(path.name + ".part")
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(tmp_path, path)
@@ -1,3 +1,4 @@
+import itertools
 import os
 from datetime import datetime
 from pathlib import Path
@@ -9,11 +10,14 @@ from dotenv import load_dotenv
 from dashboard.gitlab import DVCRepoAPI, RequestRepoAPI
 
 issue_template_dir = Path(__file__).parents[0] / "data"
+# GitLab note ids increase with the creation of the notes
+note_ids = itertools.count(1)
 
 
 def mock_comment(comment_text):
     """Creates a mock issue comment."""
     return MagicMock(
+        id=next(note_ids),
         body=comment_text,
         created_at=datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
     )
@@ -161,14 +165,22 @@ def mock_gitlab_project():
         return mock_issues_by_iid.get(iid)
 
     def issue_list_side_effect_by_state(
-        state=None, per_page=1, search=None, get_all=True, page=1
+        state=None, per_page=1, search=None, get_all=True, page=1, iids=None
     ):
         return [
             issue
             for issue in mock_issues_by_iid.values()
             if issue.state == (state or "closed")
+            and (iids is None or issue.iid in iids)
         ]
 
+    def issues_statistics_side_effect(search=None):
+        counts = {"opened": 0, "closed": 0}
+        for issue in mock_issues_by_iid.values():
+            counts[issue.state] += 1
+        counts["all"] = counts["opened"] + counts["closed"]
+        return MagicMock(statistics={"counts": counts})
+
     # Store project files
     for path, text in issue_templates.items():
         mock_file = MagicMock()
@@ -194,6 +206,9 @@ def mock_gitlab_project():
     # Assign side effects
     mock_project.issues.get.side_effect = issue_side_effect
     mock_project.issues.list.side_effect = issue_list_side_effect_by_state
+    mock_project.issues_statistics.get.side_effect = (
+        issues_statistics_side_effect
+    )
     mock_project.users.list.return_value = mock_user_list
     mock_project.files.get.side_effect = files_side_effect
     mock_project.repository_tree.side_effect = repository_tree_side_effect
@@ -243,6 +258,7 @@ def patch_read_cached_issue_data(monkeypatch):
                 "finished_jobs": 0,
                 "results_path": "Result path is not found!",
                 "comments": [],
+                "note_ids": [],
                 "comment_authors": [],
                 "dates": [],
                 "pipe_state": "run",
@@ -257,6 +273,7 @@ def patch_read_cached_issue_data(monkeypatch):
                 "finished_jobs": 2,
                 "results_path": "Result path is not found!",
                 "comments": [],
+                "note_ids": [],
                 "comment_authors": [],
                 "dates": [],
                 "pipe_state": "run",
@@ -281,3 +298,15 @@ def patch_write_cached_issue_data(monkeypatch):
     monkeypatch.setattr(
         request_repo, "write_cached_issue_data", mock_write_cached_issue_data
     )
+
+
+@pytest.fixture(autouse=True)
+def shared_cache(monkeypatch, tmp_path):
+    """Creates an empty shared cache in a temporary directory"""
+    from dashboard.cache import get_cache
+
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("CACHE_REDIS_URL", raising=False)
+    get_cache.cache_clear()
+    yield get_cache()
+    get_cache.cache_clear()
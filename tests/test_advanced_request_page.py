@@ -14,7 +14,6 @@ from dashboard.pages.page_advanced import (
     collect_advanced_pipeline_params,
     fetch_and_show_unet_models,
     gating_options_section,
-    toggle_advanced_create_pipeline_button,
     toggle_and_cache_params,
 )
 
@@ -163,15 +162,6 @@ def test_show_and_cache_unet_model_meta_callback():
                         "size_thresh_mask": 0,
                     },
                 },
-                "advance_unet_toggle": {"display": "block"},
-                "legacy_toggle": {"display": "block"},
-                "thresh_toggle": {"display": "block"},
-                "water_toggle": {"display": "block"},
-                "std_toggle": {"display": "block"},
-                "romed_toggle": {"display": "block"},
-                "spmed_toggle": {"display": "block"},
-                "ngate_toggle": {"display": "block"},
-                "advance_nframe_toggle": {"display": "block"},
             },
         ),
         (
@@ -244,15 +234,6 @@ def test_show_and_cache_unet_model_meta_callback():
                         "offset_correction": True,
                     },
                 },
-                "advance_unet_toggle": {"display": "none"},
-                "legacy_toggle": {"display": "none"},
-                "thresh_toggle": {"display": "none"},
-                "water_toggle": {"display": "none"},
-                "std_toggle": {"display": "none"},
-                "romed_toggle": {"display": "none"},
-                "spmed_toggle": {"display": "block"},  # only spasremed is open
-                "ngate_toggle": {"display": "none"},
-                "advance_nframe_toggle": {"display": "none"},
             },
         ),
     ],
@@ -261,7 +242,7 @@ def test_toggle_and_cache_params_callback(callback_function, args, expected):
     """Test togglable options expansion, contraction, and caching user
     selected parameters when a user clicks on respective switches switchs."""
     response = callback_function(**args)
-    assert response[0] == expected["cache_advance_params"]
+    assert response == expected["cache_advance_params"]
 
 
 @pytest.mark.parametrize(
@@ -342,52 +323,6 @@ def test_advanced_request_submission_popup_callback(
     assert response == expected["advance_popup"]
 
 
-@pytest.mark.parametrize(
-    "callback_function, args, expected",
-    [
-        (
-            # Test case 1: enable the 'create pipleine button' when all the
-            # required entries are given (author name, title, input file/s,
-            # and any segmentation method)
-            toggle_advanced_create_pipeline_button,
-            # Inputs:
-            {
-                "author_name": "test_username",
-                "title": "test_title",
-                "selected_rows": [{"filepath": "test1.rtdc"}],
-                "cached_params": {
-                    "mlunet: UNET": {"model_file": "test_checkpoint"}
-                },
-            },
-            # Expected Outputs:
-            {"create_advanced_pipeline_button": False},
-        ),
-        (
-            # Test case 2: disable the 'create pipleine button', if any of the
-            # required entries are missing.
-            toggle_advanced_create_pipeline_button,
-            # Inputs:
-            {
-                "author_name": "test_username",
-                "title": "",  # No title is given
-                "selected_rows": [{"filepath": "test1.rtdc"}],
-                "cached_params": {
-                    "mlunet: UNET": {"model_file": "test_checkpoint"}
-                },
-            },
-            # Expected Outputs:
-            {"create_advanced_pipeline_button": True},
-        ),
-    ],
-)
-def test_toggle_advanced_create_pipeline_button_callback(
-    callback_function, args, expected
-):
-    """Test create_pipeline_button activation and deactivation."""
-    response = callback_function(**args)
-    assert response == expected["create_advanced_pipeline_button"]
-
-
 @pytest.mark.parametrize(
     "callback_function, args, expected",
     [
@@ -434,7 +369,7 @@ def test_toggle_advanced_create_pipeline_button_callback(
             - [ ] diff_method=1\n
             - [ ] clear_border=True\n
             - [ ] fill_holes=True\n
-            - [ ] closing_disk=5\n
+            - [ ] closing_disk=0\n
         - [ ] thresh: thresholding segmentation\n
             - [ ] clear_border=True\n
             - [ ] closing_disk=2\n
@@ -443,11 +378,11 @@ def test_toggle_advanced_create_pipeline_button_callback(
         - [ ] watershed: Watershed algorithm\n
             - [ ] clear_border=True\n
             - [ ] fill_holes=True\n
-            - [ ] closing_disk=5\n
+            - [ ] closing_disk=0\n
         - [ ] std: Standard-deviation-based thresholding\n
             - [ ] clear_border=True\n
             - [ ] fill_holes=True\n
-            - [ ] closing_disk=5\n
+            - [ ] closing_disk=0\n
     - Background Correction/Subtraction Method\n
         - [ ] rollmed: Rolling median RT-DC background image computation\n
             - [ ] kernel_size=100\n
@@ -457,6 +392,7 @@ def test_toggle_advanced_create_pipeline_button_callback(
             - [x] split_time=1\n
             - [x] thresh_cleansing=0\n
             - [x] frac_cleansing=0.8\n
+            - [x] offset_correction=True\n
     - Available gating options\n
         - [x] norm gating\n
         - [x] online_gates=False\n
@@ -549,7 +485,7 @@ def test_toggle_advanced_create_pipeline_button_callback(
             - [ ] diff_method=1\n
             - [ ] clear_border=True\n
             - [ ] fill_holes=True\n
-            - [ ] closing_disk=5\n
+            - [ ] closing_disk=0\n
         - [ ] thresh: thresholding segmentation\n
             - [ ] clear_border=True\n
             - [ ] closing_disk=2\n
@@ -558,11 +494,11 @@ def test_toggle_advanced_create_pipeline_button_callback(
         - [ ] watershed: Watershed algorithm\n
             - [ ] clear_border=True\n
             - [ ] fill_holes=True\n
-            - [ ] closing_disk=5\n
+            - [ ] closing_disk=0\n
         - [ ] std: Standard-deviation-based thresholding\n
             - [ ] clear_border=True\n
             - [ ] fill_holes=True\n
-            - [ ] closing_disk=5\n
+            - [ ] closing_disk=0\n
     - Background Correction/Subtraction Method\n
         - [ ] rollmed: Rolling median RT-DC background image computation\n
             - [ ] kernel_size=100\n
@@ -572,6 +508,7 @@ def test_toggle_advanced_create_pipeline_button_callback(
             - [x] split_time=1\n
             - [x] thresh_cleansing=0\n
             - [x] frac_cleansing=0.8\n
+            - [x] offset_correction=True\n
     - Available gating options\n
         - [x] norm gating\n
         - [x] online_gates=False\n
@@ -1,9 +1,29 @@
+import os
 import pickle
+import shutil
+import sys
 import tempfile
+import threading
+import time
 
 from pathlib import Path
 
-from cache_handler import DriveFileScanner
+import pytest
+
+from cache_handler import (
+    DriveFileScanner,
+    DriveWatcher,
+    MetadataExtractor,
+    SnapshotWriter,
+    merge_changes,
+    profile_scan,
+)
+from hsm_snapshot import (
+    partition_file,
+    read_delta,
+    read_manifest,
+    read_snapshot,
+)
 
 from .helper_methods import retrieve_test_drive
 
@@ -18,12 +38,624 @@ def test_drive_scanner():
     hsm_processor = DriveFileScanner(test_drive, temp_path, ".rtdc", "HSMFS")
     hsm_processor.process_drive()
 
-    with open(temp_path, "rb") as file:
-        data_dict = pickle.load(file)
-        assert "cache_data" in data_dict.keys()
-        assert "update_time" in data_dict.keys()
-        cache_data = data_dict["cache_data"]
-        assert len(cache_data) > 1
-        entry = cache_data[0]
-        assert "filepath" in entry.keys()
-        assert "dateModified" in entry.keys()
+    data_dict = read_snapshot(temp_path)
+    assert "cache_data" in data_dict.keys()
+    assert "update_time" in data_dict.keys()
+    cache_data = data_dict["cache_data"]
+    assert len(cache_data) > 1
+    entry = cache_data[0]
+    assert "filepath" in entry.keys()
+    assert "dateModified" in entry.keys()
+    assert isinstance(entry["size"], int)
+    assert isinstance(entry["dateModified"], int)
+
+
+def test_drive_scanner_profile(capsys):
+    """Test the profile mode of the drive scanner"""
+    test_drive = retrieve_test_drive(data_path / "dummy_mounted_drive.zip")
+    temp_dir = Path(tempfile.mkdtemp(prefix=test_drive.name))
+
+    hsm_processor = DriveFileScanner(
+        test_drive, temp_dir / "test.pkl", ".rtdc", "HSMFS"
+    )
+    dump_path = profile_scan(hsm_processor, temp_dir / "profiles")
+
+    assert dump_path.exists()
+    assert (temp_dir / "test.pkl").exists()
+    assert "process_drive" in capsys.readouterr().out
+
+
+def test_profile_scan_partitions(tmp_path):
+    """Test that the scan options are passed to the profiled scan"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("a/M001.rtdc", "b/M002.rtdc"):
+        (drive / name).parent.mkdir(parents=True, exist_ok=True)
+        (drive / name).write_bytes(b"\0" * 1024**2)
+    result_dir = tmp_path / "hsm_partitions"
+    scanner = DriveFileScanner(
+        drive, result_dir, ".rtdc", "HSMFS", partitioned=True
+    )
+    profile_scan(scanner, tmp_path / "profiles", deadline=60, partitions=["a"])
+    assert list(read_manifest(result_dir)["partitions"]) == ["a"]
+
+
+def test_snapshot_writer(tmp_path):
+    """Test that the entries are written in chunks while scanning and that
+    the snapshot is published only when it is finalized"""
+    result_path = tmp_path / "hsm_drive.pkl"
+    # Snapshot of older versions
+    result_path.write_bytes(
+        pickle.dumps({"cache_data": [{"filepath": 0}], "update_time": "1"})
+    )
+    assert read_snapshot(result_path)["cache_data"] == [{"filepath": 0}]
+
+    with SnapshotWriter(result_path, chunk_size=2) as writer:
+        for idx in range(5):
+            writer.add({"filepath": ["H:", "Data", f"{idx}.rtdc"]})
+        # Full chunks are written, the old snapshot is still published
+        assert writer.num_entries == 4
+        assert len(writer.chunk) == 1
+        assert read_snapshot(result_path)["update_time"] == "1"
+        writer.finalize("2")
+
+    assert not writer.part_path.exists()
+    data_dict = read_snapshot(result_path)
+    assert data_dict["update_time"] == "2"
+    assert data_dict["num_entries"] == 5
+    assert data_dict["cache_data"] == [
+        {"filepath": ["H:", "Data", f"{i}.rtdc"]} for i in range(5)
+    ]
+
+
+def test_snapshot_writer_crash(tmp_path):
+    """Test that a crashed scan keeps the written chunks"""
+    result_path = tmp_path / "hsm_drive.pkl"
+    with pytest.raises(OSError):
+        with SnapshotWriter(result_path, chunk_size=2) as writer:
+            for idx in range(3):
+                writer.add({"filepath": ["H:", "Data", f"{idx}.rtdc"]})
+            raise OSError("Mount lost")
+
+    assert not result_path.exists()
+    with open(writer.part_path, "rb") as file:
+        assert pickle.load(file)["format"] == "hsm-snapshot-chunks"
+        assert pickle.load(file) + pickle.load(file) == [
+            {"filepath": ["H:", "Data", f"{i}.rtdc"]} for i in range(3)
+        ]
+    with pytest.raises(EOFError):
+        read_snapshot(writer.part_path)
+
+
+def make_rtdc(path, size=2 * 1024**2):
+    """Create a sparse .rtdc file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as file:
+        file.truncate(size)
+
+
+def test_snapshot_generations(tmp_path):
+    """Test the numbered snapshot generations and the deltas between them"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("a/M001.rtdc", "a/b/M002.rtdc", "c/M003.rtdc"):
+        make_rtdc(drive / name)
+    result_path = tmp_path / "resources" / "hsm_drive.pkl"
+    scanner = DriveFileScanner(drive, result_path, ".rtdc", "HSMFS")
+
+    scanner.process_drive()
+    assert read_snapshot(result_path)["generation"] == 1
+    assert (tmp_path / "resources" / "hsm_drive.1.pkl").exists()
+    # No delta for the first generation
+    assert not (tmp_path / "resources" / "hsm_drive.1.delta.pkl").exists()
+
+    (drive / "a" / "b" / "M002.rtdc").unlink()
+    make_rtdc(drive / "a" / "M000.rtdc")
+    make_rtdc(drive / "c" / "M003.rtdc", size=3 * 1024**2)
+    make_rtdc(drive / "d" / "M004.rtdc")
+    scanner.process_drive()
+
+    snapshot = read_snapshot(result_path)
+    assert snapshot["generation"] == 2
+    assert snapshot["num_entries"] == 4
+    delta = read_delta(tmp_path / "resources" / "hsm_drive.2.delta.pkl")
+    assert delta["base_generation"] == 1
+    assert [e["filepath"][-2:] for e in delta["added"]] == [
+        ["a", "M000.rtdc"],
+        ["d", "M004.rtdc"],
+    ]
+    assert delta["removed"] == [["HSMFS:", "Data", "a", "b", "M002.rtdc"]]
+    assert [e["size"] for e in delta["modified"]] == [3 * 1024**2]
+
+    scanner.process_drive()
+    assert read_snapshot(result_path)["generation"] == 3
+    delta = read_delta(tmp_path / "resources" / "hsm_drive.3.delta.pkl")
+    assert delta["added"] == delta["removed"] == delta["modified"] == []
+    # Old generations are removed
+    assert sorted(p.name for p in result_path.parent.glob("*.pkl")) == [
+        "hsm_drive.2.delta.pkl",
+        "hsm_drive.2.pkl",
+        "hsm_drive.3.delta.pkl",
+        "hsm_drive.3.pkl",
+        "hsm_drive.pkl",
+    ]
+
+
+def wait_for_generation(result_path, generation, timeout=10):
+    """Wait until a snapshot generation is published and return it"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if result_path.exists():
+            snapshot = read_snapshot(result_path)
+            if snapshot["generation"] >= generation:
+                return snapshot
+        time.sleep(0.05)
+    raise TimeoutError(f"Generation {generation} not published")
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux only")
+def test_drive_watcher(tmp_path):
+    """Test that the watch mode publishes the changed files without
+    rescanning the drive"""
+    drive = tmp_path / "HSMFS" / "Data"
+    make_rtdc(drive / "a" / "M001.rtdc")
+    make_rtdc(drive / "b" / "M002.rtdc")
+    result_path = tmp_path / "hsm_drive.pkl"
+    scanner = DriveFileScanner(drive, result_path, ".rtdc", "HSMFS")
+    watcher = DriveWatcher(scanner, batch_delay=0.1)
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop_event,))
+    thread.start()
+    try:
+        assert wait_for_generation(result_path, 1)["num_entries"] == 2
+
+        make_rtdc(drive / "a" / "M003.rtdc")
+        (drive / "b" / "M002.rtdc").unlink()
+        make_rtdc(drive / "c" / "d" / "M004.rtdc")
+        shutil.rmtree(drive / "c")
+        make_rtdc(drive / "e" / "f" / "M005.rtdc")
+        # Small files are ignored
+        make_rtdc(drive / "a" / "small.rtdc", size=10)
+
+        snapshot = wait_for_generation(result_path, 2)
+        while snapshot["num_entries"] != 3:
+            snapshot = wait_for_generation(
+                result_path, snapshot["generation"] + 1
+            )
+        assert [e["filepath"][2:] for e in snapshot["cache_data"]] == [
+            ["a", "M001.rtdc"],
+            ["a", "M003.rtdc"],
+            ["e", "f", "M005.rtdc"],
+        ]
+    finally:
+        stop_event.set()
+        thread.join()
+
+
+def test_drive_watcher_single_walk(monkeypatch, tmp_path):
+    """Test that the directories are watched during the rescan, without
+    walking the drive again"""
+    drive = tmp_path / "HSMFS" / "Data"
+    make_rtdc(drive / "a" / "b" / "M001.rtdc")
+    make_rtdc(drive / "c" / "M002.rtdc")
+    scanner = DriveFileScanner(
+        drive, tmp_path / "hsm_drive.pkl", ".rtdc", "HSMFS"
+    )
+    watcher = DriveWatcher(scanner)
+    listed = []
+    scandir = os.scandir
+
+    def mock_scandir(path):
+        if str(drive) in str(path):
+            listed.append(str(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", mock_scandir)
+    watcher.reconcile()
+    watcher.inotify.close()
+    directories = [drive, drive / "a", drive / "a" / "b", drive / "c"]
+    assert sorted(listed) == [str(path) for path in directories]
+    assert sorted(watcher.inotify.paths.values()) == sorted(listed)
+    assert scanner.on_directory is None
+
+
+def test_merge_changes():
+    """Test merging the sorted entries of a snapshot with changes"""
+    entries = [
+        {"filepath": ["H:", "Data", "a", "1.rtdc"]},
+        {"filepath": ["H:", "Data", "a", "b", "2.rtdc"]},
+        {"filepath": ["H:", "Data", "c", "3.rtdc"]},
+        {"filepath": ["H:", "Data", "d", "4.rtdc"]},
+    ]
+    changes = {
+        ("H:", "Data", "a", "0.rtdc"): {"filepath": ["H:", "Data", "a", "0"]},
+        ("H:", "Data", "a", "1.rtdc"): None,
+        ("H:", "Data", "c", "3.rtdc"): {"size": 2},
+        ("H:", "Data", "e", "5.rtdc"): {"size": 5},
+    }
+    merged = list(merge_changes(entries, changes, [["H:", "Data", "a", "b"]]))
+    assert merged == [
+        {"filepath": ["H:", "Data", "a", "0"]},
+        {"size": 2},
+        {"filepath": ["H:", "Data", "d", "4.rtdc"]},
+        {"size": 5},
+    ]
+
+
+def test_drive_scanner_resume(tmp_path, capsys):
+    """Test that an interrupted scan resumes from its checkpoint"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("a/M1.rtdc", "a/b/M2.rtdc", "c/M3.rtdc", "d/M4.rtdc"):
+        make_rtdc(drive / name)
+    result_path = tmp_path / "hsm_drive.pkl"
+    scanner = DriveFileScanner(
+        drive,
+        result_path,
+        ".rtdc",
+        "HSMFS",
+        chunk_size=1,
+        checkpoint_interval=0,
+    )
+    scanner.process_drive()
+
+    make_rtdc(drive / "a" / "b" / "M0.rtdc")
+    (drive / "c" / "M3.rtdc").unlink()
+    make_rtdc(drive / "e" / "M5.rtdc")
+    file_entry = scanner.file_entry
+    scanned = []
+
+    def failing_file_entry(fpath):
+        if len(scanned) == 3:
+            raise OSError("Mount lost")
+        scanned.append(Path(fpath).name)
+        return file_entry(fpath)
+
+    scanner.file_entry = failing_file_entry
+    with pytest.raises(OSError):
+        scanner.process_drive()
+    assert scanned == ["M1.rtdc", "M0.rtdc", "M2.rtdc"]
+    assert read_snapshot(result_path)["generation"] == 1
+
+    scanned.clear()
+    scanner.process_drive()
+    assert "Resuming the scan after 3 entries" in capsys.readouterr().out
+    # Only the files after the checkpoint are scanned again
+    assert scanned == ["M4.rtdc", "M5.rtdc"]
+    snapshot = read_snapshot(result_path)
+    assert snapshot["generation"] == 2
+    assert [e["filepath"][-1] for e in snapshot["cache_data"]] == [
+        "M1.rtdc",
+        "M0.rtdc",
+        "M2.rtdc",
+        "M4.rtdc",
+        "M5.rtdc",
+    ]
+    delta = read_delta(tmp_path / "hsm_drive.2.delta.pkl")
+    assert [e["filepath"][-1] for e in delta["added"]] == [
+        "M0.rtdc",
+        "M5.rtdc",
+    ]
+    assert [e[-1] for e in delta["removed"]] == ["M3.rtdc"]
+    assert not (tmp_path / "hsm_drive.pkl.checkpoint").exists()
+
+
+def test_drive_scanner_deadline(tmp_path, capsys):
+    """Test that a partial snapshot is published when the deadline is hit
+    and that the next scan continues after the scanned files"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("a/M1.rtdc", "b/M2.rtdc", "c/M3.rtdc"):
+        make_rtdc(drive / name)
+    result_path = tmp_path / "hsm_drive.pkl"
+    scanner = DriveFileScanner(drive, result_path, ".rtdc", "HSMFS")
+    scanner.process_drive()
+
+    make_rtdc(drive / "a" / "M0.rtdc")
+    make_rtdc(drive / "c" / "M4.rtdc")
+    file_entry = scanner.file_entry
+    scanned = []
+
+    def slow_file_entry(fpath):
+        scanned.append(Path(fpath).name)
+        time.sleep(0.2)
+        return file_entry(fpath)
+
+    scanner.file_entry = slow_file_entry
+    # Stops after the first directory
+    scanner.process_drive(deadline=0.1)
+    assert "partial snapshot published" in capsys.readouterr().out
+    assert scanned == ["M0.rtdc", "M1.rtdc"]
+    snapshot = read_snapshot(result_path)
+    assert snapshot["partial"]
+    # Scanned files and the files of the previous generation after them
+    assert [e["filepath"][-1] for e in snapshot["cache_data"]] == [
+        "M0.rtdc",
+        "M1.rtdc",
+        "M2.rtdc",
+        "M3.rtdc",
+    ]
+
+    scanned.clear()
+    scanner.process_drive()
+    assert scanned == ["M2.rtdc", "M3.rtdc", "M4.rtdc"]
+    snapshot = read_snapshot(result_path)
+    assert not snapshot["partial"]
+    assert snapshot["generation"] == 3
+    assert len(snapshot["cache_data"]) == 5
+    delta = read_delta(tmp_path / "hsm_drive.3.delta.pkl")
+    assert [e["filepath"][-1] for e in delta["added"]] == ["M4.rtdc"]
+
+
+def test_drive_scanner_residency(tmp_path):
+    """Test the offline detection of files that are migrated to tape"""
+    drive = tmp_path / "HSMFS" / "Data"
+    # Sparse file like the stub of a migrated file
+    make_rtdc(drive / "M001_offline.rtdc")
+    (drive / "M002_online.rtdc").write_bytes(b"\1" * 1024**2)
+    scanner = DriveFileScanner(
+        drive, tmp_path / "hsm_drive.pkl", ".rtdc", "HSMFS"
+    )
+    scanner.process_drive()
+    cache_data = read_snapshot(tmp_path / "hsm_drive.pkl")["cache_data"]
+    assert [e["offline"] for e in cache_data] == [True, False]
+
+
+def make_rtdc_with_metadata(path, event_count):
+    """Create a .rtdc (HDF5) file with metadata attributes and events"""
+    h5py = pytest.importorskip("h5py")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with h5py.File(path, "w") as h5:
+        h5.attrs["experiment:event count"] = event_count
+        h5.attrs["setup:chip region"] = "channel"
+        h5.attrs["setup:flow rate"] = 0.16
+        h5.attrs["setup:identifier"] = "RTDC.001"
+        h5["events/time"] = [0.0, 1.5, 12.5]
+        # Larger than the minimum file size
+        h5["events/image"] = bytearray(1024**2)
+
+
+def test_drive_scanner_metadata(tmp_path):
+    """Test the extraction and caching of the .rtdc metadata"""
+    drive = tmp_path / "HSMFS" / "Data"
+    make_rtdc_with_metadata(drive / "M001.rtdc", 3)
+    (drive / "M002.rtdc").write_bytes(b"\1" * 1024**2)
+    make_rtdc(drive / "M003_offline.rtdc")
+    result_path = tmp_path / "hsm_drive.pkl"
+    cache_path = tmp_path / "metadata.sqlite"
+    scanner = DriveFileScanner(
+        drive, result_path, ".rtdc", "HSMFS", metadata_cache=cache_path
+    )
+    scanner.process_drive()
+
+    cache_data = read_snapshot(result_path)["cache_data"]
+    assert cache_data[0]["metadata"] == {
+        "event_count": 3,
+        "region": "channel",
+        "flow_rate": 0.16,
+        "setup": "RTDC.001",
+        "duration": 12.5,
+    }
+    # Not a HDF5 file
+    assert cache_data[1]["metadata"] == {}
+    # Offline files are not read
+    assert "metadata" not in cache_data[2]
+
+    # Same inode, size, and mtime: the metadata is taken from the cache
+    stat = (drive / "M001.rtdc").stat()
+    make_rtdc_with_metadata(drive / "M001.rtdc", 7)
+    os.truncate(drive / "M001.rtdc", stat.st_size)
+    os.utime(drive / "M001.rtdc", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    scanner.process_drive()
+    snapshot = read_snapshot(result_path)
+    assert snapshot["cache_data"][0]["metadata"]["event_count"] == 3
+
+    # Changed file
+    make_rtdc_with_metadata(drive / "M001.rtdc", 7)
+    os.utime(drive / "M001.rtdc", (1, 1))
+    scanner.process_drive()
+    snapshot = read_snapshot(result_path)
+    assert snapshot["cache_data"][0]["metadata"]["event_count"] == 7
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+def test_metadata_timeout(tmp_path, capsys):
+    """Test that a file that hangs is given up after its own deadline and
+    that the files after it are read by a new pool"""
+    make_rtdc_with_metadata(tmp_path / "M002.rtdc", 5)
+    make_rtdc_with_metadata(tmp_path / "M003.rtdc", 6)
+    # Opening a named pipe without writer blocks
+    os.mkfifo(tmp_path / "M001.rtdc")
+    entries = []
+    with MetadataExtractor(
+        tmp_path / "metadata.sqlite",
+        entries.append,
+        tmp_path,
+        workers=1,
+        timeout=1,
+    ) as extractor:
+        for idx, name in enumerate(("M001.rtdc", "M002.rtdc", "M003.rtdc")):
+            extractor.add(
+                {
+                    "filepath": ["HSMFS:", "Data", name],
+                    "inode": idx,
+                    "size": 1,
+                    "dateModified": 1,
+                }
+            )
+    assert "Metadata timeout: HSMFS:/Data/M001.rtdc" in capsys.readouterr().out
+    assert [e["metadata"].get("event_count") for e in entries] == [
+        None,
+        5,
+        6,
+    ]
+
+
+def test_drive_scanner_partitions(tmp_path, capsys):
+    """Test the snapshots of the top-level folders of a drive"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("M0.rtdc", "a/M1.rtdc", "a/b/M2.rtdc", "c.d/M3.rtdc"):
+        make_rtdc(drive / name)
+    (drive / "c").mkdir()
+    result_dir = tmp_path / "hsm_partitions"
+    scanner = DriveFileScanner(
+        drive, result_dir, ".rtdc", "HSMFS", partitioned=True
+    )
+    scanner.process_drive()
+
+    manifest = read_manifest(result_dir)
+    assert sorted(manifest["partitions"]) == ["", "a", "c", "c.d"]
+    assert manifest["partitions"]["a"]["num_entries"] == 2
+    assert manifest["partitions"]["a"]["total_size"] == 4 * 1024**2
+    assert manifest["partitions"]["c"]["num_entries"] == 0
+    assert manifest["partitions"]["a"]["folder"]["num_files"] == 2
+    assert manifest["partitions"]["c"]["folder"]["dateModified"] is None
+    assert partition_file("c.d") == "c%2Ed.pkl"
+    root = read_snapshot(result_dir / partition_file(""))
+    assert [e["filepath"][-1] for e in root["cache_data"]] == ["M0.rtdc"]
+    snapshot = read_snapshot(result_dir / "a.pkl")
+    assert [e["filepath"][-1] for e in snapshot["cache_data"]] == [
+        "M1.rtdc",
+        "M2.rtdc",
+    ]
+
+    # Rescan of a single partition
+    make_rtdc(drive / "c" / "M4.rtdc")
+    make_rtdc(drive / "a" / "M5.rtdc")
+    scanner.process_drive(partitions=["c"])
+    manifest = read_manifest(result_dir)
+    assert manifest["partitions"]["c"]["generation"] == 2
+    assert manifest["partitions"]["c"]["num_entries"] == 1
+    assert manifest["partitions"]["a"]["generation"] == 1
+    assert manifest["partitions"]["a"]["num_entries"] == 2
+
+    # Stopped scan: the partitions scanned least recently come first
+    scanner.process_drive(deadline=0)
+    assert "partial snapshot" in capsys.readouterr().out
+    scanner.process_drive()
+    manifest = read_manifest(result_dir)
+    assert manifest["partitions"]["a"]["num_entries"] == 3
+    assert not any(info["partial"] for info in manifest["partitions"].values())
+
+    # Changes of single files and removed folders
+    shutil.rmtree(drive / "c.d")
+    new_file = str(drive / "c" / "M6.rtdc")
+    make_rtdc(Path(new_file))
+    filepath = tuple(scanner.filepath_list(new_file))
+    scanner.apply_changes(
+        {filepath: scanner.file_entry(new_file)},
+        [scanner.filepath_list(str(drive / "c.d"))],
+    )
+    manifest = read_manifest(result_dir)
+    assert sorted(manifest["partitions"]) == ["", "a", "c"]
+    assert manifest["partitions"]["c"]["num_entries"] == 2
+    assert not list(result_dir.glob("c%2Ed.*"))
+    snapshot = read_snapshot(result_dir / "c.pkl")
+    assert snapshot["cache_data"][-1]["filepath"] == list(filepath)
+
+
+def test_folder_aggregates(tmp_path):
+    """Test the aggregates of the folders computed by the scanner"""
+    drive = tmp_path / "HSMFS" / "Data"
+    make_rtdc(drive / "a" / "M1.rtdc", size=3 * 1024**2)
+    make_rtdc(drive / "a" / "b" / "M2.rtdc")
+    (drive / "c").mkdir()
+    (drive / "c" / "M3.rtdc").write_bytes(b"\1" * 1024**2)
+    os.utime(drive / "c" / "M3.rtdc", (1000, 1000))
+    result_path = tmp_path / "hsm_drive.pkl"
+    scanner = DriveFileScanner(drive, result_path, ".rtdc", "HSMFS")
+    scanner.process_drive()
+
+    folders = read_snapshot(result_path)["folders"]
+    assert folders[("HSMFS:", "Data", "a")] == {
+        "num_files": 2,
+        "size": 5 * 1024**2,
+        "dateModified": int((drive / "a" / "b" / "M2.rtdc").stat().st_mtime),
+        "num_offline": 2,
+    }
+    assert folders[("HSMFS:", "Data", "a", "b")]["num_files"] == 1
+    assert folders[("HSMFS:", "Data", "c")] == {
+        "num_files": 1,
+        "size": 1024**2,
+        "dateModified": 1000,
+        "num_offline": 0,
+    }
+    assert folders[("HSMFS:",)] == folders[("HSMFS:", "Data")]
+    assert folders[("HSMFS:", "Data")]["num_files"] == 3
+
+    # The delta contains the aggregates of the changed folders
+    (drive / "a" / "b" / "M2.rtdc").unlink()
+    scanner.process_drive()
+    delta = read_delta(tmp_path / "hsm_drive.2.delta.pkl")
+    assert delta["folders"] == {
+        ("HSMFS:",): read_snapshot(result_path)["folders"][("HSMFS:",)],
+        ("HSMFS:", "Data"): {
+            "num_files": 2,
+            "size": 4 * 1024**2,
+            "dateModified": int((drive / "a" / "M1.rtdc").stat().st_mtime),
+            "num_offline": 1,
+        },
+        ("HSMFS:", "Data", "a"): {
+            "num_files": 1,
+            "size": 3 * 1024**2,
+            "dateModified": int((drive / "a" / "M1.rtdc").stat().st_mtime),
+            "num_offline": 1,
+        },
+        ("HSMFS:", "Data", "a", "b"): None,
+    }
+
+
+def test_streamed_folder_aggregates(tmp_path):
+    """Test that only the aggregates of the folders of the current entry
+    are kept while writing and that the others are written with the
+    chunks"""
+    result_path = tmp_path / "hsm_drive.pkl"
+    with SnapshotWriter(result_path, chunk_size=2, resume=True) as writer:
+        for folder in ("a", "b", "c"):
+            for idx in range(2):
+                writer.add({"filepath": ["H:", "Data", folder, f"{idx}.rtdc"]})
+                assert [f for f, _ in writer.open_folders] == [
+                    ("H:",),
+                    ("H:", "Data"),
+                    ("H:", "Data", folder),
+                ]
+        writer.save_checkpoint()
+        assert "folders" not in writer.read_checkpoint()
+        writer.finalize("1")
+    folders = read_snapshot(result_path)["folders"]
+    assert folders[("H:", "Data")]["num_files"] == 6
+    assert folders[("H:", "Data", "b")]["num_files"] == 2
+
+    # Unsorted entries leave and enter a folder again
+    with SnapshotWriter(result_path, chunk_size=2) as writer:
+        for folder in ("b", "a", "b"):
+            writer.add({"filepath": ["H:", "Data", folder, "0.rtdc"]})
+        writer.finalize("2")
+    folders = read_snapshot(result_path)["folders"]
+    assert folders[("H:", "Data", "a")]["num_files"] == 1
+    assert folders[("H:", "Data", "b")]["num_files"] == 2
+
+
+def test_delta_written_per_chunk(tmp_path):
+    """Test that the changes are written to the delta with every chunk"""
+    result_path = tmp_path / "hsm_drive.pkl"
+    with SnapshotWriter(result_path, chunk_size=2) as writer:
+        for idx in range(6):
+            writer.add({"filepath": ["H:", "Data", f"{idx}", "M.rtdc"]})
+        writer.finalize("1")
+
+    with SnapshotWriter(result_path, chunk_size=2) as writer:
+        for idx in range(1, 7):
+            writer.add(
+                {"filepath": ["H:", "Data", f"{idx}", "M.rtdc"], "size": 1}
+            )
+            # At most a chunk of changes is kept in memory
+            assert len(writer.delta["modified"]) < 2
+        assert writer.delta_part_path.stat().st_size > 0
+        writer.finalize("2")
+
+    delta = read_delta(writer.delta_path)
+    assert delta["update_time"] == "2"
+    assert delta["base_generation"] == 1
+    assert delta["removed"] == [["H:", "Data", "0", "M.rtdc"]]
+    assert len(delta["modified"]) == 5
+    assert [e["filepath"][2] for e in delta["added"]] == ["6"]
+    assert delta["folders"][("H:", "Data", "0")] is None
+    assert delta["folders"][("H:", "Data")]["num_files"] == 6
+    assert not writer.delta_part_path.exists()
@@ -0,0 +1,70 @@
+import json
+
+import gitlab
+import pytest
+
+from benchmarks.fake_gitlab import FakeGitLab, FakeGitLabData
+from dashboard.gitlab import DVCRepoAPI, RequestRepoAPI
+from dashboard.gitlab import cassette
+
+
+@pytest.fixture
+def cassette_env(monkeypatch, tmp_path):
+    """Use the real GitLab client with a cassette in a temporary file"""
+    monkeypatch.setattr(gitlab, "Gitlab", gitlab.client.Gitlab)
+    path = tmp_path / "gitlab.jsonl"
+    monkeypatch.setenv("GITLAB_CASSETTE", str(path))
+    cassette.get_recorder.cache_clear()
+    cassette.get_replay_adapter.cache_clear()
+    yield monkeypatch, path
+    cassette.get_recorder.cache_clear()
+    cassette.get_replay_adapter.cache_clear()
+
+
+def fetch_workload(url):
+    request_repo = RequestRepoAPI(url, "secret-token", 1)
+    dvc_repo = DVCRepoAPI(url, "secret-token", 2)
+    return (
+        request_repo.get_issues_page("opened", 1, per_page=5),
+        request_repo.get_processed_issue_notes(3),
+        dvc_repo.get_model_metadata(),
+    )
+
+
+def test_record_and_replay(cassette_env):
+    """Test that the recorded GitLab responses are sanitized and replayed
+    without the GitLab server"""
+    monkeypatch, path = cassette_env
+    monkeypatch.setenv("GITLAB_CASSETTE_MODE", "record")
+    data = FakeGitLabData(num_issues=20, notes_per_issue=6, num_members=25)
+    for member in data.members:
+        member["email"] = f"{member['username']}@mpl.mpg.de"
+    with FakeGitLab(data) as server:
+        recorded = fetch_workload(server.url)
+        url = server.url
+
+    text = path.read_text(encoding="utf-8")
+    assert "secret-token" not in text
+    assert "@mpl.mpg.de" not in text
+    assert url not in text
+    members = [
+        json.loads(line)
+        for line in text.splitlines()
+        if "/users" in json.loads(line)["key"]
+    ]
+    assert all(
+        member["username"].startswith("user_") for member in members[0]["json"]
+    )
+
+    # Replay with the server stopped
+    monkeypatch.setenv("GITLAB_CASSETTE_MODE", "replay")
+    replayed = fetch_workload(url)
+    issues = replayed[0]["issues"]
+    assert [i["iid"] for i in issues] == [
+        i["iid"] for i in recorded[0]["issues"]
+    ]
+    assert replayed[0]["counts"] == recorded[0]["counts"]
+    assert replayed[1]["comments"] == recorded[1]["comments"]
+    assert replayed[2] == recorded[2]
+    # The names of the users are replaced with pseudonyms
+    assert all(i["user"].startswith("User ") for i in issues)
@@ -0,0 +1,218 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from dashboard.app_main import BASENAME_PREFIX, app
+
+CLIENTSIDE_FILE = (
+    Path(__file__).parents[1]
+    / "dashboard"
+    / "assets"
+    / "dashClientsideFunctions.js"
+)
+
+# Loads the clientside functions and prints the JSON result of a call
+NODE_SCRIPT = """
+const window = {};
+eval(require("fs").readFileSync(process.argv[1], "utf8"));
+const args = JSON.parse(process.argv[3]);
+const result = window.dash_clientside.clientside[process.argv[2]](...args);
+console.log(JSON.stringify(result));
+"""
+
+requires_node = pytest.mark.skipif(
+    shutil.which("node") is None, reason="Node.js is not installed"
+)
+
+
+def run_clientside(function_name, *args):
+    """Call a clientside function with Node.js and return its result"""
+    output = subprocess.run(
+        [
+            "node",
+            "-e",
+            NODE_SCRIPT,
+            str(CLIENTSIDE_FILE),
+            function_name,
+            json.dumps(args),
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def dash_dependencies():
+    """Return the callbacks of the app as they are sent to the browser"""
+    client = app.server.test_client()
+    return client.get(f"{BASENAME_PREFIX}_dash-dependencies").json
+
+
+def clientside_callbacks(function_name):
+    """Return the registered callbacks of a clientside function"""
+    return [
+        cb
+        for cb in dash_dependencies()
+        if (cb.get("clientside_function") or {}).get("function_name")
+        == function_name
+    ]
+
+
+def callback_ids(dependencies):
+    return [(dep["id"], dep["property"]) for dep in dependencies]
+
+
+@pytest.mark.parametrize(
+    "function_name, outputs, inputs, state",
+    [
+        (
+            "countSelectedFiles",
+            ["num_files.children"],
+            [("show_grid", "selectedRows")],
+            [],
+        ),
+        (
+            "toggleDcorButton",
+            ["dcor_button.disabled"],
+            [("dcor_drop_down", "value"), ("dcor_text_input", "value")],
+            [],
+        ),
+        (
+            "updateGridFilter",
+            ["hsm_grid.dashGridOptions"],
+            [("grid_filter_text", "value")],
+            [("hsm_grid", "dashGridOptions")],
+        ),
+        (
+            "toggleOlderComments",
+            [
+                '{"index":["MATCH"],"type":"pipeline_older_comments"}'
+                ".disabled"
+            ],
+            [('{"index":["MATCH"],"type":"pipeline_live"}', "data")],
+            [],
+        ),
+    ],
+)
+def test_clientside_callback_wiring(function_name, outputs, inputs, state):
+    """Test the ids, inputs, and outputs of the clientside callbacks"""
+    callbacks = clientside_callbacks(function_name)
+    assert [cb["output"] for cb in callbacks] == outputs
+    assert callback_ids(callbacks[0]["inputs"]) == inputs
+    assert callback_ids(callbacks[0]["state"]) == state
+
+
+def test_create_pipeline_button_wiring():
+    """Test that the create pipeline buttons of both request pages are
+    toggled by their inputs"""
+    callbacks = {
+        cb["output"]: callback_ids(cb["inputs"])
+        for cb in clientside_callbacks("toggleCreatePipelineButton")
+    }
+    assert callbacks == {
+        "simple_create_pipeline_click.disabled": [
+            ("title_drop", "value"),
+            ("titel_text", "value"),
+            ("show_grid", "selectedRows"),
+            ("cache_simple_params", "data"),
+        ],
+        "advance_create_pipeline_click.disabled": [
+            ("title_drop", "value"),
+            ("title_text", "value"),
+            ("show_grid", "selectedRows"),
+            ("cache_advance_params", "data"),
+        ],
+    }
+
+
+def test_toggle_options_wiring():
+    """Test that every option style is toggled by its switch"""
+    for cb in clientside_callbacks("toggleOptions"):
+        # One style per switch, in the same order
+        outputs = [
+            output.removesuffix("_toggle.style")
+            for output in cb["output"].strip(".").split("...")
+        ]
+        inputs = [dep["id"].removesuffix("_click") for dep in cb["inputs"]]
+        assert outputs == inputs
+    assert len(clientside_callbacks("toggleOptions")) == 2
+
+
+def test_clientside_functions_defined():
+    """Test that the registered clientside functions are defined in the
+    assets"""
+    source = CLIENTSIDE_FILE.read_text()
+    for cb in dash_dependencies():
+        function = cb.get("clientside_function")
+        if function:
+            assert function["namespace"] == "clientside"
+            assert f"{function['function_name']}: function" in source
+
+
+@requires_node
+@pytest.mark.parametrize(
+    "function_name, args, expected",
+    [
+        ("countSelectedFiles", [[{"filepath": "a"}, {"filepath": "b"}]], 2),
+        ("countSelectedFiles", [None], 0),
+        ("toggleDcorButton", ["circle", "test_identifier"], False),
+        ("toggleDcorButton", ["circle", ""], True),
+        ("toggleDcorButton", [None, "test_identifier"], True),
+        (
+            "updateGridFilter",
+            ["M001", {"pagination": True}],
+            {"pagination": True, "quickFilterText": "M001"},
+        ),
+        (
+            # Enable the create pipeline button when all the required
+            # entries are given (author name, title, input file/s, and any
+            # segmentation method)
+            "toggleCreatePipelineButton",
+            [
+                "test_username",
+                "test_title",
+                [{"filepath": "test1.rtdc"}],
+                {"mlunet: UNET": {"model_file": "test_checkpoint"}},
+            ],
+            False,
+        ),
+        (
+            # Disable the create pipeline button if any of the required
+            # entries are missing
+            "toggleCreatePipelineButton",
+            [
+                "test_username",
+                " ",  # Blank title
+                [{"filepath": "test1.rtdc"}],
+                {"mlunet: UNET": {"model_file": "test_checkpoint"}},
+            ],
+            True,
+        ),
+        (
+            "toggleCreatePipelineButton",
+            ["test_username", "test_title", [], {"mlunet": {}}],
+            True,
+        ),
+        (
+            "toggleCreatePipelineButton",
+            ["test_username", "test_title", [{"filepath": "a"}], {}],
+            True,
+        ),
+        ("toggleOlderComments", [{"has_older_comments": True}], False),
+        ("toggleOlderComments", [{"has_older_comments": False}], True),
+        ("toggleOlderComments", [None], True),
+        (
+            # Only the switched on options are shown
+            "toggleOptions",
+            [["unet"], [], None],
+            [{"display": "block"}, {"display": "none"}, {"display": "none"}],
+        ),
+    ],
+)
+def test_clientside_functions(function_name, args, expected):
+    """Test the results of the clientside functions"""
+    assert run_clientside(function_name, *args) == expected
@@ -0,0 +1,55 @@
+import gitlab
+import pytest
+
+from benchmarks.fake_gitlab import FakeGitLab, FakeGitLabData, RateLimiter
+from dashboard.gitlab import DVCRepoAPI, RequestRepoAPI
+
+
+@pytest.fixture
+def fake_gitlab(monkeypatch):
+    """Run a small fake GitLab server and use the real GitLab client"""
+    monkeypatch.setattr(gitlab, "Gitlab", gitlab.client.Gitlab)
+    data = FakeGitLabData(num_issues=30, notes_per_issue=8, num_members=30)
+    with FakeGitLab(data, latency={"default": 0.001}) as server:
+        yield server
+
+
+def test_request_repo_api(fake_gitlab):
+    """Test that the request repository API runs against the fake server"""
+    request_repo = RequestRepoAPI(fake_gitlab.url, "token", 1)
+    fake_gitlab.reset_stats()
+    page = request_repo.get_issues_page("closed", 1, per_page=5)
+
+    issues = fake_gitlab.data.find_issues(state="closed")
+    assert [issue["iid"] for issue in page["issues"]] == [
+        issue["iid"] for issue in issues[:5]
+    ]
+    assert page["counts"]["closed"] == len(issues)
+    assert page["issues"][0]["pipe_state"] == "finish"
+    assert page["issues"][0]["user"].startswith("User ")
+
+    stats = fake_gitlab.reset_stats()
+    assert stats["issues"] == 1
+    assert stats["statistics"] == 1
+    # The members are fetched for every issue (two pages of members)
+    assert stats["users"] == 10
+
+    request_repo.change_pipeline_status(issues[0]["iid"], "cancel")
+    notes = request_repo.get_processed_issue_notes(issues[0]["iid"])
+    assert notes["pipe_state"] == "cancel"
+
+
+def test_dvc_repo_api(fake_gitlab):
+    """Test that the model metadata is read from the fake repository"""
+    dvc_repo = DVCRepoAPI(fake_gitlab.url, "token", 2)
+    model_meta = dvc_repo.get_model_metadata()
+    assert "model_checkpoint_2.ckp" in model_meta
+    assert fake_gitlab.stats["files"] == 3
+
+
+def test_rate_limiter():
+    """Test that requests beyond the rate limit are rejected"""
+    limiter = RateLimiter(2)
+    assert limiter.acquire()
+    assert limiter.acquire()
+    assert not limiter.acquire()
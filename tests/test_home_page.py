@@ -1,19 +1,41 @@
 from contextvars import copy_context
+from unittest.mock import MagicMock
 
 import dash_mantine_components as dmc
 import pytest
-from dash import no_update
+from dash import Patch, html, no_update
 from dash._callback_context import context_value
 from dash._utils import AttributeDict
+from dash.exceptions import PreventUpdate
 
+from dashboard.gitlab import get_gitlab_instances
+from dashboard.pages.common_components import (
+    CHAT_WINDOW,
+    chat_box,
+    chat_rows,
+)
 from dashboard.pages.page_home import (
-    change_page,
+    create_pipeline_accordion_item,
+    create_pipelines_accordion,
+    load_older_comments,
     manage_pipeline_status,
+    pipeline_snapshot,
+    pipeline_updates,
+    push_pipeline_updates,
+    route_tab_request,
     show_pipeline_data,
-    show_pipeline_number,
     switch_tabs,
 )
 
+# Notes of a pipeline without jobs
+EMPTY_PROGRESS = {
+    "updated_at": "2000-01-01T00:00:00.000000Z",
+    "total_jobs": 0,
+    "finished_jobs": 0,
+    "pipe_state": "run",
+    "progress": 0,
+}
+
 
 @pytest.mark.parametrize(
     "callback_function, args, expected",
@@ -24,129 +46,92 @@ from dashboard.pages.page_home import (
             # Inputs:
             {
                 "active_tab": "opened",
-                "cache_page": {"opened": 1},
+                "page": 1,
                 "search_term": None,
             },
             # Expected Outputs:
             {
-                "opened_content": dmc.Accordion(),
-                "closed_content": no_update,
                 "opened_loading": {"position": "center"},
                 "closed_loading": no_update,
+                "opened_pagination": 1,
+                "closed_pagination": 1,
+                # 5 opened test issues are defined in conftest.py
+                "open_tab_badge": 5,
+                # 1 closed test issues are defined in conftest.py
+                "close_tab_badge": 1,
             },
         ),
         (
-            # Test case 2: enable and return opened tab pages
+            # Test case 2: enable and return closed tab pages
             switch_tabs,
             # Inputs:
             {
                 "active_tab": "closed",
-                "cache_page": {"closed": 1},
-                "search_term": None,
+                "page": 1,
+                "search_term": "username102",
             },
             # Expected Outputs:
             {
-                "opened_content": no_update,
-                "closed_content": dmc.Accordion(),
                 "opened_loading": no_update,
                 "closed_loading": {"position": "center"},
+                "opened_pagination": 1,
+                "closed_pagination": 1,
+                "open_tab_badge": 5,
+                "close_tab_badge": 1,
             },
         ),
     ],
 )
 def test_switch_tabs_callback(callback_function, args, expected):
     """Test switch_tabs with various scenarios"""
-    response = callback_function(**args)
+    progress = []
+    response = callback_function(progress.append, args)
+    # The number of loaded pipelines is shown in both tabs
+    num_issues = 5 if args["active_tab"] == "opened" else 1
+    assert progress[-1] == (f"{num_issues} / {num_issues}",) * 2
     assert isinstance(response[0], dmc.Accordion) or response[0] is no_update
     assert isinstance(response[1], dmc.Accordion) or response[1] is no_update
     assert response[2] == expected["opened_loading"]
     assert response[3] == expected["closed_loading"]
+    assert response[4] == expected["opened_pagination"]
+    assert response[5] == expected["closed_pagination"]
+    assert response[6] == expected["open_tab_badge"]
+    assert response[7] == expected["close_tab_badge"]
 
 
-@pytest.mark.parametrize(
-    "callback_function, args, expected",
-    [
-        (
-            # Test case 1: enable and return opened tab pages
-            change_page,
-            # Inputs:
-            {
-                "active_tab": "opened",
-                "opened_curr_page": 1,
-                "closed_curr_page": 1,
-                "search_term": "",
-                "cache_page": {"opened": 0, "closed": 0},
-            },
-            # Expected Outputs:
-            {
-                "cache_page_num": {"opened": 1, "closed": 0},
-                "opened_pagination": 1,
-                "closed_pagination": 1,
-            },
-        ),
-        (
-            # Test case 2: enable and return closed tab pages
-            change_page,
-            # Inputs:
-            {
-                "active_tab": "closed",
-                "opened_curr_page": 1,
-                "closed_curr_page": 1,
-                "search_term": "",
-                "cache_page": {"opened": 0, "closed": 0},
-            },
-            # Expected Outputs:
-            {
-                "cache_page_num": {"opened": 0, "closed": 1},
-                "opened_pagination": 1,
-                "closed_pagination": 1,
-            },
-        ),
-        (
-            # Test case 3: select wrong tab
-            change_page,
-            # Inputs:
-            {
-                "active_tab": "wrong",  # wrong doesnt exist
-                "opened_curr_page": 1,
-                "closed_curr_page": 1,
-                "search_term": "username102",
-                "cache_page": {"opened": 1, "closed": 0},
-            },
-            # Expected Outputs:
-            {
-                "cache_page_num": {"opened": 1, "closed": 0},
-                "opened_pagination": 1,
-                "closed_pagination": 1,
-            },
-        ),
-        (
-            # Test case 4: enable and return filtered pages
-            change_page,
-            # Inputs:
-            {
-                "active_tab": "opened",
-                "opened_curr_page": 1,
-                "closed_curr_page": 1,
-                "search_term": "username102",
-                "cache_page": {"opened": 1, "closed": 0},
-            },
-            # Expected Outputs:
-            {
-                "cache_page_num": {"opened": 1, "closed": 0},
-                "opened_pagination": 1,
-                "closed_pagination": 1,
-            },
-        ),
-    ],
-)
-def test_change_page_callback(callback_function, args, expected):
-    """Test change_page with various scenarios"""
-    response = callback_function(**args)
-    if response is not no_update:
-        assert response[0] == expected["cache_page_num"]
-        assert response[1] == expected["opened_pagination"]
-        assert response[2] == expected["closed_pagination"]
+def test_route_tab_request():
+    """Test that the pipeline lists are requested from the background
+    callback and that the welcome tab gets only the tab badges, without
+    listing issues"""
+    assert route_tab_request("closed", 1, 2, "test") == (
+        {"active_tab": "closed", "page": 2, "search_term": "test"},
+        no_update,
+        no_update,
+    )
+
+    request_repo, _ = get_gitlab_instances()
+    project = request_repo.project
+    project.issues.list.reset_mock()
+    # 5 opened and 1 closed test issues are defined in conftest.py
+    assert route_tab_request("welcome", 1, 1, None) == (no_update, 5, 1)
+    assert project.issues.list.call_count == 0
+
+
+def test_switch_tabs_single_fetch():
+    """Test that switching to a tab lists the issues of the page only once
+    and counts the issues without listing all of them"""
+    request_repo, _ = get_gitlab_instances()
+    project = request_repo.project
+    project.issues.list.reset_mock()
+    project.issues_statistics.get.reset_mock()
+
+    switch_tabs(
+        lambda progress: None,
+        {"active_tab": "opened", "page": 1, "search_term": None},
+    )
+
+    assert project.issues.list.call_count == 1
+    assert project.issues_statistics.get.call_count == 1
 
 
 @pytest.mark.parametrize(
@@ -389,34 +374,230 @@ def test_show_pipeline_data_callback(callback_function, args, expected):
     assert response[4] == expected["pipeline_progress_bar_lbl"]
 
 
-@pytest.mark.parametrize(
-    "callback_function, args, expected",
-    [
-        (
-            # Test case 1: skip all actions
-            show_pipeline_number,
-            # Inputs:
-            {"pathname": "/wrong_pathname/"},
-            # Expected Outputs:
-            {"open_tab_badge": no_update, "close_tab_badge": no_update},
-        ),
-        (
-            # Test case 2: show only pathname is given
-            show_pipeline_number,
-            # Inputs:
-            {"pathname": "/local-dashboard/"},
-            # Expected Outputs:
-            {
-                # 5 opened test issues are defined in conftest.py
-                "open_tab_badge": 5,
-                # 1 closed test issues are defined in conftest.py
-                "close_tab_badge": 1,
-            },
-        ),
-    ],
-)
-def test_show_pipeline_number_callback(callback_function, args, expected):
-    """Test show_pipeline_number with various scenarios"""
-    response = callback_function(**args)
-    assert response[0] == expected["open_tab_badge"]
-    assert response[1] == expected["close_tab_badge"]
+def test_push_pipeline_updates():
+    """Test that all the shown running pipelines are checked with a single
+    request and only the changed fields are pushed"""
+    request_repo, _ = get_gitlab_instances()
+    project = request_repo.project
+    project.issues.list.reset_mock()
+    project.issues.get.reset_mock()
+
+    snapshots = [
+        # Outdated pipeline without changes in the shown fields
+        {
+            "iid": "1",
+            "updated_at": "2000-01-01T00:00:00.000000Z",
+            "pipe_state": "run",
+            "num_comments": 0,
+            "first_note_id": None,
+            "has_older_comments": False,
+            "jobs": "Jobs: [0 / 0]",
+            "progress": None,
+        },
+        # Outdated pipeline with a finished job
+        {
+            "iid": "2",
+            "updated_at": "2000-01-01T00:00:00.000000Z",
+            "pipe_state": "run",
+            "num_comments": 0,
+            "first_note_id": None,
+            "has_older_comments": False,
+            "jobs": "Jobs: [1 / 2]",
+            "progress": 50,
+        },
+        # Up to date pipeline
+        {
+            "iid": "4",
+            "updated_at": "9999-01-01T00:00:00.000000Z",
+            "pipe_state": "run",
+            "num_comments": 2,
+            "first_note_id": None,
+            "has_older_comments": False,
+            "jobs": "Jobs: [0 / 0]",
+            "progress": None,
+        },
+        # Pipeline that is not shown yet
+        None,
+    ]
+    comments, jobs, values, labels, new_snapshots = push_pipeline_updates(
+        1, "opened", snapshots
+    )
+
+    assert project.issues.list.call_count == 1
+    # The issues are not fetched again to read their notes
+    assert project.issues.get.call_count == 0
+    assert comments == [no_update] * 4
+    assert jobs == [no_update, "Jobs: [2 / 2]", no_update, no_update]
+    assert values == [no_update, 95, no_update, no_update]
+    assert labels == [no_update, "95 %", no_update, no_update]
+    assert new_snapshots[0]["updated_at"] > snapshots[0]["updated_at"]
+    assert new_snapshots[1]["jobs"] == "Jobs: [2 / 2]"
+    assert new_snapshots[2:] == [no_update, no_update]
+
+
+def test_push_pipeline_updates_skipped():
+    """Test that nothing is fetched without shown running pipelines"""
+    with pytest.raises(PreventUpdate):
+        push_pipeline_updates(1, "closed", [None])
+    with pytest.raises(PreventUpdate):
+        push_pipeline_updates(1, "opened", [None])
+
+
+def test_pipeline_updates_new_comments():
+    """Test that only the new comments are appended to the shown ones"""
+    notes = {
+        "updated_at": "2000-01-02T00:00:00.000000Z",
+        "total_jobs": 0,
+        "finished_jobs": 0,
+        "comments": ["first", "second", "third"],
+        "note_ids": [1, 2, 3],
+        "comment_authors": ["bot", "bot", "bot"],
+        "dates": ["date1", "date2", "date3"],
+        "pipe_state": "run",
+        "progress": 0,
+    }
+    snapshot = pipeline_snapshot(
+        1, {**notes, "comments": ["first"], "note_ids": [1]}
+    )
+    comments, jobs, value, label, new_snapshot = pipeline_updates(
+        snapshot, notes
+    )
+    assert isinstance(comments, Patch)
+    operations = comments.to_plotly_json()["operations"]
+    assert len(operations) == 1
+    assert operations[0]["operation"] == "Extend"
+    assert len(operations[0]["params"]["value"]) == 2
+    assert [jobs, value, label] == [no_update] * 3
+    assert new_snapshot["num_comments"] == 3
+
+
+def test_show_pipeline_data_reopen():
+    """Test that a pipeline that is already shown is not rebuilt"""
+    request_repo, _ = get_gitlab_instances()
+    snapshot = show_pipeline_data(1)[5]
+    request_repo.project.issues.get.reset_mock()
+    assert show_pipeline_data("1", snapshot) == [no_update] * 6
+    assert request_repo.project.issues.get.call_count == 0
+
+
+def test_accordion_items_rendered_once(monkeypatch):
+    """Test that unchanged pipelines are not rendered again"""
+    import dashboard.pages.page_home as page_home
+
+    request_repo, _ = get_gitlab_instances()
+    pipelines = request_repo.get_issues_meta(state="opened", page=1)
+
+    rendered = []
+
+    def mock_create_item(pipeline):
+        rendered.append(pipeline["iid"])
+        return create_pipeline_accordion_item(pipeline)
+
+    monkeypatch.setattr(
+        page_home, "create_pipeline_accordion_item", mock_create_item
+    )
+    accordion = create_pipelines_accordion(pipelines)
+    assert len(rendered) == len(pipelines)
+    assert accordion.children[0]["type"] == "AccordionItem"
+    assert accordion.children[0]["props"]["value"] == str(pipelines[0]["iid"])
+
+    # Paging back to the same pipelines reuses the rendered items
+    assert create_pipelines_accordion(pipelines).children == accordion.children
+    assert len(rendered) == len(pipelines)
+
+    # An updated pipeline is rendered again
+    pipelines[0] = {**pipelines[0], "updated_at": "9999-01-01T00:00:00.000Z"}
+    create_pipelines_accordion(pipelines)
+    assert rendered[-1] == pipelines[0]["iid"]
+    assert len(rendered) == len(pipelines) + 1
+
+
+def test_chat_box_window():
+    """Test that only the newest comments are shown and consecutive
+    "Completed job" comments are aggregated"""
+    comments = [f"comment {i}" for i in range(60)]
+    comments += [f"Completed job {i}" for i in range(30)] + ["done"]
+    notes = {
+        "comments": comments,
+        "note_ids": list(range(len(comments))),
+        "comment_authors": ["bot"] * len(comments),
+        "dates": ["date"] * len(comments),
+    }
+    rows = chat_box(notes, window=40).children
+    # 9 comments, 30 aggregated "Completed job" comments, and "done"
+    assert len(rows) == 11
+    assert isinstance(rows[9], html.Details)
+    assert len(rows[9].children[1].children) == 30
+    snapshot = pipeline_snapshot(1, {**notes, **EMPTY_PROGRESS})
+    assert snapshot["first_note_id"] == len(comments) - CHAT_WINDOW
+    assert snapshot["has_older_comments"]
+
+
+def test_load_older_comments(monkeypatch):
+    """Test that the previous window of comments is prepended"""
+    request_repo, _ = get_gitlab_instances()
+    comments = [f"comment {i}" for i in range(CHAT_WINDOW + 5)]
+    notes = {
+        "comments": comments,
+        "note_ids": [10 * i for i in range(len(comments))],
+        "comment_authors": ["bot"] * len(comments),
+        "dates": ["date"] * len(comments),
+        **EMPTY_PROGRESS,
+    }
+    monkeypatch.setattr(
+        request_repo, "get_processed_issue_notes", lambda *args: notes
+    )
+    snapshot = pipeline_snapshot(1, notes)
+    assert snapshot["first_note_id"] == 50
+
+    # Older notes were removed: the comments before the shown ones are
+    # still found by their note id
+    for key in ("comments", "note_ids", "comment_authors", "dates"):
+        notes[key] = notes[key][:1] + notes[key][3:]
+    comments, new_snapshot = load_older_comments(1, snapshot)
+    operations = comments.to_plotly_json()["operations"]
+    assert [op["operation"] for op in operations] == ["Prepend"] * 3
+    assert new_snapshot["first_note_id"] == 0
+    assert not new_snapshot["has_older_comments"]
+
+    with pytest.raises(PreventUpdate):
+        load_older_comments(2, new_snapshot)
+
+
+def test_chat_rows_skipped_notes():
+    """Test that the authors and dates of the comments stay aligned when
+    notes are skipped"""
+    request_repo, _ = get_gitlab_instances()
+    bodies = [
+        "first",
+        "changed the description",
+        "second",
+        "marked the checklist item as completed",
+        "third",
+    ]
+    issue = MagicMock(updated_at="2000-01-01T00:00:00.000000Z")
+    issue.notes.list.return_value = [
+        MagicMock(
+            id=i,
+            body=body,
+            author={"name": f"author {i}"},
+            created_at=f"2000-01-0{i + 1}T00:00:00.000000Z",
+        )
+        for i, body in enumerate(bodies)
+    ]
+    notes = request_repo.get_processed_issue_notes(7, issue)
+    assert notes["comments"] == ["first", "second", "third"]
+    assert notes["note_ids"] == [0, 2, 4]
+    assert notes["comment_authors"] == ["author 0", "author 2", "author 4"]
+    assert len(notes["dates"]) == 3
+
+    # A window after the skipped notes
+    rows = chat_rows(notes, start=1)
+    assert [row.children[1].children for row in rows] == [
+        "author 2",
+        "author 4",
+    ]
+    assert [row.children[0].children[1].children for row in rows] == [
+        notes["dates"][1],
+        notes["dates"][2],
+    ]
@@ -0,0 +1,162 @@
+import time
+
+import diskcache
+import pytest
+from dash import DiskcacheManager
+
+from dashboard.gitlab import close_inherited_connections, get_gitlab_instances
+from dashboard import jobs
+from dashboard.jobs import PENDING_JOB_PREFIX, SharedJobManager
+
+
+@pytest.fixture
+def job_manager(monkeypatch, tmp_path):
+    """Creates a job manager that records started and killed jobs instead
+    of running processes"""
+    started, killed = [], []
+
+    def mock_call_job_fn(self, key, job_fn, args, context):
+        started.append(key)
+        return 100000 + len(started)
+
+    monkeypatch.setattr(DiskcacheManager, "call_job_fn", mock_call_job_fn)
+    monkeypatch.setattr(
+        DiskcacheManager, "terminate_job", lambda self, job: killed.append(job)
+    )
+    monkeypatch.setattr(
+        DiskcacheManager, "job_running", lambda self, job: True
+    )
+    dead = []
+    monkeypatch.setattr(jobs, "mark_process_dead", dead.append)
+    manager = SharedJobManager(diskcache.Cache(str(tmp_path)))
+    yield manager, started, killed
+    manager.handle.close()
+    # The live metrics of every killed job are dropped
+    assert dead == killed
+
+
+def test_identical_jobs_run_once(job_manager):
+    """Test that a request for a running job waits for its result"""
+    manager, started, killed = job_manager
+    job = manager.call_job_fn("key", None, [], {})
+    assert manager.call_job_fn("key", None, [], {}) == job
+    assert started == ["key"]
+
+    manager.handle.set("key", "result")
+    # The result is kept until the last waiting request gets it
+    assert manager.get_result("key", job) == "result"
+    assert killed == []
+    assert manager.get_result("key", job) == "result"
+    assert killed == [job]
+    assert manager.get_result("key", job) is manager.UNDEFINED
+
+
+def test_cancel_shared_job(job_manager):
+    """Test that a job is killed only when no request waits for it"""
+    manager, started, killed = job_manager
+    job = manager.call_job_fn("key", None, [], {})
+    manager.call_job_fn("key", None, [], {})
+
+    manager.terminate_job(job)
+    assert killed == []
+    manager.terminate_job(job)
+    assert killed == [job]
+
+    # A new request starts a new job
+    manager.call_job_fn("key", None, [], {})
+    assert started == ["key", "key"]
+
+
+def test_cancel_after_result(job_manager):
+    """Test that a request cancelled after the result is ready is released,
+    so that a new identical request starts a new job"""
+    manager, started, killed = job_manager
+    job = manager.call_job_fn("key", None, [], {})
+    manager.call_job_fn("key", None, [], {})
+    manager.handle.set("key", "result")
+    assert manager.get_result("key", job) == "result"
+
+    manager.terminate_job(job)
+    assert killed == [job]
+    assert manager.handle.get("key") is None
+    assert manager.handle.get("key-job") is None
+    manager.call_job_fn("key", None, [], {})
+    assert started == ["key", "key"]
+
+
+def test_pending_job(job_manager):
+    """Test that a request for a job that another request is starting
+    returns at once with a pending job id"""
+    manager, started, killed = job_manager
+    manager.handle.set(
+        "key-job", {"job": None, "waiters": 1, "reserved_at": time.time()}
+    )
+    pending = manager.call_job_fn("key", None, [], {})
+    assert pending == PENDING_JOB_PREFIX + "key"
+    assert started == []
+    assert manager.job_running(pending)
+    assert manager.get_result("key", pending) is manager.UNDEFINED
+
+    # The job is started by the other request
+    manager.handle.set("key-job", {**manager.handle.get("key-job"), "job": 7})
+    manager.handle.set("key", "result")
+    assert manager.get_result("key", pending) == "result"
+    manager.terminate_job(7)
+    assert killed == [7]
+
+    # A reservation of a crashed worker is started again
+    manager.handle.delete("key")
+    manager.handle.set(
+        "key-job", {"job": None, "waiters": 1, "reserved_at": 0}
+    )
+    assert not manager.job_running(pending)
+    assert manager.call_job_fn("key", None, [], {}) == 100001
+
+
+def test_job_result_expires(tmp_path):
+    """Test that the results of the jobs expire"""
+    manager = SharedJobManager(diskcache.Cache(str(tmp_path)))
+    try:
+        job_fn = manager.make_job_fn(lambda value: value * 2, False)
+        job_fn("key", "key-progress", [21], {})
+        value, expire_time = manager.handle.get("key", expire_time=True)
+        assert value == 42
+        assert expire_time is not None
+    finally:
+        manager.handle.close()
+
+
+def test_job_started_outside_transaction(monkeypatch, tmp_path):
+    """Test that the job process is started without holding the job
+    cache transaction, which would block the other workers"""
+    other_worker = diskcache.Cache(str(tmp_path), timeout=0.1)
+
+    def mock_call_job_fn(self, key, job_fn, args, context):
+        # Raises diskcache.Timeout if the database is locked
+        other_worker.set("other-key", 1)
+        return 100001
+
+    monkeypatch.setattr(DiskcacheManager, "call_job_fn", mock_call_job_fn)
+    monkeypatch.setattr(
+        DiskcacheManager, "job_running", lambda self, job: True
+    )
+    dead = []
+    monkeypatch.setattr(jobs, "mark_process_dead", dead.append)
+    manager = SharedJobManager(diskcache.Cache(str(tmp_path)))
+    try:
+        assert manager.call_job_fn("key", None, [], {}) == 100001
+        assert manager.call_job_fn("key", None, [], {}) == 100001
+        entry = manager.handle.get("key-job")
+        assert (entry["job"], entry["waiters"]) == (100001, 2)
+    finally:
+        manager.handle.close()
+        other_worker.close()
+
+
+def test_close_inherited_connections():
+    """Test that the GitLab connections are closed in forked processes"""
+    request_repo, _ = get_gitlab_instances()
+    session = request_repo.project.manager.gitlab.session
+    session.close.reset_mock()
+    close_inherited_connections()
+    assert session.close.called
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from benchmarks.load_test import (
+    DashClient,
+    LoadTestResults,
+    format_report,
+    percentile,
+)
+from dashboard.app_main import BASENAME_PREFIX, app
+
+
+@pytest.fixture
+def dashboard_url():
+    """Serve the dashboard (with the mock GitLab) in a thread"""
+    server = make_server("127.0.0.1", 0, app.server, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}{BASENAME_PREFIX}"
+    server.shutdown()
+    thread.join()
+
+
+def test_dash_client(dashboard_url):
+    """Test that the client sends the callback requests of a browser and
+    keeps the returned property values"""
+    client = DashClient(dashboard_url)
+    status = client.call(
+        "page-content.children",
+        "url.pathname",
+        {"url.pathname": BASENAME_PREFIX},
+    )
+    assert status == 200
+    assert client.store[("home_page_link", "active")] is True
+
+    status = client.call(
+        "cache_dcor_files.data",
+        "dcor_button.n_clicks",
+        {
+            "dcor_button.n_clicks": 1,
+            "dcor_drop_down.value": "DCOR",
+            "dcor_text_input.value": "mock_dataset",
+            "cache_dcor_files.data": [],
+        },
+    )
+    assert status == 200
+    assert client.store[("cache_dcor_files", "data")] == ["DCOR: mock_dataset"]
+
+    # The inputs are taken from the kept property values
+    status = client.call(
+        "show_grid.rowData",
+        "cache_dcor_files.data",
+        {"cache_hsm_files.data": []},
+    )
+    assert status == 200
+    assert client.store[("show_grid", "rowData")] == [
+        {"filepath": "DCOR: mock_dataset"}
+    ]
+
+    # The pipeline list of a tab is requested from the background callback
+    status = client.call(
+        "pipeline_list_query.data",
+        "main_tabs.value",
+        {
+            "main_tabs.value": "opened",
+            "opened_pagination.active_page": 1,
+            "closed_pagination.active_page": 1,
+            "pipeline_filter.value": "",
+        },
+    )
+    assert status == 200
+    assert client.store[("pipeline_list_query", "data")]["page"] == 1
+
+
+def test_format_report():
+    """Test the latency percentiles of the load test report"""
+    results = LoadTestResults()
+    for duration in range(1, 101):
+        results.add_callback("mock_callback", duration / 1e3, True)
+        results.add_action("mock action", duration / 1e3, gitlab_calls=2)
+    assert percentile([0.1, 0.2, 0.3, 0.4], 0.5) == 0.3
+
+    report = format_report(results, 10, users=2, gitlab_calls=200)
+    assert "callback requests: 100 (10.0/s)" in report
+    assert "2.0 per action" in report
+    line = next(x for x in report.splitlines() if x.startswith("mock_call"))
+    assert line.split()[-3:] == ["51", "96", "100"]
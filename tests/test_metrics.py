@@ -0,0 +1,149 @@
+from datetime import timedelta
+from unittest.mock import MagicMock
+
+from prometheus_client import REGISTRY
+
+from dashboard.app_main import BASENAME_PREFIX, app
+from dashboard.gitlab import get_gitlab_instances
+from dashboard import metrics
+from dashboard.metrics import (
+    current_callback,
+    current_method,
+    observe_gitlab_response,
+)
+
+PAGE_CONTENT_OUTPUT = (
+    "..page-content.children...home_page_link.active..."
+    "simple_page_link.active...advanced_page_link.active.."
+)
+
+
+def sample_value(name, **labels):
+    """Return the value of a metric sample (0 if not recorded yet)"""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_callback_metrics():
+    """Test that the wall time and payload size of a callback request are
+    recorded and exposed on the metrics route"""
+    labels = {"callback": "render_page_content"}
+    count = sample_value(
+        "dashboard_callback_duration_seconds_count", phase="request", **labels
+    )
+    size = sample_value("dashboard_callback_response_bytes_sum", **labels)
+
+    client = app.server.test_client()
+    outputs = [
+        {"id": "page-content", "property": "children"},
+        {"id": "home_page_link", "property": "active"},
+        {"id": "simple_page_link", "property": "active"},
+        {"id": "advanced_page_link", "property": "active"},
+    ]
+    response = client.post(
+        f"{BASENAME_PREFIX}_dash-update-component",
+        json={
+            "output": PAGE_CONTENT_OUTPUT,
+            "outputs": outputs,
+            "inputs": [
+                {"id": "url", "property": "pathname", "value": "/wrong_page"}
+            ],
+            "changedPropIds": ["url.pathname"],
+        },
+    )
+    assert response.status_code == 200
+
+    assert (
+        sample_value(
+            "dashboard_callback_duration_seconds_count",
+            phase="request",
+            **labels,
+        )
+        == count + 1
+    )
+    assert sample_value(
+        "dashboard_callback_response_bytes_sum", **labels
+    ) == size + len(response.data)
+
+    metrics = client.get(f"{BASENAME_PREFIX}metrics").data.decode()
+    assert 'callback="render_page_content"' in metrics
+
+
+def test_gitlab_response_metrics():
+    """Test that GitLab responses are recorded for the current callback"""
+    token = current_callback.set("mock_callback")
+    method_token = current_method.set("RequestRepoAPI.mock_method")
+    try:
+        observe_gitlab_response(
+            MagicMock(elapsed=timedelta(seconds=0.5), content=b"1234")
+        )
+    finally:
+        current_method.reset(method_token)
+        current_callback.reset(token)
+    assert (
+        sample_value(
+            "dashboard_gitlab_requests_total",
+            callback="mock_callback",
+            method="RequestRepoAPI.mock_method",
+        )
+        == 1
+    )
+    assert (
+        sample_value(
+            "dashboard_gitlab_request_duration_seconds_sum",
+            callback="mock_callback",
+        )
+        == 0.5
+    )
+    assert (
+        sample_value(
+            "dashboard_gitlab_response_bytes_total", callback="mock_callback"
+        )
+        == 4
+    )
+
+
+def test_api_method_metrics(monkeypatch):
+    """Test that the wall time of the API methods is recorded"""
+    labels = {"method": "RequestRepoAPI.get_issue_counts"}
+    count = sample_value(
+        "dashboard_api_method_duration_seconds_count", **labels
+    )
+    request_repo, _ = get_gitlab_instances()
+
+    statistics = request_repo.project.issues_statistics
+    get_statistics = statistics.get
+
+    def mock_get_statistics(**kwargs):
+        # The method is known while its GitLab requests are made
+        assert current_method.get() == labels["method"]
+        return get_statistics(**kwargs)
+
+    monkeypatch.setattr(statistics, "get", mock_get_statistics)
+    request_repo.get_issue_counts()
+    assert (
+        sample_value("dashboard_api_method_duration_seconds_count", **labels)
+        == count + 1
+    )
+    assert current_method.get() == "none"
+
+
+def test_multiproc_dir_cleanup(monkeypatch, tmp_path):
+    """Test that old metric files are removed at server start and that the
+    live metrics of exited processes are dropped"""
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    metrics.clear_multiproc_dir()
+    metrics.mark_process_dead(12345)
+
+    path = tmp_path / "metrics"
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(path))
+    metrics.clear_multiproc_dir()
+    (path / "counter_1.db").write_bytes(b"")
+    (path / "gauge_livesum_12345.db").write_bytes(b"")
+    (path / "gauge_livesum_54321.db").write_bytes(b"")
+    metrics.mark_process_dead(12345)
+    assert sorted(p.name for p in path.iterdir()) == [
+        "counter_1.db",
+        "gauge_livesum_54321.db",
+    ]
+    metrics.clear_multiproc_dir()
+    assert list(path.iterdir()) == []
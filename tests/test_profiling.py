@@ -0,0 +1,111 @@
+import pstats
+import time
+
+import pytest
+
+from dashboard import profiling
+from dashboard.app_main import BASENAME_PREFIX, app
+
+from .test_metrics import PAGE_CONTENT_OUTPUT
+
+
+@pytest.fixture
+def profile_dir(monkeypatch, tmp_path):
+    """Write the profiles to a temporary directory, admin token: secret"""
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILE_MODE", None)
+    return tmp_path
+
+
+def post_page_content(client):
+    return client.post(
+        f"{BASENAME_PREFIX}_dash-update-component",
+        json={
+            "output": PAGE_CONTENT_OUTPUT,
+            "outputs": [
+                {"id": "page-content", "property": "children"},
+                {"id": "home_page_link", "property": "active"},
+                {"id": "simple_page_link", "property": "active"},
+                {"id": "advanced_page_link", "property": "active"},
+            ],
+            "inputs": [
+                {"id": "url", "property": "pathname", "value": "/wrong_page"}
+            ],
+            "changedPropIds": ["url.pathname"],
+        },
+    )
+
+
+def test_sampler():
+    """Test that the sampling profiler records the stacks of its thread"""
+    sampler = profiling.Sampler(interval=0.001)
+    sampler.enable()
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        pass
+    sampler.disable()
+    assert sum(sampler.stacks.values()) > 10
+    assert all("test_sampler" in stack for stack in sampler.stacks)
+
+
+def test_callback_profiling_for_admins(profile_dir):
+    """Test that only the callback requests of admins are profiled"""
+    client = app.server.test_client()
+    assert post_page_content(client).status_code == 200
+    assert not list(profile_dir.glob("*.prof"))
+    assert client.get(f"{BASENAME_PREFIX}profiles").status_code == 404
+
+    client.get(f"{BASENAME_PREFIX}healthz?profile=wrong")
+    assert post_page_content(client).status_code == 200
+    assert not list(profile_dir.glob("*.prof"))
+
+    client.get(f"{BASENAME_PREFIX}healthz?profile=secret")
+    assert post_page_content(client).status_code == 200
+    dumps = list(profile_dir.glob("*.prof"))
+    assert len(dumps) == 1
+    stats = pstats.Stats(str(dumps[0]))
+    assert any(func[2] == "render_page_content" for func in stats.stats)
+
+    entries = profiling.recent_profiles()
+    assert entries[0]["name"] == "callback render_page_content"
+    index_page = client.get(f"{BASENAME_PREFIX}profiles")
+    assert entries[0]["file"] in index_page.data.decode()
+    dump = client.get(f"{BASENAME_PREFIX}profiles/{entries[0]['file']}")
+    assert dump.status_code == 200
+
+    client.get(f"{BASENAME_PREFIX}healthz?profile=off")
+    assert post_page_content(client).status_code == 200
+    assert len(list(profile_dir.glob("*.prof"))) == 1
+
+
+def test_sampling_profile(profile_dir):
+    """Test that the sampling mode dumps folded stacks"""
+    with profiling.profile("mock", "sample"):
+        time.sleep(0.05)
+    dumps = list(profile_dir.glob("*mock.folded"))
+    assert len(dumps) == 1
+    assert profiling.recent_profiles()[0]["mode"] == "sample"
+
+
+def test_invalid_profile_mode(monkeypatch):
+    """Test that an invalid profile mode fails at startup"""
+    monkeypatch.setattr(profiling, "PROFILE_MODE", "cprofil")
+    with pytest.raises(ValueError, match="PROFILE_MODE 'cprofil'"):
+        profiling.register_profiling(app, lambda *args: "unknown")
+
+
+def test_profiles_for_admins_only(monkeypatch, profile_dir):
+    """Test that the profiles are only served to admins when all the
+    requests are profiled"""
+    monkeypatch.setattr(profiling, "PROFILE_MODE", "cprofile")
+    client = app.server.test_client()
+    assert post_page_content(client).status_code == 200
+    file_name = profiling.recent_profiles()[0]["file"]
+    assert client.get(f"{BASENAME_PREFIX}profiles").status_code == 404
+    dump_url = f"{BASENAME_PREFIX}profiles/{file_name}"
+    assert client.get(dump_url).status_code == 404
+
+    client.get(f"{BASENAME_PREFIX}healthz?profile=secret")
+    assert client.get(f"{BASENAME_PREFIX}profiles").status_code == 200
+    assert client.get(dump_url).status_code == 200
@@ -0,0 +1,162 @@
+from pathlib import Path
+
+import pytest
+
+from dashboard.gitlab import requests_repo
+from dashboard.gitlab.request_schema import (
+    DEFAULTS_PATH,
+    OPTION_LABELS,
+    compile_request_schema,
+)
+from dashboard.gitlab.requests_repo import RequestRepoAPI
+from dashboard.pages.utils import (
+    update_advanced_template,
+    update_simple_template,
+)
+
+data_path = Path(__file__).parents[0] / "data"
+
+
+@pytest.fixture
+def defaults_text():
+    """Read the mock dcevent defaults file"""
+    defaults_path = data_path / "dashboard_dcevent_defaults.yaml"
+    return defaults_path.read_text(encoding="utf-8")
+
+
+def test_schema_is_compiled_once(defaults_text):
+    """Test that the same defaults return the cached schema"""
+    schema = compile_request_schema(defaults_text)
+    assert compile_request_schema(defaults_text) is schema
+
+
+def test_schema_is_immutable(defaults_text):
+    """Test that the defaults of the schema can not be modified"""
+    schema = compile_request_schema(defaults_text)
+    with pytest.raises(TypeError):
+        schema.defaults["legacy"]["thresh"]["default"] = 0
+    assert isinstance(
+        schema.defaults["legacy"]["diff_method"]["options"], tuple
+    )
+
+
+def test_schema_uses_dcevent_defaults(defaults_text):
+    """Test that the option parameters are taken from the defaults file"""
+    schema = compile_request_schema(defaults_text)
+    options = {
+        option.label: option
+        for section in schema.advanced
+        for group in section.groups
+        for option in group.options
+    }
+    sparsemed = dict(options[OPTION_LABELS["sparsemed"]].params)
+    assert sparsemed["kernel_size"] == 200
+    assert sparsemed["offset_correction"] == "True"
+
+    simple_options = {
+        option.label: option
+        for section in schema.simple
+        for group in section.groups
+        for option in group.options
+    }
+    assert simple_options[OPTION_LABELS["legacy"]].params == (("thresh", -6),)
+    assert OPTION_LABELS["sparsemed"] not in simple_options
+
+
+def test_update_template_with_schema(defaults_text):
+    """Test that only the selected options get the user values"""
+    schema = compile_request_schema(defaults_text)
+    description = update_advanced_template(
+        {OPTION_LABELS["std"]: {"closing_disk": 7}},
+        "test_user",
+        ["HSMFS: test.rtdc"],
+        "# Pipeline Request ADVANCED\n- **Segmentation**\n old selection",
+        schema,
+    )
+    assert "old selection" not in description
+    assert f"- [x] {OPTION_LABELS['std']}" in description
+    assert "- [x] closing_disk=7" in description
+    assert f"- [ ] {OPTION_LABELS['watershed']}" in description
+    assert "- [x] HSMFS: test.rtdc" in description
+    assert description.endswith("- [x] username=test_user")
+
+
+def test_simple_template_rendering(defaults_text):
+    """Test the complete rendered simple template (it is parsed again by
+    the end markers, so the layout must not change)"""
+    schema = compile_request_schema(defaults_text)
+    description = update_simple_template(
+        {
+            "dcevent version=latest": {},
+            OPTION_LABELS["legacy"]: {"thresh": -3},
+            "--num-frames": 500,
+            "Benchmarking": {},
+        },
+        "test_user",
+        ["HSMFS:/Data/a.rtdc"],
+        "# Pipeline Request\n- **Segmentation**\n old selection",
+        schema,
+    )
+    assert description == "\n".join(
+        [
+            "# Pipeline Request",
+            "",
+            "- **Segmentation**",
+            "  - dcevent version",
+            "    - [x] dcevent version=latest",
+            "    <!-- option end -->",
+            "  - Segmentation Algorithm",
+            "    - [ ] mlunet: UNET",
+            "      - [ ] model_file=unet-double-d3-f3_g1_81bbe.ckp",
+            "    <!-- option end -->",
+            "    - [x] legacy: Legacy thresholding with OpenCV",
+            "      - [x] thresh=-3",
+            "    <!-- option end -->",
+            "    - [ ] thresh: thresholding segmentation",
+            "    <!-- option end -->",
+            "    - [ ] watershed: Watershed algorithm",
+            "    <!-- option end -->",
+            "    - [ ] std: Standard-deviation-based thresholding",
+            "    <!-- option end -->",
+            "  - Further Options",
+            "    - [ ] --reproduce ",
+            "    - [ ] --transfer-fluorescence ",
+            "    - [x] --num-frames 500",
+            "    <!-- option end -->",
+            "- **Prediction**",
+            "  - Classification Model",
+            "    - [ ] bloody-bunny_g1_bacae: Bloody Bunny ",
+            "    <!-- option end -->",
+            "- **Post Analysis**",
+            "  - [x] Benchmarking",
+            "  - [ ] Scatter Plot",
+            "    <!-- option end -->",
+            "- **Data to Process**",
+            "  - [x] HSMFS:/Data/a.rtdc",
+            "    <!-- option end -->",
+            "- __Author__",
+            "   - [x] username=test_user",
+        ]
+    )
+
+
+def test_defaults_file_is_cached(monkeypatch, defaults_text):
+    """Test that the defaults file is fetched from GitLab only after the
+    time-to-live"""
+    monkeypatch.setattr(requests_repo, "_defaults_files", {})
+    api = RequestRepoAPI.__new__(RequestRepoAPI)
+    api.gitlab_url, api.project_num = "https://gitlab.example", 1
+    fetched = []
+
+    def read_repo_file(path):
+        fetched.append(path)
+        return defaults_text
+
+    monkeypatch.setattr(api, "read_repo_file", read_repo_file)
+    schema = api.get_request_schema()
+    assert api.get_request_schema() is schema
+    assert fetched == [DEFAULTS_PATH]
+
+    monkeypatch.setattr(requests_repo, "DEFAULTS_TTL", -1)
+    assert api.get_request_schema() is schema
+    assert fetched == [DEFAULTS_PATH, DEFAULTS_PATH]
@@ -0,0 +1,38 @@
+import tempfile
+from pathlib import Path
+
+from benchmarks.scanner_bench import (
+    find_regressions,
+    generate_tree,
+    measure,
+    parse_suffix_mix,
+)
+from hsm_snapshot import read_snapshot
+
+
+def test_scanner_bench():
+    """Test the synthetic tree and the measurements of a scanner mode"""
+    root = Path(tempfile.mkdtemp(prefix="bench_tree"))
+    mix = parse_suffix_mix(".rtdc=0.5,.log=0.5")
+    data_dir = generate_tree(root, 2, 3, 10, mix, 0.2, 0)
+    info = (root / "tree.json").read_text()
+    # A tree with the same parameters is reused
+    assert generate_tree(root, 2, 3, 10, mix, 0.2, 0) == data_dir
+    assert (root / "tree.json").read_text() == info
+    assert len(list(data_dir.rglob("*.*"))) == 3**2 * 10
+
+    result_path = root / "out" / "hsm_drive.pkl"
+    result = measure("walk", data_dir, result_path)
+    cache_data = read_snapshot(result_path)["cache_data"]
+    assert len(cache_data) > 0
+    assert result["output_bytes"] == result_path.stat().st_size
+    assert result["calls"]["stat"] >= len(cache_data)
+    # Drive directories and the result directory (old generations)
+    assert result["calls"]["scandir"] == 1 + 3 + 3**2 + 1
+
+    baseline = [dict(result, time=result["time"] / 2)]
+    assert find_regressions([result], [result], 0.2) == []
+    assert find_regressions([result], baseline, 0.2) == [
+        f"walk: time {result['time']:.4g} > "
+        f"{baseline[0]['time']:.4g} (baseline)"
+    ]
@@ -0,0 +1,223 @@
+import pickle
+
+import pytest
+from dash.exceptions import PreventUpdate
+
+from cache_handler import DriveFileScanner, SnapshotWriter
+from dashboard import cache, health
+from dashboard.app_main import BASENAME_PREFIX, server
+from dashboard.pages import hsm_grid
+from dashboard.server import preload_hsm_data
+
+
+def test_health_endpoints():
+    """Test liveness and readiness endpoints"""
+    client = server.test_client()
+    response = client.get(f"{BASENAME_PREFIX}healthz")
+    assert response.status_code == 200
+    response = client.get(f"{BASENAME_PREFIX}readyz")
+    assert response.status_code == 200
+    assert response.json["gitlab"] == "ok"
+    assert response.json["cache"] == "ok"
+
+
+def test_readiness_checks_gitlab(monkeypatch):
+    """Test that the readiness check requests GitLab (not only the cached
+    GitLab instances)"""
+
+    class UnreachableAPI:
+        def ping(self, timeout=None):
+            raise ConnectionError("GitLab is down")
+
+    monkeypatch.setattr(
+        health, "get_gitlab_instances", lambda: [UnreachableAPI()]
+    )
+    monkeypatch.setattr(health, "_gitlab_check", {"time": None})
+    client = server.test_client()
+    response = client.get(f"{BASENAME_PREFIX}readyz")
+    assert response.status_code == 503
+    assert response.json["gitlab"] == "GitLab is down"
+
+
+def test_shared_cache_backend(monkeypatch, tmp_path):
+    """Test that the file system cache is shared through the cache dir"""
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("CACHE_REDIS_URL", raising=False)
+    cache.get_cache.cache_clear()
+    try:
+        cache.get_cache().set("gitlab_issue_1", {"pipe_state": "run"})
+        cache.get_cache.cache_clear()
+        # A new cache instance (e.g. of another worker) reads the data
+        assert cache.get_cache().get("gitlab_issue_1") == {"pipe_state": "run"}
+    finally:
+        cache.get_cache.cache_clear()
+
+
+def test_hsm_snapshot_loaded_once(monkeypatch, tmp_path):
+    """Test that the HSMFS drive snapshot is unpickled only when the file
+    changes"""
+    hsm_file = tmp_path / "hsm_drive.pkl"
+    hsm_file.write_bytes(pickle.dumps({"cache_data": [], "update_time": 1}))
+    monkeypatch.setattr(hsm_grid, "HSM_DATA_FILE", hsm_file)
+    monkeypatch.setattr(hsm_grid, "_hsm_snapshots", {})
+
+    data = hsm_grid.load_hsm_data()
+    assert hsm_grid.load_hsm_data() is data
+
+    hsm_file.write_bytes(pickle.dumps({"cache_data": [], "update_time": 22}))
+    assert hsm_grid.load_hsm_data()["update_time"] == 22
+
+    # Snapshot written in chunks by the drive scanner
+    with SnapshotWriter(hsm_file, chunk_size=1) as writer:
+        writer.add({"filepath": ["HSMFS:", "Data", "a.rtdc"]})
+        writer.add({"filepath": ["HSMFS:", "Data", "b.rtdc"]})
+        writer.finalize(333)
+    data = hsm_grid.load_hsm_data()
+    assert data["update_time"] == 333
+    assert len(data["cache_data"]) == 2
+
+
+def test_hsm_snapshot_deltas(monkeypatch, tmp_path):
+    """Test that a new generation of the HSMFS drive snapshot is loaded by
+    applying its delta"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("a/M001.rtdc", "b/M002.rtdc"):
+        (drive / name).parent.mkdir(parents=True, exist_ok=True)
+        (drive / name).write_bytes(b"\0" * 1024**2)
+    hsm_file = tmp_path / "hsm_drive.pkl"
+    monkeypatch.setattr(hsm_grid, "HSM_DATA_FILE", hsm_file)
+    monkeypatch.setattr(hsm_grid, "_hsm_snapshots", {})
+    scanner = DriveFileScanner(drive, hsm_file, ".rtdc", "HSMFS")
+    scanner.process_drive()
+    loaded = hsm_grid.load_hsm_data()
+    cache_data = loaded["cache_data"]
+    assert loaded["generation"] == 1
+
+    (drive / "a" / "M001.rtdc").unlink()
+    (drive / "c").mkdir()
+    (drive / "c" / "M003.rtdc").write_bytes(b"\0" * 1024**2)
+    scanner.process_drive()
+
+    def load_snapshot(file, header=None):
+        raise AssertionError("Full snapshot loaded")
+
+    full_read = hsm_grid.load_snapshot
+    monkeypatch.setattr(hsm_grid, "load_snapshot", load_snapshot)
+    data = hsm_grid.load_hsm_data()
+    assert data["generation"] == 2
+    assert sorted(e["filepath"][-2] for e in data["cache_data"]) == ["b", "c"]
+    assert sorted(data["folders"]) == [
+        ("HSMFS:",),
+        ("HSMFS:", "Data"),
+        ("HSMFS:", "Data", "b"),
+        ("HSMFS:", "Data", "c"),
+    ]
+    assert data["folders"][("HSMFS:", "Data")]["num_files"] == 2
+    # The delta is applied to the loaded snapshot in place
+    assert data is loaded and data["cache_data"] is cache_data
+
+    (drive / "b" / "M002.rtdc").write_bytes(b"\0" * 2 * 1024**2)
+    (drive / "c" / "M003.rtdc").unlink()
+    (drive / "d").mkdir()
+    (drive / "d" / "M004.rtdc").write_bytes(b"\0" * 1024**2)
+    scanner.process_drive()
+    data = hsm_grid.load_hsm_data()
+    assert data["generation"] == 3
+    assert data["num_entries"] == 2
+    sizes = {e["filepath"][-2]: e["size"] for e in data["cache_data"]}
+    assert sizes == {"b": 2 * 1024**2, "d": 1024**2}
+
+    # Missing deltas: the full snapshot is loaded
+    monkeypatch.setattr(hsm_grid, "load_snapshot", full_read)
+    scanner.process_drive()
+    scanner.process_drive()
+    (tmp_path / "hsm_drive.4.delta.pkl").unlink()
+    data = hsm_grid.load_hsm_data()
+    assert data["generation"] == 5
+    assert data is not loaded
+    assert len(data["cache_data"]) == 2
+
+
+def test_hsm_partitions(monkeypatch, tmp_path):
+    """Test that the top-level HSMFS folders are loaded on click"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("M000.rtdc", "a/M001.rtdc", "a/b/M002.rtdc", "c/M003.rtdc"):
+        (drive / name).parent.mkdir(parents=True, exist_ok=True)
+        (drive / name).write_bytes(b"\0" * 1024**2)
+    result_dir = tmp_path / "hsm_partitions"
+    monkeypatch.setattr(hsm_grid, "HSM_PARTITIONS_DIR", result_dir)
+    monkeypatch.setattr(
+        hsm_grid, "HSM_MANIFEST_FILE", result_dir / "manifest.json"
+    )
+    monkeypatch.setattr(hsm_grid, "_hsm_snapshots", {})
+    DriveFileScanner(
+        drive, result_dir, ".rtdc", "HSMFS", partitioned=True
+    ).process_drive()
+
+    rows, _, unloaded = hsm_grid.load_hms_grid_data("hsm_accord")
+    assert unloaded == ["a", "c"]
+    assert [row["filepath"][-1] for row in rows] == [
+        "M000.rtdc",
+        "a",
+        "c",
+        "HSMFS:",
+        "Data",
+    ]
+    # Aggregates of the folders whose files are not loaded
+    assert rows[1]["size"] == 2 * 1024**2
+    assert rows[1]["num_files"] == 2
+    assert rows[4]["num_files"] == 4
+    assert rows[4]["num_offline"] == 0
+
+    transaction, unloaded = hsm_grid.load_hsm_partition_rows(
+        {"rowId": "HSMFS:/Data/a"}, unloaded
+    )
+    assert unloaded == ["c"]
+    # The folder row is not a placeholder anymore
+    assert transaction["update"] == [
+        {
+            "filepath": ["HSMFS:", "Data", "a"],
+            "folder": True,
+            "num_files": 2,
+            "size": 2 * 1024**2,
+            "dateModified": rows[1]["dateModified"],
+            "num_offline": 0,
+        }
+    ]
+    assert [e["filepath"][-1] for e in transaction["add"]] == [
+        "M001.rtdc",
+        "M002.rtdc",
+        "b",
+    ]
+    with pytest.raises(PreventUpdate):
+        hsm_grid.load_hsm_partition_rows({"rowId": "HSMFS:/Data/a"}, unloaded)
+
+    # Selecting a folder that is not loaded selects its files
+    assert hsm_grid.cache_user_given_hsm_files([rows[0], rows[2]], []) == [
+        "HSMFS:/Data/M000.rtdc",
+        "HSMFS:/Data/c/M003.rtdc",
+    ]
+
+
+def test_preload_hsm_partitions(monkeypatch, tmp_path):
+    """Test that the server preloads the root partition of a partitioned
+    snapshot and the single snapshot otherwise"""
+    drive = tmp_path / "HSMFS" / "Data"
+    for name in ("M000.rtdc", "a/M001.rtdc"):
+        (drive / name).parent.mkdir(parents=True, exist_ok=True)
+        (drive / name).write_bytes(b"\0" * 1024**2)
+    result_dir = tmp_path / "hsm_partitions"
+    monkeypatch.setattr(hsm_grid, "HSM_PARTITIONS_DIR", result_dir)
+    monkeypatch.setattr(
+        hsm_grid, "HSM_MANIFEST_FILE", result_dir / "manifest.json"
+    )
+    monkeypatch.setattr(hsm_grid, "HSM_DATA_FILE", tmp_path / "hsm.pkl")
+    monkeypatch.setattr(hsm_grid, "_hsm_snapshots", {})
+    preload_hsm_data()
+    assert hsm_grid._hsm_snapshots == {}
+
+    DriveFileScanner(
+        drive, result_dir, ".rtdc", "HSMFS", partitioned=True
+    ).process_drive()
+    preload_hsm_data()
+    assert list(hsm_grid._hsm_snapshots) == [result_dir / "@root.pkl"]
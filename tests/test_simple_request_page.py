@@ -13,7 +13,6 @@ from dashboard.pages.page_simple import (
     simple_request_submission_popup,
     simple_segmentation_section,
     toggle_and_cache_params,
-    toggle_simple_create_pipeline_button,
 )
 
 
@@ -68,9 +67,6 @@ def test_show_and_cache_segment_options_callback():
                     "mlunet": {"model_file": "test_model_file"},
                     "legacy: Legacy thresholding with OpenCV": {"thresh": -5},
                 },
-                "simple_unet_toggle": {"display": "block"},
-                "simple_legacy_toggle": {"display": "block"},
-                "simple_nframe_toggle": {"display": "block"},
             },
         ),
         (
@@ -93,10 +89,6 @@ def test_show_and_cache_segment_options_callback():
             # Expected Outputs:
             {
                 "cache_simple_params": {},
-                "simple_unet_toggle": {"display": "none"},
-                "simple_legacy_toggle": {"display": "none"},
-                "simple_nframe_toggle": {"display": "none"},
-                "simple_legacy_options": {"display": "none"},
             },
         ),
     ],
@@ -105,52 +97,7 @@ def test_toggle_and_cache_params_callback(callback_function, args, expected):
     """Test togglable options expansion, contraction, and caching user
     selected parameters when a user clicks on respective switches switchs."""
     response = callback_function(**args)
-    print(response[0])
-    print("-" * 50)
-    print(expected["cache_simple_params"])
-    assert response[0] == expected["cache_simple_params"]
-
-
-@pytest.mark.parametrize(
-    "callback_function, args, expected",
-    [
-        (
-            # Test case 1: enable the 'create pipleine button' when all the
-            # required entries are given (author name, title, input file/s,
-            # and segmentation method)
-            toggle_simple_create_pipeline_button,
-            # Inputs:
-            {
-                "author_name": "test_username",
-                "title": "test_title",
-                "selected_rows": [{"filepath": "test1.rtdc"}],
-                "cached_params": {"legacy": {"thresh": "-6"}},
-            },
-            # Expected Outputs:
-            {"create_simple_pipeline_button": False},
-        ),
-        (
-            # Test case 2: disable the 'create pipleine button', if any of the
-            # required entries are missing.
-            toggle_simple_create_pipeline_button,
-            # Inputs:
-            {
-                "author_name": "test_username",
-                "title": "",  # No title is given
-                "selected_rows": [{"filepath": "test1.rtdc"}],
-                "cached_params": {},  # No segmentation is provided
-            },
-            # Expected Outputs:
-            {"create_simple_pipeline_button": True},
-        ),
-    ],
-)
-def test_toggle_simple_create_pipeline_button_callback(
-    callback_function, args, expected
-):
-    """Test toggle_simple_create_pipeline_button activation and deactivation"""
-    response = callback_function(**args)
-    assert response == expected["create_simple_pipeline_button"]
+    assert response == expected["cache_simple_params"]
 
 
 @pytest.mark.parametrize(
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from dashboard import tracing
+from dashboard.gitlab import get_gitlab_instances
+
+
+@pytest.fixture
+def trace_file(monkeypatch, tmp_path):
+    """Enable tracing into a temporary trace file"""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    return path
+
+
+def read_spans(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_tracing_disabled(monkeypatch):
+    """Test that nothing is traced if tracing is disabled"""
+    monkeypatch.setattr(tracing, "TRACE_FILE", None)
+    with tracing.span("mock") as active_span:
+        assert active_span is None
+        assert tracing.current_span.get() is None
+
+
+def test_spans_propagate_to_executor_tasks(trace_file):
+    """Test that the spans of the thread pool tasks are children of the
+    callback span"""
+    request_repo, _ = get_gitlab_instances()
+    with tracing.span("callback mock"):
+        request_repo.get_issues_meta(state="opened", page=1)
+
+    spans = read_spans(trace_file)
+    by_id = {item["spanId"]: item for item in spans}
+    assert len({item["traceId"] for item in spans}) == 1
+
+    root = next(item for item in spans if item["name"] == "callback mock")
+    meta = next(
+        item
+        for item in spans
+        if item["name"] == "RequestRepoAPI.get_issues_meta"
+    )
+    assert meta["parentSpanId"] == root["spanId"]
+
+    tasks = [item for item in spans if item["name"] == "task process_issue"]
+    assert len(tasks) == 5
+    assert all(task["parentSpanId"] == meta["spanId"] for task in tasks)
+    assert all("queue_wait_ms" in task["attributes"] for task in tasks)
+
+    # The notes are read from the (mock) cache or fetched from GitLab
+    notes_spans = [
+        item
+        for item in spans
+        if item["name"] == "RequestRepoAPI.get_processed_issue_notes"
+    ]
+    assert all(
+        by_id[item["parentSpanId"]]["name"] == "RequestRepoAPI.process_issue"
+        for item in notes_spans
+    )
+    events = [
+        event["name"] for item in notes_spans for event in item["events"]
+    ]
+    assert events.count("cache hit") == 2
+    assert events.count("cache miss") == 3
+
+    tree = tracing.format_trace(spans)
+    assert tree.splitlines()[0].endswith("callback mock")